@@ -33,6 +33,7 @@ import sys
 import click
 
 from iocage.Logger import Logger
+from iocage.EventTracer import EventTracer
 from iocage.events import IocageEvent
 from iocage.errors import (
     InvalidLogLevel,
@@ -42,8 +43,10 @@ from iocage.errors import (
 from iocage.ZFS import get_zfs
 from iocage.Datasets import Datasets
 from iocage.Host import HostGenerator
+from iocage.HTTPCache import DEFAULT_TTL
 
 logger = Logger()
+tracer: typing.Optional[EventTracer] = None
 
 click.core._verify_python3_env = lambda: None  # type: ignore
 user_locale = os.environ.get("LANG", "en_US.UTF-8")
@@ -79,12 +82,29 @@ def set_to_dict(data: typing.Set[str]) -> typing.Dict[str, str]:
     return dict(zip(keys, values))
 
 
+def record_event(event: IocageEvent) -> None:
+    """Pass an event to the tracer when tracing is enabled."""
+    if tracer is not None:
+        tracer.record(event)
+
+
+def write_trace(trace_file: str) -> None:
+    """Write the traced events to a Chrome trace or folded stacks file."""
+    if tracer is None:
+        return
+    if trace_file.endswith(".folded"):
+        tracer.write_folded_stacks(trace_file)
+    else:
+        tracer.write_chrome_trace(trace_file)
+
+
 def print_events(
     generator: typing.Generator[typing.Union[IocageEvent, bool], None, None]
 ) -> typing.Optional[bool]:
 
     lines: typing.Dict[str, str] = {}
     for event in generator:
+        record_event(event)
 
         if isinstance(event, bool):
             # a boolean terminates the event stream
@@ -151,6 +171,7 @@ class IOCageCLI(click.MultiCommand):
 
     def get_command(self, ctx, name):
         ctx.print_events = print_events
+        ctx.record_event = record_event
         try:
             mod = __import__(f"ioc.{name}", None, None, ["ioc"])
 
@@ -187,11 +208,48 @@ class IOCageCLI(click.MultiCommand):
     type=str,
     help="Globally override the activated iocage dataset(s)"
 )
+@click.option(
+    "--trace",
+    "trace_file",
+    default=None,
+    type=click.Path(dir_okay=False, writable=True),
+    help=(
+        "Write the timing of all events to a Chrome trace JSON file, "
+        "or as folded stacks when the file name ends with .folded"
+    )
+)
+@click.option(
+    "--cache-ttl",
+    default=DEFAULT_TTL,
+    type=int,
+    show_default=True,
+    help=(
+        "Seconds the cached release list and EOL information are used "
+        "before they are revalidated with the remote"
+    )
+)
+@click.option(
+    "--cache-directory",
+    default=None,
+    type=click.Path(file_okay=False),
+    help=(
+        "Directory of the release asset and HTTP caches "
+        "(default /var/cache/iocage)"
+    )
+)
 @click.command(cls=IOCageCLI)
 @click.version_option(version="0.3.1 2018/10/04", prog_name="ioc")
 @click.pass_context
-def cli(ctx, log_level: str, source: set) -> None:
+def cli(
+    ctx,
+    log_level: str,
+    source: set,
+    trace_file: str,
+    cache_ttl: int,
+    cache_directory: typing.Optional[str]
+) -> None:
     """A jail manager."""
+    global tracer
     if log_level is not None:
         try:
             logger.print_level = log_level
@@ -199,6 +257,10 @@ def cli(ctx, log_level: str, source: set) -> None:
             exit(1)
     ctx.logger = logger
 
+    if trace_file is not None:
+        tracer = EventTracer()
+        ctx.call_on_close(lambda: write_trace(trace_file))
+
     ctx.zfs = get_zfs(logger=ctx.logger)
 
     ctx.user_sources = None if (len(source) == 0) else set_to_dict(source)
@@ -215,7 +277,9 @@ def cli(ctx, log_level: str, source: set) -> None:
         ctx.host = HostGenerator(
             datasets=datasets,
             logger=ctx.logger,
-            zfs=ctx.zfs
+            zfs=ctx.zfs,
+            cache_directory=cache_directory,
+            cache_ttl=cache_ttl
         )
     except (IocageNotActivated, ZFSSourceMountpoint):
         exit(1)
@@ -27,10 +27,14 @@ import click
 import typing
 import shlex
 
+import iocage.errors
 import iocage.Jail
+import iocage.Jails
+import iocage.JailsExec
 import iocage.Logger
 
 from .shared.click import IocageClickContext
+from .shared.output import print_table
 
 __rootcmd__ = True
 
@@ -52,6 +56,13 @@ __rootcmd__ = True
     default=False,
     help="Spawns a jail to execute the command."
 )
+@click.option(
+    "--workers",
+    "-w",
+    default=4,
+    type=int,
+    help="The number of jails the command runs in concurrently."
+)
 @click.argument("jail", required=True, nargs=1)
 @click.argument("command", nargs=-1, type=click.UNPROCESSED)
 def cli(
@@ -60,6 +71,7 @@ def cli(
     jail: str,
     user: typing.Optional[str],
     fork: bool,
+    workers: int
 ) -> None:
     """
     Run the given command inside the specified jail.
@@ -68,6 +80,12 @@ def cli(
     can be marked with a double-dash or the full command can be quoted:
 
         ioc exec myjail -- ps -aux
+
+    When the jail is selected by filters, for example 'tags=web' or 'web*',
+    the command runs in all matching running jails concurrently. The output
+    lines are prefixed with the jail name and the exit codes are summarized.
+
+        ioc exec 'tags=web' -- service nginx reload
     """
     logger = ctx.parent.logger
 
@@ -87,6 +105,13 @@ def cli(
             shlex.quote(user_command)
         ]
 
+    if _is_filter(jail) is True:
+        if fork is True:
+            logger.error("Cannot fork jails selected by filters")
+            exit(1)
+        _exec_filtered(ctx, jail, command_list, workers=workers)
+        return
+
     ioc_jail = iocage.Jail.JailGenerator(
         jail,
         logger=logger,
@@ -116,3 +141,51 @@ def cli(
             ioc_jail.passthru(command_list)
     except iocage.errors.IocageException:
         exit(1)
+
+
+def _is_filter(selector: str) -> bool:
+    """Return True when the selector may match more than one jail."""
+    return any(
+        (character in selector) for character in ["=", "*", "+", ",", " "]
+    )
+
+
+def _exec_filtered(
+    ctx: IocageClickContext,
+    selector: str,
+    command: typing.List[str],
+    workers: int
+) -> None:
+    logger = ctx.parent.logger
+
+    def _print_line(jail: 'iocage.Jail.JailGenerator', line: str) -> None:
+        print(f"{jail.humanreadable_name}: {line}", flush=True)
+
+    try:
+        ioc_jails = iocage.Jails.JailsGenerator(
+            filters=[selector],
+            logger=logger,
+            zfs=ctx.parent.zfs,
+            host=ctx.parent.host
+        )
+        jails_exec = iocage.JailsExec.JailsExec(
+            ioc_jails,
+            command,
+            workers=workers,
+            output_callback=_print_line,
+            logger=logger
+        )
+    except iocage.errors.IocageException:
+        exit(1)
+
+    if len(jails_exec.jails) == 0:
+        logger.error(f"No jails matched your input: {selector}")
+        exit(1)
+
+    successful = jails_exec.run()
+    print_table(
+        [[name, status] for name, status in jails_exec.summary.items()],
+        ["name", "exit"]
+    )
+    if successful is False:
+        exit(1)
@@ -71,6 +71,21 @@ __rootcmd__ = True
     is_flag=True,
     help="Have --server define a HTTP server instead."
 )
+@click.option(
+    "--offline",
+    is_flag=True,
+    default=False,
+    help=(
+        "Fetch the release from the host asset cache only. "
+        "Implies --no-update and --no-fetch-updates."
+    )
+)
+@click.option(
+    "--stream",
+    is_flag=True,
+    default=False,
+    help="Extract the release assets while downloading them."
+)
 @click.option(  # Basejail Update
     "--copy-basejail-only",
     "-b",
@@ -130,7 +145,12 @@ def cli(  # noqa: T484
         release.assets = list(kwargs["files"])
         url_or_files_selected = True
 
-    if (url_or_files_selected is False) and (release.available is False):
+    offline = (kwargs["offline"] is True)
+    release.offline = offline
+    if offline is True:
+        kwargs["update"] = False
+        kwargs["fetch_updates"] = False
+    elif (url_or_files_selected is False) and (release.available is False):
         logger.error(f"The release '{release.name}' is not available")
         exit(1)
 
@@ -138,7 +158,8 @@ def cli(  # noqa: T484
     try:
         ctx.parent.print_events(release.fetch(
             update=kwargs["update"],
-            fetch_updates=fetch_updates
+            fetch_updates=fetch_updates,
+            stream=kwargs["stream"]
         ))
     except iocage.errors.IocageException:
         exit(1)
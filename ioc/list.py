@@ -24,10 +24,10 @@
 # POSSIBILITY OF SUCH DAMAGE.
 """List jails, releases and templates with the CLI."""
 import click
-import json
 import typing
 
 import iocage.errors
+import iocage.Filter
 import iocage.Logger
 import iocage.Host
 import iocage.Datasets
@@ -36,12 +36,21 @@ import iocage.ListableResource
 import iocage.Jails
 import iocage.Releases
 
-from .shared.output import print_table
+from .shared.output import (
+    limit_rows,
+    print_json,
+    print_ndjson,
+    print_table,
+    print_table_chunked,
+    sort_rows
+)
 from .shared.click import IocageClickContext
 
 __rootcmd__ = True
 
-supported_output_formats = ['table', 'csv', 'list', 'json']
+supported_output_formats = ['table', 'csv', 'list', 'json', 'ndjson']
+
+RowsType = typing.Iterable[typing.List[str]]
 
 
 @click.command(
@@ -63,6 +72,10 @@ supported_output_formats = ['table', 'csv', 'list', 'json']
               is_flag=True, help="Show remote's available RELEASEs.")
 @click.option("--sort", "-s", "_sort", default=None, nargs=1,
               help="Sorts the list by the given type")
+@click.option("--limit", "limit", default=None, type=int,
+              help="Only output the first rows (after sorting).")
+@click.option("--chunk-size", "chunk_size", default=None, type=int,
+              help="Flush tables in chunks of rows with fixed column widths.")
 @click.option("--output", "-o", default=None)
 @click.option("--output-format", "-f", default="table",
               type=click.Choice(supported_output_formats))
@@ -76,6 +89,8 @@ def cli(
     _long: bool,
     remote: bool,
     _sort: typing.Optional[str],
+    limit: typing.Optional[int],
+    chunk_size: typing.Optional[int],
     output: typing.Optional[str],
     output_format: str,
     filters: typing.Tuple[str, ...]
@@ -89,11 +104,6 @@ def cli(
         logger.error("--output and --long can't be used together")
         exit(1)
 
-    if output_format != "table" and _sort is not None:
-        # Sorting destroys the ability to stream generators
-        # ToDo: Figure out if we need to sort other output formats as well
-        raise Exception("Sorting only allowed for tables")
-
     # empty filters will match all jails
     if len(filters) == 0:
         filters += ("*",)
@@ -137,7 +147,17 @@ def cli(
                 else:
                     filters += ("template=no,-",)
 
-            if resources_class is not None:
+            if resources_class == iocage.Jails.JailsGenerator:
+                resources = resources_class(
+                    logger=logger,
+                    host=host,
+                    zfs=ctx.parent.zfs,
+                    # ToDo: allow quoted whitespaces from user inputs
+                    filters=filters,
+                    # only fetch the data sources of the requested columns
+                    data_sources=_get_column_data_sources(columns)
+                )
+            elif resources_class is not None:
                 resources = resources_class(
                     logger=logger,
                     host=host,
@@ -149,46 +169,62 @@ def cli(
     except iocage.errors.IocageException:
         exit(1)
 
+    rows: RowsType = (
+        _lookup_resource_values(resource, columns) for resource in resources
+    )
+    rows = _sort_rows(rows, columns, _sort, limit)
+
     if output_format == "list":
-        _print_list(resources, columns, header, "\t")
+        _print_list(rows, columns, header, "\t")
     elif output_format == "csv":
-        _print_list(resources, columns, header, ";")
+        _print_list(rows, columns, header, ";")
     elif output_format == "json":
-        _print_json(resources, columns)
+        _print_json(rows, columns)
+    elif output_format == "ndjson":
+        print_ndjson(dict(zip(columns, row)) for row in rows)
     else:
-        _print_table(resources, columns, header, _sort)
+        _print_table(rows, columns, header, chunk_size)
+
+    if isinstance(resources, iocage.ListableResource.ListableResource):
+        logger.verbose(f"Listed data sources: {resources.statistics}")
+
+
+def _get_column_data_sources(columns: typing.List[str]) -> typing.Set[str]:
+    return set(map(iocage.Filter.get_data_source, columns))
+
+
+def _sort_rows(
+    rows: RowsType,
+    columns: typing.List[str],
+    sort_key: typing.Optional[str]=None,
+    limit: typing.Optional[int]=None
+) -> RowsType:
+
+    try:
+        sort_index = -1 if (sort_key is None) else columns.index(sort_key)
+    except ValueError:
+        sort_index = -1
+
+    if sort_index > -1:
+        return sort_rows(rows, sort_index, limit=limit)
+    return limit_rows(rows, limit)
 
 
 def _print_table(
-    resources: typing.Generator[
-        typing.Union[
-            iocage.ListableResource.ListableResource,
-            typing.List[typing.Dict[str, str]]
-        ],
-        None,
-        None
-    ],
+    rows: RowsType,
     columns: list,
     show_header: bool,
-    sort_key: typing.Optional[str]=None
+    chunk_size: typing.Optional[int]=None
 ) -> None:
 
-    table_data = []
-    for resource in resources:
-        table_data.append(_lookup_resource_values(resource, columns))
-
-    print_table(table_data, columns, show_header, sort_key)
+    if chunk_size is None:
+        print_table(list(rows), columns, show_header)
+    else:
+        print_table_chunked(rows, columns, show_header, chunk_size)
 
 
 def _print_list(
-    resources: typing.Generator[
-        typing.Union[
-            iocage.ListableResource.ListableResource,
-            typing.List[typing.Dict[str, str]]
-        ],
-        None,
-        None
-    ],
+    rows: RowsType,
     columns: list,
     show_header: bool,
     separator: str=";"
@@ -197,37 +233,23 @@ def _print_list(
     if show_header is True:
         print(separator.join(columns).upper())
 
-    for resource in resources:
-        print(separator.join(_lookup_resource_values(resource, columns)))
+    for row in rows:
+        print(separator.join(row))
 
 
 def _print_json(
-    resources: typing.Generator[
-        typing.Union[
-            iocage.ListableResource.ListableResource,
-            typing.List[typing.Dict[str, str]]
-        ],
-        None,
-        None
-    ],
+    rows: RowsType,
     columns: list,
     # json.dumps arguments
     indent: int=2,
     sort_keys: bool=True
 ) -> None:
 
-    output = []
-    for resource in resources:
-        output.append(dict(zip(
-            columns,
-            _lookup_resource_values(resource, columns)
-        )))
-
-    print(json.dumps(
-        output,
+    print_json(
+        (dict(zip(columns, row)) for row in rows),
         indent=indent,
         sort_keys=sort_keys
-    ))
+    )
 
 
 def _lookup_resource_values(
@@ -0,0 +1,155 @@
+# Copyright (c) 2014-2018, iocage
+# Copyright (c) 2017-2018, Stefan Grönke
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted providing that the following conditions
+# are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+# IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+"""Configure and fill the warm pools of pre-cloned jails with the CLI."""
+import click
+import typing
+
+import iocage.errors
+import iocage.Host
+import iocage.Jail
+import iocage.JailPool
+import iocage.Release
+import iocage.Resource
+import iocage.ZFS
+
+from .shared.click import IocageClickContext
+from .shared.output import print_table
+
+__rootcmd__ = True
+
+
+@click.command(
+    name="pool",
+    help=(
+        "Configure the warm pool of pre-cloned jails of a release or "
+        "template and show its hit and miss counters."
+    )
+)
+@click.pass_context
+@click.option(
+    "--release", "-r",
+    required=False,
+    help="The RELEASE the pooled jails are cloned from."
+)
+@click.option(
+    "--template", "-t",
+    required=False,
+    help="The template the pooled jails are cloned from."
+)
+@click.option(
+    "--source",
+    required=False,
+    help="The root datasets source of the pool."
+)
+@click.option(
+    "--size", "-s",
+    type=int,
+    required=False,
+    help="The number of pre-cloned jails kept in the pool."
+)
+@click.option(
+    "--refill",
+    type=click.Choice(iocage.JailPool.JailPool.REFILL_POLICIES),
+    required=False,
+    help="Replace claimed jails in the background, synchronously or only "
+    "with --fill."
+)
+@click.option(
+    "--fill", "-f",
+    is_flag=True,
+    default=False,
+    help="Fill the pool up to its size."
+)
+@click.option(
+    "--flush",
+    is_flag=True,
+    default=False,
+    help="Destroy all jails of the pool."
+)
+def cli(
+    ctx: IocageClickContext,
+    release: typing.Optional[str],
+    template: typing.Optional[str],
+    source: typing.Optional[str],
+    size: typing.Optional[int],
+    refill: typing.Optional[str],
+    fill: bool,
+    flush: bool
+) -> None:
+    """Configure, fill or flush a warm pool of pre-cloned jails."""
+    logger = ctx.parent.logger
+    zfs: iocage.ZFS.ZFS = ctx.parent.zfs
+    host: iocage.Host.Host = ctx.parent.host
+
+    if (release is None) and (template is None):
+        release = host.release_version
+
+    try:
+        root_datasets = host.datasets.get_root_source(source)
+        resource: iocage.Resource.Resource
+        if template is not None:
+            resource = iocage.Jail.JailGenerator(
+                template,
+                logger=logger,
+                host=host,
+                zfs=zfs
+            )
+            resource.require_jail_is_template()
+        else:
+            resource = iocage.Release.ReleaseGenerator(
+                name=release,
+                root_datasets_name=source,
+                logger=logger,
+                host=host,
+                zfs=zfs
+            )
+            if resource.fetched is False:
+                raise iocage.errors.ReleaseNotFetched(
+                    name=resource.name,
+                    logger=logger
+                )
+
+        pool = iocage.JailPool.JailPool(
+            resource=resource,
+            root_datasets=root_datasets,
+            logger=logger,
+            zfs=zfs
+        )
+        if (size is not None) or (refill is not None):
+            pool.configure(size=size, refill=refill)
+        if flush is True:
+            pool.flush()
+        if fill is True:
+            pool.refill()
+
+        statistics = pool.statistics
+    except iocage.errors.IocageException:
+        exit(1)
+
+    columns = ["name", "size", "refill", "available", "hits", "misses"]
+    print_table(
+        [[pool.name] + [str(statistics[column]) for column in columns[1:]]],
+        columns
+    )
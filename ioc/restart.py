@@ -52,11 +52,21 @@ __rootcmd__ = True
     is_flag=True,
     help="Force jail shutdown during restart"
 )
+@click.option(
+    '--soft',
+    default=False,
+    is_flag=True,
+    help=(
+        "Only recycle the jail processes and keep its network interfaces, "
+        "firewall rules and mounts unless their configuration changed"
+    )
+)
 @click.argument("jails", nargs=-1)
 def cli(
     ctx: IocageClickContext,
     shutdown: bool,
     force: bool,
+    soft: bool,
     jails: typing.Tuple[str, ...]
 ) -> None:
     """Restart a jail."""
@@ -85,7 +95,8 @@ def cli(
         try:
             print_function(jail.restart(
                 shutdown=shutdown,
-                force=force
+                force=force,
+                soft=soft
             ))
             changed_jails.append(jail)
         except StopIteration:
@@ -24,8 +24,15 @@
 # POSSIBILITY OF SUCH DAMAGE.
 """Use CLI helper functions for console output."""
 import typing
+import heapq
+import itertools
+import json
+import sys
+import tempfile
 import texttable
 
+RowType = typing.List[str]
+
 
 def print_table(
     data: typing.List[typing.List[str]],
@@ -57,3 +64,159 @@ def print_table(
         table.add_rows(table_data, header=False)
 
     print(table.draw())
+
+
+def print_table_chunked(
+    rows: typing.Iterable[RowType],
+    columns: typing.List[str],
+    show_header: bool=True,
+    chunk_size: int=100
+) -> None:
+    """
+    Print a table to stdout in chunks of rows.
+
+    The column widths are determined from the first chunk and kept for all
+    following chunks, so that the output can be flushed before all rows are
+    known. Longer values are wrapped.
+    """
+    table_head = (list(x.upper() for x in columns))
+    widths: typing.Optional[typing.List[int]] = None
+    is_first_chunk = True
+
+    for chunk in _chunk_rows(rows, chunk_size):
+        if widths is None:
+            widths = [
+                max(len(value) for value in column_values)
+                for column_values in zip(table_head, *chunk)
+            ]
+
+        table = texttable.Texttable(max_width=0)
+        table.set_cols_dtype(["t"] * len(columns))
+        table.set_cols_width(widths)
+
+        if (is_first_chunk is True) and (show_header is True):
+            table.add_rows([table_head] + chunk)
+        else:
+            table.add_rows(chunk, header=False)
+
+        output = table.draw()
+        if is_first_chunk is False:
+            # the bottom border of the previous chunk separates the rows
+            output = output.split("\n", maxsplit=1)[1]
+
+        print(output)
+        sys.stdout.flush()
+        is_first_chunk = False
+
+    if is_first_chunk is True:
+        print_table([], columns, show_header)
+
+
+def print_json(
+    items: typing.Iterable[typing.Dict[str, str]],
+    indent: int=2,
+    sort_keys: bool=True
+) -> None:
+    """Print a JSON array to stdout item by item."""
+    padding = " " * indent
+    separator = "[\n"
+    for item in items:
+        lines = json.dumps(item, indent=indent, sort_keys=sort_keys)
+        sys.stdout.write(separator + "\n".join(
+            padding + line for line in lines.split("\n")
+        ))
+        sys.stdout.flush()
+        separator = ",\n"
+
+    if separator == "[\n":
+        print("[]")
+    else:
+        print("\n]")
+
+
+def print_ndjson(
+    items: typing.Iterable[typing.Dict[str, str]],
+    sort_keys: bool=True
+) -> None:
+    """Print one JSON object per line to stdout."""
+    for item in items:
+        print(json.dumps(item, sort_keys=sort_keys))
+        sys.stdout.flush()
+
+
+def sort_rows(
+    rows: typing.Iterable[RowType],
+    sort_index: int,
+    limit: typing.Optional[int]=None,
+    chunk_size: int=10000
+) -> typing.Generator[RowType, None, None]:
+    """
+    Sort rows by the value of a column with bounded memory.
+
+    When a limit is given, only the top rows are kept in a heap. Otherwise
+    sorted runs of chunk_size rows are spilled to temporary files and merged
+    afterwards. Rows with equal values keep their original order.
+    """
+    def _key(row: RowType) -> str:
+        return row[sort_index]
+
+    if limit is not None:
+        yield from heapq.nsmallest(limit, rows, key=_key)
+        return
+
+    run_files: typing.List[typing.IO[str]] = []
+    try:
+        chunk: typing.List[RowType] = []
+        for chunk in _chunk_rows(rows, chunk_size):
+            chunk.sort(key=_key)
+            if len(chunk) < chunk_size:
+                # the last chunk stays in memory
+                break
+            run_files.append(_spill_rows(chunk))
+            chunk = []
+
+        runs: typing.List[typing.Iterable[RowType]] = [
+            _read_rows(run_file) for run_file in run_files
+        ]
+        runs.append(chunk)
+        yield from heapq.merge(*runs, key=_key)
+    finally:
+        for run_file in run_files:
+            run_file.close()
+
+
+def limit_rows(
+    rows: typing.Iterable[typing.Any],
+    limit: typing.Optional[int]=None
+) -> typing.Iterable[typing.Any]:
+    """Return the first rows up to the limit or all rows without limit."""
+    if limit is None:
+        return rows
+    return itertools.islice(rows, limit)
+
+
+def _chunk_rows(
+    rows: typing.Iterable[RowType],
+    chunk_size: int
+) -> typing.Generator[typing.List[RowType], None, None]:
+    iterator = iter(rows)
+    while True:
+        chunk = list(itertools.islice(iterator, max(chunk_size, 1)))
+        if len(chunk) == 0:
+            return
+        yield chunk
+
+
+def _spill_rows(rows: typing.List[RowType]) -> typing.IO[str]:
+    run_file = tempfile.TemporaryFile(mode="w+", encoding="UTF-8")
+    for row in rows:
+        run_file.write(json.dumps(row) + "\n")
+    run_file.seek(0)
+    return run_file
+
+
+def _read_rows(
+    run_file: typing.IO[str]
+) -> typing.Generator[RowType, None, None]:
+    for line in run_file:
+        yield json.loads(line)
@@ -27,6 +27,8 @@ import typing
 import click
 
 import iocage.errors
+import iocage.Jail
+import iocage.JailScheduler
 import iocage.Jails
 import iocage.Logger
 
@@ -47,6 +49,15 @@ __rootcmd__ = True
         "order with smaller value for priority starting first."
     )
 )
+@click.option(
+    "--workers",
+    default=1,
+    type=int,
+    help=(
+        "The number of jails with equal priority started concurrently "
+        "with --rc. Jails are started one after another by default."
+    )
+)
 @click.option(
     "--option", "-o",
     "temporary_config_override",
@@ -57,6 +68,7 @@ __rootcmd__ = True
 def cli(
     ctx: IocageClickContext,
     rc: bool,
+    workers: int,
     temporary_config_override: typing.Tuple[str, ...],
     jails: typing.Tuple[str, ...]
 ) -> None:
@@ -77,7 +89,11 @@ def cli(
         if len(jails) > 0:
             logger.error("Cannot use --rc and jail selectors simultaniously")
             exit(1)
-        _autostart(**start_args)
+        _autostart(
+            workers=workers,
+            event_callback=ctx.parent.record_event,
+            **start_args
+        )
     else:
         start_normal_successful = _normal(
             jails,
@@ -95,38 +111,36 @@ def _autostart(
     print_function: typing.Callable[
         [typing.Generator[iocage.events.IocageEvent, None, None]],
         None
-    ]
+    ],
+    workers: int=1,
+    event_callback: typing.Optional[
+        iocage.JailScheduler.JailEventCallback
+    ]=None
 ) -> None:
 
     filters = ("boot=yes", "running=no", "template=no,-",)
 
-    ioc_jails = iocage.Jails.Jails(
+    ioc_jails = iocage.Jails.JailsGenerator(
         zfs=zfs,
         host=host,
         logger=logger,
         filters=filters
     )
 
-    # sort jails by their priority
-    jails = sorted(
-        list(ioc_jails),
-        key=lambda x: x.config["priority"]
+    # jails are started by priority and dependencies
+    scheduler = iocage.JailScheduler.JailStartScheduler(
+        ioc_jails,
+        workers=workers,
+        event_callback=event_callback,
+        logger=logger
     )
+    scheduler.run()
 
-    failed_jails = []
-    for jail in jails:
-        try:
-            if jail.running is True:
-                logger.log(f"{jail.name} is already running - skipping start")
-                continue
-            jail.start()
-        except iocage.errors.IocageException:
-            failed_jails.append(jail)
-            continue
-
-        logger.log(f"{jail.humanreadable_name} running as JID {jail.jid}")
+    _log_jids(scheduler.succeeded, logger=logger)
 
-    if len(failed_jails) > 0:
+    if len(scheduler.failed) > 0:
+        names = [jail.humanreadable_name for jail, _ in scheduler.failed]
+        logger.error(f"Failed to start: {', '.join(names)}")
         exit(1)
 
     exit(0)
@@ -173,9 +187,10 @@ def _normal(
             failed_jails.append(jail)
             continue
 
-        logger.log(f"{jail.humanreadable_name} running as JID {jail.jid}")
         changed_jails.append(jail)
 
+    _log_jids(changed_jails, logger=logger)
+
     if len(failed_jails) > 0:
         return False
 
@@ -185,3 +200,12 @@ def _normal(
         return False
 
     return True
+
+
+def _log_jids(
+    jails: typing.List[iocage.Jail.JailGenerator],
+    logger: iocage.Logger.Logger
+) -> None:
+    # the JIDs of all started jails are resolved from a single jls call
+    for jail in jails:
+        logger.log(f"{jail.humanreadable_name} running as JID {jail.jid}")
@@ -27,6 +27,7 @@ import typing
 import click
 
 import iocage.errors
+import iocage.JailScheduler
 import iocage.Jails
 import iocage.Logger
 
@@ -42,11 +43,19 @@ __rootcmd__ = True
                    " order with higher value for priority stopping first.")
 @click.option("--force", "-f", is_flag=True, default=False,
               help="Skip checks and enforce jail shutdown")
+@click.option("--workers", default=1, type=int,
+              help="The number of jails stopped concurrently with --rc."
+                   " Jails are stopped one after another by default.")
+@click.option("--deadline", default=None, type=float,
+              help="Force the shutdown of jails that were not stopped within"
+                   " this number of seconds with --rc.")
 @click.argument("jails", nargs=-1)
 def cli(
     ctx: IocageClickContext,
     rc: bool,
     force: bool,
+    workers: int,
+    deadline: typing.Optional[float],
     jails: typing.Tuple[str, ...]
 ) -> None:
     """
@@ -78,7 +87,10 @@ def cli(
             zfs=ctx.parent.zfs,
             logger=logger,
             print_function=ctx.parent.print_events,
-            force=force
+            force=force,
+            workers=workers,
+            deadline=deadline,
+            event_callback=ctx.parent.record_event
         )
     else:
         if not _normal(jails, **stop_args):
@@ -137,33 +149,38 @@ def _autostop(
         [typing.Generator[iocage.events.IocageEvent, None, None]],
         None
     ],
-    force: bool=True
+    force: bool=True,
+    workers: int=1,
+    deadline: typing.Optional[float]=None,
+    event_callback: typing.Optional[
+        iocage.JailScheduler.JailEventCallback
+    ]=None
 ) -> None:
 
     filters = ("running=yes", "template=no,-",)
 
-    ioc_jails = iocage.Jails.Jails(
+    ioc_jails = iocage.Jails.JailsGenerator(
         host=host,
         zfs=zfs,
         logger=logger,
         filters=filters
     )
 
-    # sort jails by their priority
-    jails = reversed(sorted(
-        list(ioc_jails),
-        key=lambda x: x.config["priority"]
-    ))
-
-    failed_jails = []
-    for jail in jails:
-        try:
-            jail.stop(force=force)
-        except iocage.errors.IocageException:
-            failed_jails.append(jail)
-            continue
+    # jails are stopped by reverse priority and dependencies
+    scheduler = iocage.JailScheduler.JailStopScheduler(
+        ioc_jails,
+        force=force,
+        deadline=deadline,
+        workers=workers,
+        event_callback=event_callback,
+        logger=logger
+    )
+    scheduler.run()
 
+    for jail in scheduler.succeeded:
         logger.log(f"{jail.name} stopped")
 
-    if len(failed_jails) > 0:
+    if len(scheduler.failed) > 0:
+        names = [jail.humanreadable_name for jail, _ in scheduler.failed]
+        logger.error(f"Failed to stop: {', '.join(names)}")
         exit(1)
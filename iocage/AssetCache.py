@@ -0,0 +1,252 @@
+# Copyright (c) 2014-2018, iocage
+# Copyright (c) 2017-2018, Stefan Grönke
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted providing that the following conditions
+# are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+# IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+"""Host-wide content-addressed cache of release assets."""
+import typing
+import contextlib
+import errno
+import fcntl
+import os
+import shutil
+import tempfile
+
+import iocage.helpers_object
+
+# MyPy
+import iocage.Logger
+
+# The directory of the asset cache shared by all root datasets of the host
+DEFAULT_CACHE_DIRECTORY = "/var/cache/iocage/assets"
+
+# The number of bytes the cache may grow to before entries get evicted
+DEFAULT_MAX_SIZE = 4 * 1024 * 1024 * 1024
+
+_COPY_CHUNK_SIZE = 64 * 1024 * 1024
+
+
+class AssetCache:
+    """
+    Content-addressed store of downloaded release assets.
+
+    Assets are stored by the SHA-256 hash that is listed in the hash file of
+    a release, so that releases fetched into different root datasets or
+    from different mirrors share a single download. Cached files are
+    hardlinked into the download directory of a release. Across file systems
+    they are cloned with copy_file_range, which ZFS with block cloning turns
+    into a reflink, or copied otherwise.
+
+    The cache is limited in size. Whenever an asset is added, the least
+    recently used assets are evicted until the cache fits its maximum size.
+    Named files, like the hash files of releases, are stored next to the
+    assets and are evicted the same way. Files that are still hardlinked
+    elsewhere, for example into a kept download directory, would free no
+    space when they were removed. They neither count towards the size of
+    the cache nor get evicted until their other links are gone.
+    """
+
+    directory: str
+    max_size: int
+
+    def __init__(
+        self,
+        directory: str=DEFAULT_CACHE_DIRECTORY,
+        max_size: int=DEFAULT_MAX_SIZE,
+        logger: typing.Optional['iocage.Logger.Logger']=None
+    ) -> None:
+        self.logger = iocage.helpers_object.init_logger(self, logger)
+        self.directory = directory
+        self.max_size = max_size
+
+    def get_asset_path(self, digest: str) -> str:
+        """Return the path of an asset in the cache."""
+        _digest = digest.lower()
+        if (len(_digest) != 64) or (_digest.strip("0123456789abcdef") != ""):
+            raise ValueError(f"Invalid SHA-256 digest: {digest}")
+        return os.path.join(self.directory, "sha256", _digest[:2], _digest)
+
+    def get_file_path(self, name: str) -> str:
+        """Return the path of a named file in the cache."""
+        fragments = [x for x in name.split("/") if x not in ("", ".", "..")]
+        return os.path.join(self.directory, "files", *fragments)
+
+    def __contains__(self, digest: str) -> bool:
+        """Return True when an asset with the digest is cached."""
+        return os.path.isfile(self.get_asset_path(digest))
+
+    def get(self, digest: str, destination: str) -> bool:
+        """
+        Place a cached asset at the destination.
+
+        Returns:
+
+            bool: True when the asset was cached, otherwise False
+        """
+        return self._get(self.get_asset_path(digest), destination)
+
+    def put(self, digest: str, source: str) -> None:
+        """
+        Add an asset that was verified to have the digest to the cache.
+
+        The caller is responsible to verify the hash before, because the
+        cache does not read the asset again.
+        """
+        self._put(self.get_asset_path(digest), source)
+
+    def get_file(self, name: str, destination: str) -> bool:
+        """Place a cached named file at the destination."""
+        return self._get(self.get_file_path(name), destination)
+
+    def put_file(self, name: str, source: str) -> None:
+        """Add or replace a named file in the cache."""
+        self._put(self.get_file_path(name), source)
+
+    @property
+    def size(self) -> int:
+        """Return the number of bytes of the files only held by the cache."""
+        return sum(entry[1] for entry in self._stat_entries())
+
+    def evict(self, max_size: typing.Optional[int]=None) -> int:
+        """
+        Remove the least recently used files until the cache fits.
+
+        Args:
+
+            max_size (int): (optional)
+                The number of bytes the cache is reduced to. Defaults to the
+                configured maximum size.
+
+        Returns:
+
+            int: The number of bytes that were freed
+        """
+        limit = self.max_size if (max_size is None) else max_size
+        with self._lock():
+            entries = self._stat_entries()
+            size = sum(entry[1] for entry in entries)
+            freed = 0
+            for _, entry_size, path in sorted(entries):
+                if size <= limit:
+                    break
+                self.logger.verbose(f"Evicting {path} from the asset cache")
+                os.remove(path)
+                size -= entry_size
+                freed += entry_size
+            return freed
+
+    def _get(self, path: str, destination: str) -> bool:
+        try:
+            # mark as recently used
+            os.utime(path)
+        except FileNotFoundError:
+            return False
+        try:
+            _clone(path, destination)
+        except FileNotFoundError:
+            # evicted in the meantime
+            return False
+        self.logger.verbose(f"{destination} was restored from {path}")
+        return True
+
+    def _put(self, path: str, source: str) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._lock():
+            _clone(source, path)
+        self.logger.spam(f"{source} was added to the asset cache")
+        self.evict()
+
+    def _stat_entries(self) -> typing.List[typing.Tuple[float, int, str]]:
+        """Return the mtime, size and path of the files that can be evicted."""
+        entries = []
+        for path in self._list_entries():
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if stat.st_nlink > 1:
+                # hardlinked outside of the cache
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _list_entries(self) -> typing.Generator[str, None, None]:
+        for folder in ("sha256", "files"):
+            top = os.path.join(self.directory, folder)
+            for directory, _, files in os.walk(top):
+                for file in files:
+                    if file.startswith("."):
+                        continue
+                    yield os.path.join(directory, file)
+
+    @contextlib.contextmanager
+    def _lock(self) -> typing.Generator[None, None, None]:
+        """Serialize changes of the cache between processes."""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, ".lock"), "w") as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def _clone(source: str, destination: str) -> None:
+    """Atomically hardlink, clone or copy a file to the destination."""
+    directory = os.path.dirname(destination)
+    fd, temporary_path = tempfile.mkstemp(
+        dir=directory,
+        prefix=f".{os.path.basename(destination)}."
+    )
+    os.close(fd)
+    try:
+        os.unlink(temporary_path)
+        try:
+            os.link(source, temporary_path)
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+                raise
+            _copy(source, temporary_path)
+        os.replace(temporary_path, destination)
+    except BaseException:
+        if os.path.exists(temporary_path):
+            os.unlink(temporary_path)
+        raise
+
+
+def _copy(source: str, destination: str) -> None:
+    """Copy a file with copy_file_range, so that ZFS can clone blocks."""
+    copy_file_range = getattr(os, "copy_file_range", None)
+    if copy_file_range is not None:
+        with open(source, "rb") as src, open(destination, "wb") as dst:
+            try:
+                while copy_file_range(
+                    src.fileno(),
+                    dst.fileno(),
+                    _COPY_CHUNK_SIZE
+                ) > 0:
+                    pass
+                return
+            except OSError as e:
+                if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL):
+                    raise
+    shutil.copyfile(source, destination)
@@ -287,10 +287,11 @@ class Fstab(
                 self.logger.debug(f"fstab loaded from {self.path}")
 
     def save(self) -> None:
-        """Update or create the fstab file."""
-        with open(self.path, "w") as f:
-            self._save_file_handle(f)
+        """Update or create the fstab file unless it is unchanged."""
+        if iocage.helpers.write_file(self.path, self.__str__()) is True:
             self.logger.verbose(f"{self.path} written")
+        else:
+            self.logger.debug(f"{self.path} unchanged - skipping write")
 
     def _save_file_handle(self, f: typing.TextIO) -> None:
         f.write(self.__str__())
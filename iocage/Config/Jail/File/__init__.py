@@ -172,21 +172,21 @@ class ConfigFile(dict):
             )
             return False
 
-        with open(self.path, "w") as rcconf:
-            import ucl
-            output = ucl.dump(self, ucl.UCL_EMIT_CONFIG)
-            output = output.replace(" = \"", "=\"")
-            output = output.replace("\";\n", "\"\n")
-
-            self.logger.verbose(f"Writing {self._file} to {self.path}")
+        import ucl
+        output = ucl.dump(self, ucl.UCL_EMIT_CONFIG)
+        output = output.replace(" = \"", "=\"")
+        output = output.replace("\";\n", "\"\n")
 
-            rcconf.write(output)
-            rcconf.truncate()
-            rcconf.close()
+        self._file_content_changed = False
+        if iocage.helpers.write_file(self.path, output) is False:
+            self.logger.debug(
+                f"{self._file} content is unchanged - skipping write"
+            )
+            return False
 
-            self._file_content_changed = False
-            self.logger.spam(output[:-1], indent=1)
-            return True
+        self.logger.verbose(f"Written {self._file} to {self.path}")
+        self.logger.spam(output[:-1], indent=1)
+        return True
 
     def __setitem__(
         self,
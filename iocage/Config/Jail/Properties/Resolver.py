@@ -26,7 +26,6 @@
 import typing
 import collections
 import os.path
-import shutil
 
 import iocage.helpers
 import iocage.helpers_object
@@ -118,18 +117,23 @@ class ResolverProp(collections.MutableSequence):
                 return
 
             elif self.method == "copy":
-                shutil.copy(self.conf_file_path, remote_path)
-                self.logger.verbose("resolv.conf copied from host")
+                with open(self.conf_file_path, "r", encoding="UTF-8") as f:
+                    content = f.read()
+                if iocage.helpers.write_file(remote_path, content) is True:
+                    self.logger.verbose("resolv.conf copied from host")
+                else:
+                    self.logger.verbose("resolv.conf unchanged")
 
             elif self.method == "manual":
                 lines = map(
                     lambda address: f"nameserver {address}",
                     self._entries
                 )
-                with open(remote_path, "w") as f:
-                    f.write("\n".join(lines))
-                    f.close()
-                self.logger.verbose("resolv.conf written manually")
+                content = "\n".join(lines)
+                if iocage.helpers.write_file(remote_path, content) is True:
+                    self.logger.verbose("resolv.conf written manually")
+                else:
+                    self.logger.verbose("resolv.conf unchanged")
         except Exception as e:
             yield jailResolverConfigEvent.fail(e)
             raise e
@@ -129,6 +129,11 @@ class RootDatasets:
         """Get or create the pkg cache."""
         return self._get_or_create_dataset("pkg")
 
+    @property
+    def pool(self) -> libzfs.ZFSDataset:
+        """Get or create the dataset of the jail warm pools."""
+        return self._get_or_create_dataset("pool")
+
     def _get_or_create_dataset(
         self,
         asset_name: str
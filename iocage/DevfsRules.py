@@ -26,6 +26,7 @@
 import typing
 import os.path
 import re
+import threading
 
 import iocage.errors
 import iocage.helpers
@@ -150,6 +151,7 @@ class DevfsRules(list):
     """
 
     _rules_file: str
+    lock: threading.RLock
     _ruleset_number_index: typing.Dict[int, int]
     _ruleset_name_index: typing.Dict[str, int]
     _system_rule_lines: typing.List[int]
@@ -172,6 +174,9 @@ class DevfsRules(list):
         """
         self.logger = logger
 
+        # serializes ruleset allocation and saving of concurrent jail starts
+        self.lock = threading.RLock()
+
         # index rulesets to find duplicated and provide easy access
         self._ruleset_number_index = {}
         self._ruleset_name_index = {}
@@ -24,10 +24,7 @@
 # POSSIBILITY OF SUCH DAMAGE.
 """iocage Distribution module."""
 import typing
-import os
-import platform
 import re
-import urllib.request
 import html.parser
 
 import iocage.errors
@@ -37,12 +34,17 @@ import iocage.helpers_object
 class EOLParser(html.parser.HTMLParser):
     """Parser for EOL releases."""
 
-    eol_releases: typing.List[str] = []
-    data: typing.List[str] = []
+    eol_releases: typing.List[str]
+    data: typing.List[str]
     in_id: bool = False
     td_counter: int = 0
     current_branch: str = ""
 
+    def __init__(self) -> None:
+        html.parser.HTMLParser.__init__(self)
+        self.eol_releases = []
+        self.data = []
+
     def handle_starttag(  # noqa: T484
         self,
         tag: str,
@@ -120,10 +122,7 @@ class DistributionGenerator:
         Often used to differentiate between operations for HardenedBSD or
         standard FreeBSD.
         """
-        if os.path.exists("/usr/sbin/hbsd-update"):
-            return "HardenedBSD"
-        else:
-            return platform.system()
+        return str(self.host.facts["distribution"])
 
     @property
     def mirror_url(self) -> str:
@@ -160,9 +159,11 @@ class DistributionGenerator:
         self.logger.spam(f"Fetching release list from '{self.mirror_url}'")
 
         # the mirror_url @property is validated (enforced) @property, so:
-        resource = urllib.request.urlopen(self.mirror_url)  # nosec
-        charset = resource.headers.get_content_charset()  # noqa: T484
-        response = resource.read().decode(charset if charset else "UTF-8")
+        try:
+            response = self.host.http_cache.get(self.mirror_url).text
+        except iocage.errors.DownloadFailed as e:
+            self.logger.verbose(str(e))
+            raise iocage.errors.ReleaseListUnavailable(logger=self.logger)
 
         found_releases = self._parse_links(response)
 
@@ -221,29 +222,33 @@ class DistributionGenerator:
             return self._eol_list
 
     def _query_eol_list(self) -> typing.List[str]:
-        """Scrape the FreeBSD website and return a list of EOL RELEASES."""
-        request = urllib.request.Request(
-            self.eol_url,
-            headers={
-                "Accept-Charset": "utf-8"
-            }
-        )
-        self.logger.verbose(f"Downloading EOL info from {self.eol_url}")
-        with urllib.request.urlopen(request) as response:  # nosec: B310
+        """
+        Scrape the FreeBSD website and return a list of EOL RELEASES.
 
-            if response.getcode() != 200:  # noqa: T484
-                iocage.errors.DistributionEOLWarningDownloadFailed(
-                    logger=self.logger,
-                    level="warning"
-                )
-                return []
+        The website is served from the HTTP cache of the host, so that it is
+        only downloaded again when it changed after the cache TTL expired.
+        """
+        self.logger.verbose(f"Loading EOL info from {self.eol_url}")
+        try:
+            response = self.host.http_cache.get(
+                self.eol_url,
+                headers={
+                    "Accept-Charset": "utf-8"
+                }
+            )
+        except iocage.errors.DownloadFailed as e:
+            self.logger.verbose(str(e))
+            iocage.errors.DistributionEOLWarningDownloadFailed(
+                logger=self.logger,
+                level="warning"
+            )
+            return []
 
-            parser = EOLParser()
-            data = response.read().decode("utf-8", "ignore")
-            parser.feed(data)
-            parser.close()
+        parser = EOLParser()
+        parser.feed(response.body.decode("utf-8", "ignore"))
+        parser.close()
 
-            return parser.eol_releases
+        return parser.eol_releases
 
     @property
     def releases(self) -> typing.List['iocage.Release.ReleaseGenerator']:
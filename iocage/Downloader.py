@@ -0,0 +1,727 @@
+# Copyright (c) 2014-2018, iocage
+# Copyright (c) 2017-2018, Stefan Grönke
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted providing that the following conditions
+# are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+# IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+"""Resumable HTTP downloads over pooled keep-alive connections."""
+import typing
+import collections
+import concurrent.futures
+import functools
+import hashlib
+import http.client
+import io
+import os
+import queue
+import ssl
+import threading
+import time
+import urllib.parse
+import urllib.request
+
+import iocage.errors
+import iocage.helpers_object
+
+# MyPy
+import iocage.Logger
+
+DownloadProgressCallback = typing.Callable[
+    [str, int, typing.Optional[int]],
+    None
+]
+
+# The number of bytes read from a response at once
+DOWNLOAD_READ_SIZE = 1024 * 1024
+
+# The number of times a download is resumed after a connection failure
+DOWNLOAD_RETRIES = 5
+
+# The number of redirects followed for a single request
+DOWNLOAD_MAX_REDIRECTS = 5
+
+_PART_SUFFIX = ".part"
+_REDIRECT_STATUS = (301, 302, 303, 307, 308)
+
+DownloadJob = typing.Callable[[DownloadProgressCallback], None]
+
+MirrorKey = typing.Tuple[str, str]
+
+
+class DownloadStatus:
+    """The progress of a single download."""
+
+    url: str
+    received: int
+    total: typing.Optional[int]
+    done: bool
+
+    def __init__(
+        self,
+        url: str,
+        received: int,
+        total: typing.Optional[int]=None,
+        done: bool=False
+    ) -> None:
+        self.url = url
+        self.received = received
+        self.total = total
+        self.done = done
+
+
+class ConnectionPool:
+    """
+    Keep-alive HTTP connections pooled per mirror.
+
+    Idle connections are handed out again for the next request to the same
+    scheme and host, so that subsequent downloads from a mirror skip the TCP
+    and TLS handshakes. At most `max_connections` connections per mirror are
+    open at the same time.
+    """
+
+    max_connections: int
+    timeout: float
+    _idle: typing.Dict[MirrorKey, typing.List[http.client.HTTPConnection]]
+    _slots: typing.Dict[MirrorKey, threading.BoundedSemaphore]
+
+    def __init__(
+        self,
+        max_connections: int=1,
+        timeout: float=30.0
+    ) -> None:
+        self.max_connections = max(1, max_connections)
+        self.timeout = timeout
+        self._idle = collections.defaultdict(list)
+        self._slots = {}
+        self._lock = threading.Lock()
+        self.connections_opened = 0
+
+    def acquire(self, url: str) -> http.client.HTTPConnection:
+        """Return an idle or a new connection to the mirror of the URL."""
+        key = self._get_key(url)
+        with self._lock:
+            if key not in self._slots:
+                self._slots[key] = threading.BoundedSemaphore(
+                    self.max_connections
+                )
+            slot = self._slots[key]
+        slot.acquire()
+        with self._lock:
+            if len(self._idle[key]) > 0:
+                return self._idle[key].pop()
+            self.connections_opened += 1
+        try:
+            return self._connect(key)
+        except BaseException:
+            slot.release()
+            raise
+
+    def release(
+        self,
+        url: str,
+        connection: http.client.HTTPConnection,
+        reuse: bool=True
+    ) -> None:
+        """Return a connection to the pool or close it."""
+        key = self._get_key(url)
+        if reuse is True:
+            with self._lock:
+                self._idle[key].append(connection)
+        else:
+            connection.close()
+        self._slots[key].release()
+
+    def close(self) -> None:
+        """Close all idle connections."""
+        with self._lock:
+            for connections in self._idle.values():
+                for connection in connections:
+                    connection.close()
+            self._idle.clear()
+
+    def _get_key(self, url: str) -> MirrorKey:
+        parsed = urllib.parse.urlparse(url)
+        return (parsed.scheme, parsed.netloc)
+
+    def _connect(self, key: MirrorKey) -> http.client.HTTPConnection:
+        scheme, netloc = key
+        proxy = urllib.request.getproxies().get(scheme, None)
+        if urllib.request.proxy_bypass(netloc.split(":")[0]):
+            proxy = None
+
+        if scheme == "https":
+            context = ssl.create_default_context()
+            if proxy is None:
+                return http.client.HTTPSConnection(
+                    netloc,
+                    timeout=self.timeout,
+                    context=context
+                )
+            connection = http.client.HTTPSConnection(
+                urllib.parse.urlparse(proxy).netloc,
+                timeout=self.timeout,
+                context=context
+            )
+            connection.set_tunnel(netloc)
+            return connection
+
+        if scheme != "http":
+            raise ValueError(f"Unsupported URL scheme: {scheme}")
+
+        if proxy is not None:
+            netloc = urllib.parse.urlparse(proxy).netloc
+        return http.client.HTTPConnection(netloc, timeout=self.timeout)
+
+
+class Downloader:
+    """
+    Download files concurrently and resume interrupted transfers.
+
+    Files are written next to their destination with a .part suffix and
+    moved in place once complete. A partial file left from an earlier
+    attempt, or from a connection dropped mid-transfer, is continued with an
+    HTTP Range request. Mirrors that ignore the Range header get the file
+    transferred from the beginning.
+    """
+
+    pool: ConnectionPool
+    workers: int
+    retries: int
+
+    def __init__(
+        self,
+        workers: int=4,
+        retries: int=DOWNLOAD_RETRIES,
+        pool: typing.Optional[ConnectionPool]=None,
+        logger: typing.Optional['iocage.Logger.Logger']=None
+    ) -> None:
+        self.logger = iocage.helpers_object.init_logger(self, logger)
+        self.workers = max(1, workers)
+        self.retries = retries
+        if pool is None:
+            pool = ConnectionPool(max_connections=self.workers)
+        self.pool = pool
+        self._abort = threading.Event()
+
+    def download_all(
+        self,
+        files: typing.Dict[str, str],
+        interval: float=0.5
+    ) -> typing.Generator[DownloadStatus, None, None]:
+        """
+        Download multiple files in parallel.
+
+        The progress of the downloads is yielded from the calling thread, at
+        most once per interval for each file and once when a file is
+        complete. When one download fails, the other transfers are aborted
+        and the error is raised. Their partial files remain for a resume.
+
+        Args:
+
+            files (dict):
+                The URLs to download mapped to their destination path.
+
+            interval (float): (default=0.5)
+                The minimum number of seconds between progress updates of a
+                single download.
+        """
+        jobs = {
+            url: functools.partial(self.download, url, path)
+            for url, path in files.items()
+        }
+        return self.run_all(jobs, interval=interval)
+
+    def run_all(
+        self,
+        jobs: typing.Dict[str, DownloadJob],
+        interval: float=0.5
+    ) -> typing.Generator[DownloadStatus, None, None]:
+        """
+        Run download jobs in parallel and yield their progress.
+
+        Each job is called with a progress callback in a worker thread. This
+        allows to process downloaded data on the fly, for example with a
+        DownloadStream, while the progress is reported as in download_all.
+
+        Args:
+
+            jobs (dict):
+                Callables that accept a progress callback by their URL.
+
+            interval (float): (default=0.5)
+                The minimum number of seconds between progress updates of a
+                single job.
+        """
+        updates: queue.Queue = queue.Queue()
+        last_update: typing.Dict[str, float] = {}
+        futures: typing.List[concurrent.futures.Future] = []
+        pending = len(jobs)
+
+        def _progress(
+            url: str,
+            received: int,
+            total: typing.Optional[int]
+        ) -> None:
+            updates.put((DownloadStatus(url, received, total), None))
+
+        def _done(url: str, future: concurrent.futures.Future) -> None:
+            updates.put((DownloadStatus(url, 0, None, done=True), future))
+
+        self._abort.clear()
+        executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.workers
+        )
+        try:
+            for url, job in jobs.items():
+                future = executor.submit(job, _progress)
+                future.add_done_callback(functools.partial(_done, url))
+                futures.append(future)
+
+            statuses: typing.Dict[str, DownloadStatus] = {}
+            while pending > 0:
+                status, future = updates.get()
+                if future is not None:
+                    pending -= 1
+                    future.result()
+                    previous = statuses.get(status.url, status)
+                    status.received = previous.received
+                    status.total = previous.total
+                    yield status
+                    continue
+                statuses[status.url] = status
+                now = time.monotonic()
+                if (now - last_update.get(status.url, 0)) >= interval:
+                    last_update[status.url] = now
+                    yield status
+        finally:
+            self._abort.set()
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=True)
+            self._abort.clear()
+
+    def download(
+        self,
+        url: str,
+        path: str,
+        progress: typing.Optional[DownloadProgressCallback]=None
+    ) -> None:
+        """Download a URL to a path, resuming a previous partial download."""
+        part_path = f"{path}{_PART_SUFFIX}"
+        failures = 0
+        while True:
+            try:
+                if self._transfer(url, part_path, progress) is True:
+                    break
+            except (http.client.HTTPException, OSError) as e:
+                failures += 1
+                self._handle_failure(url, e, failures)
+        os.replace(part_path, path)
+        self.logger.verbose(f"{url} was saved to {path}")
+
+    def _transfer(
+        self,
+        url: str,
+        part_path: str,
+        progress: typing.Optional[DownloadProgressCallback]
+    ) -> bool:
+        """Request the missing bytes and return True once complete."""
+        offset = 0
+        if os.path.isfile(part_path):
+            offset = os.path.getsize(part_path)
+
+        headers = _get_request_headers(offset)
+
+        connection_url, connection, response = self._open(url, headers)
+        reuse = False
+        try:
+            complete = self._receive(
+                url,
+                response,
+                part_path,
+                offset,
+                progress
+            )
+            reuse = (response.will_close is False)
+            return complete
+        finally:
+            self.pool.release(connection_url, connection, reuse=reuse)
+
+    def open(
+        self,
+        url: str,
+        progress: typing.Optional[DownloadProgressCallback]=None
+    ) -> 'DownloadStream':
+        """Return a file object that reads a URL and resumes on failures."""
+        return DownloadStream(self, url, progress=progress)
+
+    def _open(
+        self,
+        url: str,
+        headers: typing.Dict[str, str]
+    ) -> typing.Tuple[
+        str,
+        http.client.HTTPConnection,
+        http.client.HTTPResponse
+    ]:
+        """
+        Request a URL and follow redirects.
+
+        Returns the URL of the connection, the connection and the response.
+        The connection must be released to the pool by the caller.
+        """
+        request_url = url
+        for _ in range(DOWNLOAD_MAX_REDIRECTS + 1):
+            connection_url = request_url
+            connection = self.pool.acquire(connection_url)
+            try:
+                response = self._request(connection, request_url, headers)
+            except BaseException:
+                self.pool.release(connection_url, connection, reuse=False)
+                raise
+
+            if response.status not in _REDIRECT_STATUS:
+                return connection_url, connection, response
+
+            location = response.getheader("Location")
+            reuse = False
+            try:
+                response.read()
+                reuse = (response.will_close is False)
+            finally:
+                self.pool.release(connection_url, connection, reuse=reuse)
+            if location is None:
+                raise iocage.errors.DownloadFailed(
+                    url=url,
+                    reason="redirect without location",
+                    logger=self.logger
+                )
+            request_url = urllib.parse.urljoin(request_url, location)
+
+        raise iocage.errors.DownloadFailed(
+            url=url,
+            reason="too many redirects",
+            logger=self.logger
+        )
+
+    def _request(
+        self,
+        connection: http.client.HTTPConnection,
+        url: str,
+        headers: typing.Dict[str, str]
+    ) -> http.client.HTTPResponse:
+        parsed = urllib.parse.urlparse(url)
+        target = parsed.path or "/"
+        if parsed.query:
+            target += f"?{parsed.query}"
+        if (parsed.scheme == "http") and (connection.host != parsed.hostname):
+            # plain HTTP proxies expect the absolute URL
+            target = url
+        connection.request("GET", target, headers=headers)
+        return connection.getresponse()
+
+    def _handle_failure(
+        self,
+        url: str,
+        error: BaseException,
+        failures: int
+    ) -> None:
+        """Raise when a download failed too often or log the resume."""
+        if failures > self.retries:
+            raise iocage.errors.DownloadFailed(
+                url=url,
+                reason=str(error) or type(error).__name__,
+                logger=self.logger
+            )
+        self.logger.verbose(
+            f"Download of {url} interrupted ({type(error).__name__}) - "
+            f"resuming ({failures}/{self.retries})"
+        )
+
+    def _receive(
+        self,
+        url: str,
+        response: http.client.HTTPResponse,
+        part_path: str,
+        offset: int,
+        progress: typing.Optional[DownloadProgressCallback]
+    ) -> bool:
+        total: typing.Optional[int] = None
+        content_length = response.getheader("Content-Length")
+
+        if response.status == 206:
+            start, total = _parse_content_range(
+                response.getheader("Content-Range")
+            )
+            if start != offset:
+                os.remove(part_path)
+                raise iocage.errors.DownloadFailed(
+                    url=url,
+                    reason="the mirror responded with an unexpected range",
+                    logger=self.logger
+                )
+            mode = "ab"
+        elif response.status == 200:
+            # the mirror ignored the range and sends the whole file
+            offset = 0
+            mode = "wb"
+            if content_length is not None:
+                total = int(content_length)
+        elif response.status == 416:
+            _, total = _parse_content_range(
+                response.getheader("Content-Range")
+            )
+            response.read()
+            if total == offset:
+                return True
+            # the partial file does not belong to the remote file
+            os.remove(part_path)
+            return False
+        else:
+            response.read()
+            raise iocage.errors.DownloadFailed(
+                url=url,
+                reason=f"HTTP {response.status} {response.reason}",
+                logger=self.logger
+            )
+
+        received = offset
+        with open(part_path, mode) as f:
+            if progress is not None:
+                progress(url, received, total)
+            while True:
+                if self._abort.is_set():
+                    raise iocage.errors.DownloadFailed(
+                        url=url,
+                        reason="aborted"
+                    )
+                chunk = response.read(DOWNLOAD_READ_SIZE)
+                if not chunk:
+                    break
+                f.write(chunk)
+                received += len(chunk)
+                if progress is not None:
+                    progress(url, received, total)
+
+        if (total is not None) and (received < total):
+            raise http.client.IncompleteRead(b"", total - received)
+        return True
+
+
+class DownloadStream(io.RawIOBase):
+    """
+    Read a remote file as a stream and resume it on connection failures.
+
+    When a connection drops, the remaining bytes are requested with an HTTP
+    Range request, so that the reader does not notice the interruption. A
+    mirror that ignores the Range header is read from the beginning and the
+    bytes already passed to the reader are skipped.
+    """
+
+    url: str
+    received: int
+    total: typing.Optional[int]
+
+    def __init__(
+        self,
+        downloader: Downloader,
+        url: str,
+        progress: typing.Optional[DownloadProgressCallback]=None
+    ) -> None:
+        io.RawIOBase.__init__(self)
+        self.downloader = downloader
+        self.url = url
+        self.progress = progress
+        self.received = 0
+        self.total = None
+        self._failures = 0
+        self._eof = False
+        self._connection: typing.Optional[
+            typing.Tuple[str, http.client.HTTPConnection]
+        ] = None
+        self._response: typing.Optional[http.client.HTTPResponse] = None
+
+    def readable(self) -> bool:
+        """Return True because the stream is readable."""
+        return True
+
+    def readinto(self, buffer: typing.Any) -> int:  # noqa: T484
+        """Read the next bytes of the remote file into a buffer."""
+        while self._eof is False:
+            if self.downloader._abort.is_set():
+                raise iocage.errors.DownloadFailed(
+                    url=self.url,
+                    reason="aborted"
+                )
+            try:
+                if self._response is None:
+                    self._connect()
+                    continue
+                count = self._response.readinto(buffer)
+                if (count == 0) and (self.total is not None):
+                    if self.received < self.total:
+                        raise http.client.IncompleteRead(
+                            b"",
+                            self.total - self.received
+                        )
+            except (http.client.HTTPException, OSError) as e:
+                self._release(reuse=False)
+                self._failures += 1
+                self.downloader._handle_failure(self.url, e, self._failures)
+                continue
+
+            if count == 0:
+                self._eof = True
+                self._release(reuse=True)
+                break
+
+            self.received += count
+            if self.progress is not None:
+                self.progress(self.url, self.received, self.total)
+            return int(count)
+        return 0
+
+    def close(self) -> None:
+        """Close the stream and release its connection."""
+        self._release(reuse=self._eof)
+        io.RawIOBase.close(self)
+
+    def _connect(self) -> None:
+        url = self.url
+        connection_url, connection, response = self.downloader._open(
+            url,
+            _get_request_headers(self.received)
+        )
+        self._connection = (connection_url, connection)
+        self._response = response
+
+        if response.status == 206:
+            start, self.total = _parse_content_range(
+                response.getheader("Content-Range")
+            )
+            if start != self.received:
+                self._release(reuse=False)
+                raise iocage.errors.DownloadFailed(
+                    url=url,
+                    reason="the mirror responded with an unexpected range",
+                    logger=self.downloader.logger
+                )
+        elif response.status == 200:
+            content_length = response.getheader("Content-Length")
+            if content_length is not None:
+                self.total = int(content_length)
+            # skip the bytes that were already read
+            skip = self.received
+            while skip > 0:
+                chunk = response.read(min(skip, DOWNLOAD_READ_SIZE))
+                if not chunk:
+                    raise http.client.IncompleteRead(b"", skip)
+                skip -= len(chunk)
+        elif (response.status == 416) and (self.received > 0):
+            response.read()
+            self._eof = True
+            self._release(reuse=True)
+        else:
+            response.read()
+            self._release(reuse=False)
+            raise iocage.errors.DownloadFailed(
+                url=url,
+                reason=f"HTTP {response.status} {response.reason}",
+                logger=self.downloader.logger
+            )
+
+    def _release(self, reuse: bool) -> None:
+        if self._connection is None:
+            return
+        connection_url, connection = self._connection
+        if self._response is not None:
+            reuse = reuse and (self._response.will_close is False)
+            reuse = reuse and (self._response.isclosed() is True)
+        self.downloader.pool.release(connection_url, connection, reuse=reuse)
+        self._connection = None
+        self._response = None
+
+
+class HashingReader(io.RawIOBase):
+    """
+    Hash the bytes read from a file object and optionally copy them.
+
+    The reader is placed between a download and its consumer, so that the
+    data is hashed and written to disk in the same pass it is processed.
+    """
+
+    def __init__(
+        self,
+        source: typing.BinaryIO,
+        algorithm: str="sha256",
+        copy_to: typing.Optional[typing.BinaryIO]=None
+    ) -> None:
+        io.RawIOBase.__init__(self)
+        self.source = source
+        self.hash = hashlib.new(algorithm)
+        self.copy_to = copy_to
+
+    def readable(self) -> bool:
+        """Return True because the reader is readable."""
+        return True
+
+    def readinto(self, buffer: typing.Any) -> int:  # noqa: T484
+        """Read from the source and hash the data."""
+        count = self.source.readinto(buffer)  # type: ignore
+        if count:
+            data = memoryview(buffer)[:count]
+            self.hash.update(data)
+            if self.copy_to is not None:
+                self.copy_to.write(data)
+        return int(count or 0)
+
+    def drain(self) -> None:
+        """Read the remaining bytes that were not consumed."""
+        buffer = bytearray(DOWNLOAD_READ_SIZE)
+        while self.readinto(buffer) > 0:
+            pass
+
+    def hexdigest(self) -> str:
+        """Return the hex digest of the data read so far."""
+        return str(self.hash.hexdigest())
+
+
+def _get_request_headers(offset: int) -> typing.Dict[str, str]:
+    headers = {"Accept-Encoding": "identity"}
+    if offset > 0:
+        headers["Range"] = f"bytes={offset}-"
+    return headers
+
+
+def _parse_content_range(
+    value: typing.Optional[str]
+) -> typing.Tuple[typing.Optional[int], typing.Optional[int]]:
+    """Return the start and the total size of a Content-Range header."""
+    if value is None:
+        return (None, None)
+    try:
+        _, _range = value.strip().split(" ", maxsplit=1)
+        _span, _total = _range.split("/", maxsplit=1)
+        start = None if (_span == "*") else int(_span.split("-")[0])
+        total = None if (_total == "*") else int(_total)
+        return (start, total)
+    except ValueError:
+        return (None, None)
@@ -0,0 +1,258 @@
+# Copyright (c) 2014-2018, iocage
+# Copyright (c) 2017-2018, Stefan Grönke
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted providing that the following conditions
+# are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+# IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+"""Trace the timing of nested iocage events."""
+import typing
+import json
+import os
+import threading
+from timeit import default_timer as timer
+
+import iocage.events
+
+
+class EventSpan:
+    """The time span of a single event within the traced event tree."""
+
+    event: 'iocage.events.IocageEvent'
+    parent: typing.Optional['EventSpan']
+    children: typing.List['EventSpan']
+    thread: int
+    started_at: float
+    stopped_at: typing.Optional[float]
+
+    def __init__(
+        self,
+        event: 'iocage.events.IocageEvent',
+        thread: int,
+        parent: typing.Optional['EventSpan']=None
+    ) -> None:
+        self.event = event
+        self.thread = thread
+        self.parent = parent
+        self.children = []
+        started_at = event.started_at
+        self.started_at = timer() if (started_at is None) else started_at
+        self.stopped_at = None
+
+    @property
+    def name(self) -> str:
+        """Return the event type and identifier."""
+        identifier = getattr(self.event, "identifier", None)
+        if identifier is None:
+            return self.event.type
+        return f"{self.event.type}@{identifier}"
+
+    @property
+    def duration(self) -> float:
+        """Return the number of seconds the event took."""
+        if self.stopped_at is None:
+            return 0.0
+        return max(0.0, self.stopped_at - self.started_at)
+
+    @property
+    def self_duration(self) -> float:
+        """Return the duration not spent in child events."""
+        children_duration = sum([x.duration for x in self.children])
+        return max(0.0, self.duration - children_duration)
+
+    @property
+    def path(self) -> typing.List[str]:
+        """Return the names of all events from the root to this span."""
+        if self.parent is None:
+            return [self.name]
+        return self.parent.path + [self.name]
+
+    def finish(self, stopped_at: typing.Optional[float]=None) -> None:
+        """Mark the span as finished."""
+        if self.stopped_at is not None:
+            return
+        self.stopped_at = timer() if (stopped_at is None) else stopped_at
+
+
+class EventTracer:
+    """
+    Collect the tree of iocage events and export their timing.
+
+    Events are nested by their event scope. A new event becomes the child of
+    the innermost open event of its scope that began on the same thread.
+    Events of a scope that run on other threads, like the workers of a
+    concurrent operation, are nested below the innermost open event of the
+    thread that began the scope. An event without open events in its scope
+    is nested by the order events begin and end in on its thread. The
+    collected tree is exported as Chrome trace JSON, that can be opened in
+    chrome://tracing or Perfetto, or as folded stacks, the input format of
+    flamegraph.pl.
+    """
+
+    roots: typing.List[EventSpan]
+    _open: typing.Dict[int, EventSpan]
+    _stacks: typing.Dict[int, typing.List[EventSpan]]
+    _threads: typing.Dict[int, int]
+
+    def __init__(self) -> None:
+        self.roots = []
+        self._open = {}
+        self._stacks = {}
+        self._threads = {}
+        self._lock = threading.Lock()
+        self._origin = timer()
+
+    def trace(
+        self,
+        events: typing.Iterable[typing.Any]
+    ) -> typing.Generator[typing.Any, None, None]:
+        """Record all events of an event generator while passing them on."""
+        for event in events:
+            self.record(event)
+            yield event
+
+    def record(self, event: typing.Any) -> None:
+        """Record the begin or end of an event."""
+        if isinstance(event, iocage.events.IocageEvent) is False:
+            return
+
+        thread = self._get_thread()
+        with self._lock:
+            stack = self._stacks.setdefault(thread, [])
+            span = self._open.get(id(event), None)
+
+            if event.pending is True:
+                if span is None:
+                    span = self._add_span(event, thread, stack)
+                    self._open[id(event)] = span
+                    stack.append(span)
+                return
+
+            if span is None:
+                # the event was not observed when it began
+                span = self._add_span(event, thread, stack)
+            else:
+                del self._open[id(event)]
+
+            stopped_at = event.stopped_at
+            if span in stack:
+                # finish child events that did not report their end
+                for child in stack[stack.index(span):]:
+                    child.finish(stopped_at)
+                    self._open.pop(id(child.event), None)
+                del stack[stack.index(span):]
+            span.finish(stopped_at)
+
+    def _add_span(
+        self,
+        event: 'iocage.events.IocageEvent',
+        thread: int,
+        stack: typing.List[EventSpan]
+    ) -> EventSpan:
+        parent = self._get_parent(event, thread, stack)
+        span = EventSpan(event, thread=thread, parent=parent)
+        if parent is None:
+            self.roots.append(span)
+        else:
+            parent.children.append(span)
+        return span
+
+    def _get_parent(
+        self,
+        event: 'iocage.events.IocageEvent',
+        thread: int,
+        stack: typing.List[EventSpan]
+    ) -> typing.Optional[EventSpan]:
+        # open spans are kept in the order they began
+        scope_spans = [
+            span for span in self._open.values()
+            if span.event.scope is event.scope
+        ]
+        if len(scope_spans) == 0:
+            return stack[-1] if (len(stack) > 0) else None
+
+        thread_spans = [x for x in scope_spans if x.thread == thread]
+        if len(thread_spans) == 0:
+            # concurrent workers nest below the thread that began the scope
+            scope_thread = scope_spans[0].thread
+            thread_spans = [x for x in scope_spans if x.thread == scope_thread]
+        return thread_spans[-1]
+
+    def _get_thread(self) -> int:
+        ident = threading.get_ident()
+        with self._lock:
+            if ident not in self._threads:
+                self._threads[ident] = len(self._threads) + 1
+            return self._threads[ident]
+
+    @property
+    def spans(self) -> typing.Generator[EventSpan, None, None]:
+        """Iterate over all recorded spans in depth-first order."""
+        pending = list(reversed(self.roots))
+        while len(pending) > 0:
+            span = pending.pop()
+            yield span
+            pending.extend(reversed(span.children))
+
+    def to_chrome_trace(self) -> typing.Dict[str, typing.Any]:
+        """Return the recorded events in Chrome trace event format."""
+        pid = os.getpid()
+        trace_events = []
+        for span in self.spans:
+            event = span.event
+            trace_events.append(dict(
+                name=span.name,
+                cat=event.type,
+                ph="X",
+                ts=round((span.started_at - self._origin) * 1000000),
+                dur=round(span.duration * 1000000),
+                pid=pid,
+                tid=span.thread,
+                args=dict(
+                    state=event.get_state_string(),
+                    message=event.message
+                )
+            ))
+        return dict(traceEvents=trace_events, displayTimeUnit="ms")
+
+    def to_folded_stacks(self) -> typing.List[str]:
+        """
+        Return the recorded events as folded stacks.
+
+        Each line holds the semicolon separated event path followed by the
+        number of microseconds spent in the event itself.
+        """
+        durations: typing.Dict[str, int] = {}
+        for span in self.spans:
+            path = ";".join([x.replace(";", ":") for x in span.path])
+            durations[path] = durations.get(path, 0) + round(
+                span.self_duration * 1000000
+            )
+        return [f"{path} {duration}" for path, duration in durations.items()]
+
+    def write_chrome_trace(self, path: str) -> None:
+        """Write the Chrome trace JSON file."""
+        with open(path, "w", encoding="UTF-8") as f:
+            json.dump(self.to_chrome_trace(), f)
+
+    def write_folded_stacks(self, path: str) -> None:
+        """Write the folded stacks text file."""
+        with open(path, "w", encoding="UTF-8") as f:
+            f.write("\n".join(self.to_folded_stacks()) + "\n")
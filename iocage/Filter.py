@@ -39,20 +39,267 @@ _TermValuesType = typing.Union[
 ]
 
 _REGEX_PATTERN_SPLIT_COMMA = re.compile(r"(?<!\\),")
+# regular expression characters not escaped in filter strings
+_REGEX_CHARACTERS = ("[", "]", "{", "}", "|", "\\",)
+
+# The data a filter term requires to be matched, ordered by lookup cost
+DATA_SOURCES = (
+    "name",
+    "source",
+    "state",
+    "config"
+)
+
+# Keys that are read from the runtime state of a jail
+STATE_KEYS = (
+    "jid",
+    "running",
+    "stopped",
+    "ip4.addr",
+    "ip6.addr"
+)
+
+
+def get_data_source(key: str) -> str:
+    """
+    Return the kind of data that is required to look up a key.
 
+    Names and sources are known from a resources dataset, whereas the
+    runtime state requires a jls query and all other keys require the
+    resource configuration to be loaded.
+    """
+    if key in ["name", "source"]:
+        return key
+    if key in STATE_KEYS:
+        return "state"
+    return "config"
 
-def match_filter(value: str, filter_string: str) -> bool:
-    """Return True when the value matches the filter string."""
+
+def _translate_filter_string(filter_string: str) -> str:
     escaped_characters = [".", "$", "^", "(", ")", "?"]
     for character in escaped_characters:
         filter_string = filter_string.replace(character, f"\\{character}")
     filter_string = filter_string.replace("*", ".*")
     filter_string = filter_string.replace("+", ".+")
-    pattern = f"^{filter_string}$"
+    return filter_string
+
+
+def _has_regex_characters(filter_string: str) -> bool:
+    """Return True when a filter string is no literal after translation."""
+    return any([(x in filter_string) for x in _REGEX_CHARACTERS])
+
+
+def match_filter(value: str, filter_string: str) -> bool:
+    """Return True when the value matches the filter string."""
+    pattern = f"^{_translate_filter_string(filter_string)}$"
     match = re.match(pattern, value)
     return match is not None
 
 
+def _is_same(
+    a: typing.Tuple[typing.Any, ...],
+    b: typing.Tuple[typing.Any, ...]
+) -> bool:
+    return (len(a) == len(b)) and all(x is y for x, y in zip(a, b))
+
+
+class CompiledTerm:
+    """
+    A filter Term compiled for repeated matching.
+
+    Glob filter strings and those containing other regular expression
+    characters are merged into a single precompiled regular expression,
+    literal alternatives are looked up in frozensets and the results for
+    boolean and None values are resolved once at compile time.
+    """
+
+    key: str
+    short: bool
+    data_source: str
+    cost: int
+    exact_values: typing.FrozenSet[str]
+    parsed_values: typing.FrozenSet[typing.Optional[bool]]
+    shortnames: typing.FrozenSet[str]
+    pattern: typing.Optional[typing.Pattern]
+
+    def __init__(self, term: 'Term') -> None:
+        self.key = term.key
+        self.short = term.short
+        self.data_source = term.data_source
+        self.cost = term.cost
+
+        exact_values: typing.Set[str] = set()
+        parsed_values: typing.Set[typing.Optional[bool]] = set()
+        shortnames: typing.Set[str] = set()
+        patterns: typing.List[str] = []
+
+        _parse_user_input = iocage.helpers.parse_user_input
+        for filter_string in term.filter_strings:
+            if term._filter_string_has_globs(filter_string) is True:
+                patterns.append(_translate_filter_string(filter_string))
+                continue
+            if _has_regex_characters(filter_string) is True:
+                # like any filter string matched as regular expression
+                patterns.append(_translate_filter_string(filter_string))
+            else:
+                exact_values.add(filter_string)
+            parsed_filter = _parse_user_input(filter_string)
+            if (parsed_filter is None) or isinstance(parsed_filter, bool):
+                parsed_values.add(parsed_filter)
+            if len(filter_string) == 8:
+                shortnames.add(filter_string)
+
+        self.exact_values = frozenset(exact_values)
+        self.parsed_values = frozenset(parsed_values)
+        self.shortnames = frozenset(shortnames)
+
+        if len(patterns) == 0:
+            self.pattern = None
+        else:
+            self.pattern = re.compile("^(?:" + "|".join(patterns) + ")$")
+
+        # booleans and None are stringified to a constant value
+        self._constant_results = {
+            None: self._matches_string("-"),
+            True: self._matches_string("yes"),
+            False: self._matches_string("no")
+        }
+
+    def matches(self, value: typing.Any, short: bool=False) -> bool:
+        """Return True if the value matches the compiled term."""
+        if value is None:
+            return self._constant_results[None]
+        if isinstance(value, bool):
+            return self._constant_results[value]
+        if isinstance(value, list):
+            # `short` not required here
+            return any(map(self.matches, value))
+        return self._matches_string(iocage.helpers.to_string(value), short)
+
+    def matches_resource(
+        self,
+        resource: 'iocage.Resource.Resource'
+    ) -> bool:
+        """Return True if the compiled term matches the resource."""
+        return self.matches(resource.get(self.key), self.short)
+
+    def _matches_string(self, value: str, short: bool=False) -> bool:
+        if value in self.exact_values:
+            return True
+
+        if (self.pattern is not None) and self.pattern.match(value):
+            return True
+
+        if (short is True) and (len(self.shortnames) > 0):
+            shortname = iocage.helpers.to_humanreadable_name(value)
+            if shortname in self.shortnames:
+                return True
+
+        if len(self.parsed_values) > 0:
+            parsed_value = iocage.helpers.parse_user_input(value)
+            if (parsed_value is None) or isinstance(parsed_value, bool):
+                return (parsed_value in self.parsed_values) is True
+
+        return False
+
+
+class CompiledTerms(list):
+    """
+    Filter Terms compiled for repeated matching.
+
+    The compiled terms are ordered by the cost of their data source and
+    indexed by key, so that a ListableResource can reuse one instance for
+    all resources it iterates.
+    """
+
+    source_name: typing.Optional[str]
+
+    def __init__(self, terms: typing.Iterable['Term']) -> None:
+        _terms = list(terms)
+        list.__init__(self, sorted(
+            [CompiledTerm(term) for term in _terms],
+            key=lambda x: x.cost
+        ))
+
+        self.source_name = None
+        for term in _terms:
+            if term.key != "name":
+                continue
+            # All name terms have been transformed to ResourceSelector
+            self.source_name = term[0].source_name
+            break
+
+        self._terms_by_key: typing.Dict[str, typing.List[CompiledTerm]] = {}
+        self._terms_by_data_source: typing.Dict[
+            str,
+            typing.List[CompiledTerm]
+        ] = {}
+        for compiled_term in self:
+            self._terms_by_key.setdefault(
+                compiled_term.key,
+                []
+            ).append(compiled_term)
+            self._terms_by_data_source.setdefault(
+                compiled_term.data_source,
+                []
+            ).append(compiled_term)
+
+    def match_resource(
+        self,
+        resource: 'iocage.Resource.Resource',
+        data_sources: typing.Optional[typing.Iterable[str]]=None
+    ) -> bool:
+        """Return True if all compiled terms match the resource."""
+        if data_sources is None:
+            terms: typing.Iterable[CompiledTerm] = self
+        else:
+            _data_sources = set(data_sources)
+            terms = filter(lambda x: x.data_source in _data_sources, self)
+        for term in terms:
+            if term.matches_resource(resource) is False:
+                return False
+        return True
+
+    def requires_data_source(self, data_source: str) -> bool:
+        """Return True if any compiled term requires the data source."""
+        return data_source in self._terms_by_data_source
+
+    def match_data_source(
+        self,
+        data_source: str,
+        get_value: typing.Callable[[str], typing.Any],
+        keys: typing.Optional[typing.Iterable[str]]=None
+    ) -> bool:
+        """Check if all compiled terms of a data source match."""
+        _keys = None if (keys is None) else set(keys)
+        for term in self._terms_by_data_source.get(data_source, []):
+            if (_keys is not None) and (term.key not in _keys):
+                continue
+            if term.matches(get_value(term.key), term.short) is False:
+                return False
+        return True
+
+    def match_key(self, key: str, value: str) -> bool:
+        """Check if a value matches all compiled terms of a key."""
+        short = (key == "name")
+        for term in self._terms_by_key.get(key, []):
+            if term.matches(value, short) is False:
+                return False
+        return True
+
+    def match_source(self, source_name: str) -> bool:
+        """
+        Check if the source name matches the filter terms.
+
+        Both the source of a name selector and source terms are matched.
+        """
+        if (self.source_name is not None) and (
+            self.source_name != source_name
+        ):
+            return False
+        return self.match_key("source", source_name)
+
+
 class Term(list):
     """A single filter term."""
 
@@ -74,6 +321,9 @@ class Term(list):
         elif values is None:
             data = []
 
+        self._compiled: typing.Optional[
+            typing.Tuple[typing.Tuple[typing.Any, ...], CompiledTerm]
+        ] = None
         list.__init__(self, data)
 
     @property
@@ -81,13 +331,44 @@ class Term(list):
         """Return True if the short name of a UUID be used."""
         return (self.key == "name") is True
 
+    @property
+    def data_source(self) -> str:
+        """Return the kind of data that is required to match the term."""
+        return get_data_source(self.key)
+
+    @property
+    def cost(self) -> int:
+        """Return the relative cost of looking up the terms data source."""
+        return DATA_SOURCES.index(self.data_source)
+
+    @property
+    def filter_strings(self) -> typing.List[str]:
+        """Return the flat list of filter strings of the term."""
+        filter_strings: typing.List[str] = []
+        for filter_value in self:
+            if isinstance(filter_value, str):
+                filter_strings.append(filter_value)
+            elif isinstance(filter_value, _ResourceSelector):
+                filter_strings.append(filter_value.name)
+            elif isinstance(filter_value, list):
+                filter_strings += filter_value
+        return filter_strings
+
+    def compile(self) -> CompiledTerm:
+        """Return the term compiled for repeated matching."""
+        values = tuple(self)
+        compiled = self._compiled
+        if (compiled is None) or (_is_same(compiled[0], values) is False):
+            compiled = (values, CompiledTerm(self))
+            self._compiled = compiled
+        return compiled[1]
+
     def matches_resource(
         self,
         resource: 'iocage.Resource.Resource'
     ) -> bool:
         """Return True if the term matches the resource."""
-        value = resource.get(self.key)
-        return self.matches(value, self.short)
+        return self.compile().matches_resource(resource)
 
     def matches(self, value: typing.Any, short: bool=False) -> bool:
         """
@@ -103,55 +384,7 @@ class Term(list):
                 to match a jail's shortname as well. This is required for
                 selecting jails with UUIDs by the first part of the name
         """
-        # match any item of a list
-        if (value is not None) and isinstance(value, list):
-            # `short` not required here
-            return any(map(self.matches, value))
-
-        input_value = iocage.helpers.to_string(value)
-
-        for filter_value in self:
-
-            if isinstance(filter_value, str):
-                if self._match_filter(input_value, filter_value, short):
-                    return True
-            elif isinstance(filter_value, _ResourceSelector):
-                if self._match_filter(input_value, filter_value.name, short):
-                    return True
-            elif isinstance(filter_value, list):
-                results = list(map(
-                    lambda x: self._match_filter(input_value, x, short),
-                    filter_value
-                ))
-                if any(results):
-                    return True
-
-        return False
-
-    def _match_filter(
-        self,
-        value: str,
-        filter_string: str,
-        short: bool=False
-    ) -> bool:
-        if match_filter(value, filter_string) is True:
-            return True
-
-        has_no_globs = not self._filter_string_has_globs(filter_string)
-        if has_no_globs is True:
-            # match against humanreadable names as well
-            has_humanreadble_length = (len(filter_string) == 8)
-            if (has_humanreadble_length is True) and (short is True):
-                shortname = iocage.helpers.to_humanreadable_name(value)
-                if shortname == filter_string:
-                    return True
-
-            _parse_user_input = iocage.helpers.parse_user_input
-            parsed_value = _parse_user_input(value)
-            parsed_filter = _parse_user_input(filter_string)
-            return (parsed_value == parsed_filter) is True
-
-        return False
+        return self.compile().matches(value, short)
 
     def _filter_string_has_globs(self, filter_string: str) -> bool:
         for glob in self.glob_characters:
@@ -212,6 +445,9 @@ class Terms(list):
     ) -> None:
 
         self.logger = logger
+        self._compiled: typing.Optional[
+            typing.Tuple[typing.Tuple[Term, ...], CompiledTerms]
+        ] = None
         list.__init__(self, [])
         Terms.set(self, terms)
 
@@ -258,50 +494,78 @@ class Terms(list):
         _term = term if isinstance(term, Term) else self._parse_term(term)
         list.append(self, _term)
 
+    def compile(self) -> CompiledTerms:
+        """
+        Return the Terms compiled for repeated matching.
+
+        The compiled terms are cached until the list of terms changes, so
+        that matching many resources does not parse the filters again.
+        """
+        terms = tuple(self)
+        compiled = self._compiled
+        if (compiled is None) or (_is_same(compiled[0], terms) is False):
+            compiled = (terms, CompiledTerms(terms))
+            self._compiled = compiled
+        return compiled[1]
+
     def match_resource(
         self,
-        resource: 'iocage.Resource.Resource'
+        resource: 'iocage.Resource.Resource',
+        data_sources: typing.Optional[typing.Iterable[str]]=None
     ) -> bool:
-        """Return True if all Terms match the resource."""
-        for term in self:
-            if term.matches_resource(resource) is False:
-                return False
-        return True
+        """
+        Return True if all Terms match the resource.
 
-    def match_key(self, key: str, value: str) -> bool:
+        Terms are matched in the order of their data source lookup cost, so
+        that cheap checks reject a resource before expensive ones run.
+
+        Args:
+
+            data_sources (list): (optional)
+                Only match terms that require one of the given data sources.
+                Terms of other data sources were already matched otherwise.
         """
-        Check if a value matches for a given key.
+        return self.compile().match_resource(resource, data_sources)
 
-        Returns True if the given value matches all terms for the specified key
-        Returns Fals if one of the terms does not match
+    def requires_data_source(self, data_source: str) -> bool:
+        """Return True if any Term requires the given data source."""
+        return self.compile().requires_data_source(data_source)
+
+    def match_data_source(
+        self,
+        data_source: str,
+        get_value: typing.Callable[[str], typing.Any],
+        keys: typing.Optional[typing.Iterable[str]]=None
+    ) -> bool:
         """
-        for term in self:
+        Check if all terms of a data source match.
 
-            if term.key != key:
-                continue
+        Args:
 
-            if (key == "name"):
-                short = True
+            data_source (str):
+                Only terms requiring this data source are matched.
 
-            if term.matches(value, short) is False:
-                return False
+            get_value (callable):
+                Returns the value that is matched for a given term key.
 
-        return True
+            keys (list): (optional)
+                Only match terms of the given keys. Terms of other keys are
+                ignored.
+        """
+        return self.compile().match_data_source(data_source, get_value, keys)
 
-    def match_source(self, source_name: str) -> bool:
-        """Check if the source name matches the filter terms."""
-        for term in self:
-            if term.key != "name":
-                continue
+    def match_key(self, key: str, value: str) -> bool:
+        """
+        Check if a value matches for a given key.
 
-            # All name terms have been transformed to ResourceSelector
-            resource_selector = term[0]
-            if resource_selector.source_name is None:
-                return True
-            return (resource_selector.source_name == source_name) is True
+        Returns True if the given value matches all terms for the specified key
+        Returns Fals if one of the terms does not match
+        """
+        return self.compile().match_key(key, value)
 
-        # no name term or none at all
-        return True
+    def match_source(self, source_name: str) -> bool:
+        """Check if the source name matches the filter terms."""
+        return self.compile().match_source(source_name)
 
     def _parse_term(self, user_input: str) -> Term:
         value: typing.Any
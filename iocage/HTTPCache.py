@@ -0,0 +1,296 @@
+# Copyright (c) 2014-2018, iocage
+# Copyright (c) 2017-2018, Stefan Grönke
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted providing that the following conditions
+# are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+# IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+"""Persistent cache of HTTP resources with conditional revalidation."""
+import typing
+import email.utils
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import iocage.errors
+import iocage.helpers_object
+
+# MyPy
+import iocage.Logger
+
+# The directory of the HTTP cache shared by all processes of the host
+DEFAULT_CACHE_DIRECTORY = "/var/cache/iocage/http"
+
+# The number of seconds a cached response is used without revalidation
+DEFAULT_TTL = 6 * 60 * 60
+
+# The number of seconds after the TTL during which a stale response is
+# returned immediately while it gets revalidated in the background
+DEFAULT_STALE_TTL = 7 * 24 * 60 * 60
+
+HTTP_TIMEOUT = 30
+
+
+class CachedResponse:
+    """A response body with the metadata required for revalidation."""
+
+    url: str
+    body: bytes
+    etag: typing.Optional[str]
+    last_modified: typing.Optional[str]
+    charset: typing.Optional[str]
+    fetched_at: float
+
+    def __init__(
+        self,
+        url: str,
+        body: bytes,
+        etag: typing.Optional[str]=None,
+        last_modified: typing.Optional[str]=None,
+        charset: typing.Optional[str]=None,
+        fetched_at: typing.Optional[float]=None
+    ) -> None:
+        self.url = url
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.charset = charset
+        self.fetched_at = time.time() if (fetched_at is None) else fetched_at
+
+    @property
+    def age(self) -> float:
+        """Return the number of seconds since the response was validated."""
+        return max(0.0, time.time() - self.fetched_at)
+
+    @property
+    def text(self) -> str:
+        """Return the decoded response body."""
+        charset = self.charset if self.charset else "UTF-8"
+        return self.body.decode(charset, "ignore")
+
+
+class HTTPCache:
+    """
+    Cache HTTP resources on disk and revalidate them conditionally.
+
+    Responses younger than the TTL are served from disk without any network
+    request, also to following processes. Older responses are revalidated
+    with If-None-Match and If-Modified-Since headers, so that an unchanged
+    resource is confirmed by a bodyless 304 response. Within the stale TTL
+    the cached response is returned immediately and revalidated in a
+    background daemon thread, which is abandoned when the process exits.
+    When the remote is unreachable, a cached response of any age is
+    preferred over an error.
+    """
+
+    directory: str
+    ttl: float
+    stale_ttl: float
+
+    def __init__(
+        self,
+        directory: str=DEFAULT_CACHE_DIRECTORY,
+        ttl: float=DEFAULT_TTL,
+        stale_ttl: float=DEFAULT_STALE_TTL,
+        logger: typing.Optional['iocage.Logger.Logger']=None
+    ) -> None:
+        self.logger = iocage.helpers_object.init_logger(self, logger)
+        self.directory = directory
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._lock = threading.Lock()
+        self._revalidations: typing.Dict[str, threading.Thread] = {}
+
+    def get(
+        self,
+        url: str,
+        headers: typing.Optional[typing.Dict[str, str]]=None
+    ) -> CachedResponse:
+        """
+        Return the cached or downloaded response of a URL.
+
+        Raises iocage.errors.DownloadFailed when the URL could neither be
+        loaded from the remote nor from the cache.
+        """
+        cached = self._load(url)
+        if cached is not None:
+            if cached.age < self.ttl:
+                self.logger.spam(f"Using cached response of {url}")
+                return cached
+            if cached.age < (self.ttl + self.stale_ttl):
+                self.logger.spam(f"Revalidating {url} in the background")
+                self._revalidate_in_background(url, headers, cached)
+                return cached
+
+        try:
+            return self._fetch(url, headers, cached)
+        except iocage.errors.DownloadFailed:
+            if cached is None:
+                raise
+            self.logger.verbose(f"Using stale response of {url}")
+            return cached
+
+    def wait(self) -> None:
+        """Wait for all background revalidations to finish."""
+        with self._lock:
+            threads = list(self._revalidations.values())
+        for thread in threads:
+            thread.join()
+
+    def invalidate(self, url: str) -> None:
+        """Remove a cached response."""
+        try:
+            os.remove(self._get_path(url))
+        except FileNotFoundError:
+            pass
+
+    def _revalidate_in_background(
+        self,
+        url: str,
+        headers: typing.Optional[typing.Dict[str, str]],
+        cached: CachedResponse
+    ) -> None:
+        with self._lock:
+            if url in self._revalidations:
+                return
+            thread = threading.Thread(
+                target=self._revalidate,
+                args=(url, headers, cached),
+                name=f"HTTPCache revalidation of {url}",
+                daemon=True
+            )
+            self._revalidations[url] = thread
+        thread.start()
+
+    def _revalidate(
+        self,
+        url: str,
+        headers: typing.Optional[typing.Dict[str, str]],
+        cached: CachedResponse
+    ) -> None:
+        try:
+            self._fetch(url, headers, cached)
+        except iocage.errors.DownloadFailed as e:
+            self.logger.debug(f"Background revalidation failed: {e}")
+        finally:
+            with self._lock:
+                del self._revalidations[url]
+
+    def _fetch(
+        self,
+        url: str,
+        headers: typing.Optional[typing.Dict[str, str]],
+        cached: typing.Optional[CachedResponse]
+    ) -> CachedResponse:
+        request_headers = dict() if (headers is None) else dict(headers)
+        if cached is not None:
+            if cached.etag is not None:
+                request_headers["If-None-Match"] = cached.etag
+            if cached.last_modified is not None:
+                request_headers["If-Modified-Since"] = cached.last_modified
+
+        request = urllib.request.Request(url, headers=request_headers)
+        self.logger.verbose(f"Requesting {url}")
+        try:
+            with urllib.request.urlopen(  # nosec: B310 trusted URLs
+                request,
+                timeout=HTTP_TIMEOUT
+            ) as response:
+                body = response.read()
+                response_headers = response.headers
+        except urllib.error.HTTPError as e:
+            if (e.code == 304) and (cached is not None):
+                self.logger.spam(f"{url} was not modified")
+                cached.fetched_at = time.time()
+                self._store(cached)
+                return cached
+            raise iocage.errors.DownloadFailed(
+                url=url,
+                reason=f"HTTP {e.code} {e.reason}"
+            )
+        except (urllib.error.URLError, OSError) as e:
+            raise iocage.errors.DownloadFailed(url=url, reason=str(e))
+
+        fetched = CachedResponse(
+            url=url,
+            body=body,
+            etag=response_headers.get("ETag", None),
+            last_modified=response_headers.get("Last-Modified", None),
+            charset=response_headers.get_content_charset()
+        )
+        if (fetched.etag is None) and (fetched.last_modified is None):
+            # allow revalidation against the time of the download
+            fetched.last_modified = email.utils.formatdate(usegmt=True)
+        self._store(fetched)
+        return fetched
+
+    def _get_path(self, url: str) -> str:
+        name = hashlib.sha256(url.encode("UTF-8")).hexdigest()
+        return os.path.join(self.directory, name)
+
+    def _load(self, url: str) -> typing.Optional[CachedResponse]:
+        try:
+            with open(self._get_path(url), "rb") as f:
+                metadata = json.loads(f.readline().decode("UTF-8"))
+                body = f.read()
+        except (OSError, ValueError):
+            return None
+        if metadata.get("url", None) != url:
+            return None
+        return CachedResponse(
+            url=url,
+            body=body,
+            etag=metadata.get("etag", None),
+            last_modified=metadata.get("last_modified", None),
+            charset=metadata.get("charset", None),
+            fetched_at=float(metadata.get("fetched_at", 0))
+        )
+
+    def _store(self, response: CachedResponse) -> None:
+        """Atomically write a response to the cache."""
+        metadata = dict(
+            url=response.url,
+            etag=response.etag,
+            last_modified=response.last_modified,
+            charset=response.charset,
+            fetched_at=response.fetched_at
+        )
+        path = self._get_path(response.url)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, temporary_path = tempfile.mkstemp(
+                dir=self.directory,
+                prefix=f".{os.path.basename(path)}."
+            )
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(json.dumps(metadata).encode("UTF-8") + b"\n")
+                    f.write(response.body)
+                os.replace(temporary_path, path)
+            except BaseException:
+                os.unlink(temporary_path)
+                raise
+        except OSError as e:
+            self.logger.debug(f"Could not cache {response.url}: {e}")
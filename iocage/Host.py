@@ -25,15 +25,18 @@
 """iocage Host module."""
 import typing
 import os
-import platform
 import re
-import sysctl
+import threading
 
 import libzfs
 
+import iocage.AssetCache
 import iocage.Datasets
 import iocage.DevfsRules
 import iocage.Distribution
+import iocage.HostFacts
+import iocage.HTTPCache
+import iocage.Inventory
 import iocage.Resource
 import iocage.helpers
 import iocage.helpers_object
@@ -53,11 +56,20 @@ class HostGenerator:
     _class_distribution = iocage.Distribution.DistributionGenerator
 
     _devfs: iocage.DevfsRules.DevfsRules
+    _devfs_lock = threading.Lock()
+    _jail_inventories_lock: threading.Lock
     _defaults: iocage.Resource.DefaultResource
     _defaults_initialized = False
     releases_dataset: libzfs.ZFSDataset
     datasets: iocage.Datasets.Datasets
     distribution: _distribution_types
+    facts: 'iocage.HostFacts.HostFacts'
+    cache_directory: typing.Optional[str]
+    cache_ttl: typing.Optional[float]
+    _asset_cache: typing.Optional['iocage.AssetCache.AssetCache'] = None
+    _http_cache: typing.Optional['iocage.HTTPCache.HTTPCache'] = None
+    _caches_lock: threading.Lock
+    jail_inventories: typing.Dict[str, 'iocage.Inventory.JailInventory']
 
     branch_pattern = re.compile(
         r"""\(hardened/
@@ -78,12 +90,64 @@ class HostGenerator:
         defaults: typing.Optional[iocage.Resource.DefaultResource]=None,
         datasets: typing.Optional[iocage.Datasets.Datasets]=None,
         zfs: typing.Optional['iocage.ZFS.ZFS']=None,
-        logger: typing.Optional['iocage.Logger.Logger']=None
+        logger: typing.Optional['iocage.Logger.Logger']=None,
+        facts: typing.Optional['iocage.HostFacts.HostFacts']=None,
+        asset_cache: typing.Optional['iocage.AssetCache.AssetCache']=None,
+        http_cache: typing.Optional['iocage.HTTPCache.HTTPCache']=None,
+        cache_directory: typing.Optional[str]=None,
+        cache_ttl: typing.Optional[float]=None
     ) -> None:
+        """
+        Initialize the jail host.
 
+        Args:
+
+            facts (iocage.HostFacts.HostFacts): (optional)
+                The memoized host facts. Defaults to the facts shared by all
+                objects of the process, or to facts persisted in the cache
+                directory when one is given.
+
+            asset_cache (iocage.AssetCache.AssetCache): (optional)
+                The cache of release assets shared by all root datasets.
+                Defaults to the cache in the assets folder of the cache
+                directory, which is created when it is first used.
+
+            http_cache (iocage.HTTPCache.HTTPCache): (optional)
+                The cache of the release list and EOL information. Defaults
+                to the cache in the http folder of the cache directory,
+                which is created when it is first used.
+
+            cache_directory (str): (optional)
+                The directory of the default caches and of the persisted
+                host facts. Defaults to /var/cache/iocage.
+
+            cache_ttl (float): (optional)
+                Seconds the default HTTP cache uses responses before they
+                are revalidated.
+        """
         self.logger = iocage.helpers_object.init_logger(self, logger)
         self.zfs = iocage.helpers_object.init_zfs(self, zfs)
 
+        if facts is not None:
+            self.facts = facts
+        elif cache_directory is not None:
+            self.facts = iocage.HostFacts.HostFacts(
+                cache_file=os.path.join(cache_directory, "host_facts.json"),
+                logger=self.logger
+            )
+        else:
+            self.facts = iocage.HostFacts.host_facts
+
+        self.cache_directory = cache_directory
+        self.cache_ttl = cache_ttl
+        self._asset_cache = asset_cache
+        self._http_cache = http_cache
+        self._caches_lock = threading.Lock()
+
+        # loaded jail inventories by root dataset name
+        self.jail_inventories = {}
+        self._jail_inventories_lock = threading.Lock()
+
         if datasets is not None:
             self.datasets = datasets
         else:
@@ -132,22 +196,83 @@ class HostGenerator:
     @property
     def devfs(self) -> 'iocage.DevfsRules.DevfsRules':
         """Return the lazy-loaded DevfsRules instance."""
-        if "_devfs" not in dir(self):
-            self._devfs = iocage.DevfsRules.DevfsRules(
-                logger=self.logger
-            )
+        with self._devfs_lock:
+            if "_devfs" not in dir(self):
+                self._devfs = iocage.DevfsRules.DevfsRules(
+                    logger=self.logger
+                )
         return self._devfs
 
+    def get_jail_inventory(
+        self,
+        root_name: str
+    ) -> 'iocage.Inventory.JailInventory':
+        """
+        Return the loaded jail inventory of a root dataset.
+
+        The inventory of each root dataset is shared by all jails of the host
+        and only read again after it was written by another instance.
+        """
+        with self._jail_inventories_lock:
+            inventory = self.jail_inventories.get(root_name, None)
+            if (inventory is None) or (inventory.changed_on_disk is True):
+                inventory = iocage.Inventory.JailInventory(
+                    root_datasets=self.datasets[root_name],
+                    host=self,
+                    logger=self.logger,
+                    zfs=self.zfs
+                )
+                inventory.load()
+                self.jail_inventories[root_name] = inventory
+            return inventory
+
+    @property
+    def asset_cache(self) -> 'iocage.AssetCache.AssetCache':
+        """Return the lazy-loaded release asset cache."""
+        with self._caches_lock:
+            if self._asset_cache is None:
+                kwargs: typing.Dict[str, typing.Any] = {}
+                if self.cache_directory is not None:
+                    kwargs["directory"] = os.path.join(
+                        self.cache_directory,
+                        "assets"
+                    )
+                self._asset_cache = iocage.AssetCache.AssetCache(
+                    logger=self.logger,
+                    **kwargs
+                )
+        return self._asset_cache
+
+    @property
+    def http_cache(self) -> 'iocage.HTTPCache.HTTPCache':
+        """Return the lazy-loaded cache of the release list and EOL data."""
+        with self._caches_lock:
+            if self._http_cache is None:
+                kwargs: typing.Dict[str, typing.Any] = {}
+                if self.cache_directory is not None:
+                    kwargs["directory"] = os.path.join(
+                        self.cache_directory,
+                        "http"
+                    )
+                if self.cache_ttl is not None:
+                    kwargs["ttl"] = self.cache_ttl
+                self._http_cache = iocage.HTTPCache.HTTPCache(
+                    logger=self.logger,
+                    **kwargs
+                )
+        return self._http_cache
+
     @property
     def userland_version(self) -> float:
         """Return the host userland version number."""
-        return float(iocage.helpers.get_os_version()["userland"])
+        return float(self.facts["os_version"]["userland"])
 
     @property
     def release_version(self) -> str:
         """Return the host release version."""
+        uname = self.facts["uname"]
         if self.distribution.name == "FreeBSD":
-            release_version_string = os.uname()[2]
+            release_version_string = uname[2]
             release_version_fragments = release_version_string.split("-")
 
             if len(release_version_fragments) > 1:
@@ -155,11 +280,11 @@ class HostGenerator:
 
         elif self.distribution.name == "HardenedBSD":
 
-            match = re.search(self.branch_pattern, os.uname()[3])
+            match = re.search(self.branch_pattern, uname[3])
             if match is not None:
                 return match["release"].upper()
 
-            match = re.search(self.release_name_pattern, os.uname()[2])
+            match = re.search(self.release_name_pattern, uname[2])
             if match is not None:
                 return f"{match['major']}-{match['type']}"
 
@@ -168,13 +293,12 @@ class HostGenerator:
     @property
     def processor(self) -> str:
         """Return the hosts processor architecture."""
-        return platform.processor()
+        return str(self.facts["processor"])
 
     @property
     def ipfw_enabled(self) -> bool:
         """Return True if ipfw is enabled on the host system."""
-        _sysctl = sysctl.filter("net.inet.ip.fw.enable")
-        return ((len(_sysctl) == 1) and (_sysctl[0].value == 1))
+        return (self.facts["ipfw_enabled"] is True)
 
 
 class Host(HostGenerator):
@@ -0,0 +1,199 @@
+# Copyright (c) 2014-2018, iocage
+# Copyright (c) 2017-2018, Stefan Grönke
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted providing that the following conditions
+# are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+# IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+"""iocage host facts cache."""
+import typing
+import json
+import os
+import platform
+import tempfile
+import threading
+import sysctl
+
+import iocage.helpers
+
+# MyPy
+import iocage.Logger
+
+HostFactValue = typing.Any
+
+# The file persisting the facts of the host until it is rebooted
+DEFAULT_CACHE_FILE = "/var/cache/iocage/host_facts.json"
+
+
+class HostFacts(dict):
+    """
+    Memoized facts about the jail host.
+
+    Host facts like the userland version or the processor architecture are
+    expensive to determine (file reads, sysctl and platform calls) but do not
+    change while a process runs. Each fact is collected on its first access
+    and then served from memory until it is explicitly refreshed.
+
+    When a cache file is configured, facts that can only change with a reboot
+    are persisted together with the boot time of the host, so that following
+    processes reuse them until the host was rebooted. Facts are collected
+    under a lock, because concurrently started jails share them.
+    """
+
+    # facts that do not change until the host is rebooted
+    persistent_facts = ("os_version", "uname", "processor", "distribution")
+
+    cache_file: typing.Optional[str]
+    logger: typing.Optional['iocage.Logger.Logger']
+    _loaded: bool
+    _lock: threading.RLock
+
+    def __init__(
+        self,
+        cache_file: typing.Optional[str]=None,
+        logger: typing.Optional['iocage.Logger.Logger']=None
+    ) -> None:
+        """
+        Initialize a host facts cache.
+
+        Args:
+
+            cache_file (str): (optional)
+                Persist facts that do not change until the next reboot in
+                this JSON file.
+        """
+        dict.__init__(self, {})
+        self.cache_file = cache_file
+        self.logger = logger
+        self._loaded = False
+        self._lock = threading.RLock()
+
+    def __getitem__(self, name: str) -> HostFactValue:
+        """Return a host fact and collect it on first access."""
+        with self._lock:
+            if (self._loaded is False) and (self.cache_file is not None):
+                self.load()
+            if dict.__contains__(self, name) is False:
+                dict.__setitem__(self, name, self._collect(name))
+                if name in self.persistent_facts:
+                    self.save()
+            return dict.__getitem__(self, name)
+
+    def _collect(self, name: str) -> HostFactValue:
+        try:
+            collect = object.__getattribute__(self, f"_collect_{name}")
+        except AttributeError:
+            raise KeyError(name)
+        return collect()
+
+    def refresh(self, name: typing.Optional[str]=None) -> None:
+        """
+        Forget memoized host facts, so that they are collected again.
+
+        Args:
+
+            name (str): (optional)
+                Only refresh this fact. All facts are refreshed when no name
+                is given.
+        """
+        with self._lock:
+            if name is None:
+                dict.clear(self)
+            elif dict.__contains__(self, name):
+                dict.__delitem__(self, name)
+            self._loaded = True
+
+    def load(self) -> None:
+        """Read the persisted facts unless the host was rebooted since."""
+        self._loaded = True
+        if self.cache_file is None:
+            return
+        try:
+            with open(self.cache_file, "r", encoding="UTF-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("boot_id", None) != self["boot_id"]:
+            return
+        for name in self.persistent_facts:
+            if name in data["facts"]:
+                dict.__setitem__(self, name, data["facts"][name])
+
+    def save(self) -> None:
+        """Atomically write the persistent facts to the cache file."""
+        if (self.cache_file is None) or (self["boot_id"] is None):
+            return
+
+        data = dict(
+            boot_id=self["boot_id"],
+            facts=dict([
+                (name, dict.__getitem__(self, name))
+                for name in self.persistent_facts
+                if dict.__contains__(self, name)
+            ])
+        )
+
+        try:
+            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+            fd, temporary_path = tempfile.mkstemp(
+                dir=os.path.dirname(self.cache_file),
+                prefix=f".{os.path.basename(self.cache_file)}."
+            )
+            try:
+                with os.fdopen(fd, "w", encoding="UTF-8") as f:
+                    json.dump(data, f, sort_keys=True)
+                os.replace(temporary_path, self.cache_file)
+            except BaseException:
+                os.unlink(temporary_path)
+                raise
+        except OSError as e:
+            if self.logger is not None:
+                self.logger.debug(f"Could not write the host facts: {e}")
+
+    def _collect_boot_id(self) -> typing.Optional[str]:
+        _sysctl = sysctl.filter("kern.boottime")
+        if len(_sysctl) != 1:
+            return None
+        return str(_sysctl[0].value)
+
+    def _collect_os_version(
+        self
+    ) -> typing.Dict[str, typing.Union[str, int, float]]:
+        return iocage.helpers.get_os_version()
+
+    def _collect_uname(self) -> typing.List[str]:
+        return list(os.uname())
+
+    def _collect_processor(self) -> str:
+        return platform.processor()
+
+    def _collect_distribution(self) -> str:
+        if os.path.exists("/usr/sbin/hbsd-update"):
+            return "HardenedBSD"
+        else:
+            return platform.system()
+
+    def _collect_ipfw_enabled(self) -> bool:
+        _sysctl = sysctl.filter("net.inet.ip.fw.enable")
+        return ((len(_sysctl) == 1) and (_sysctl[0].value == 1))
+
+
+# The host facts shared by all objects of a process
+host_facts = HostFacts(cache_file=DEFAULT_CACHE_FILE)
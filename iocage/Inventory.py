@@ -0,0 +1,374 @@
+# Copyright (c) 2014-2018, iocage
+# Copyright (c) 2017-2018, Stefan Grönke
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted providing that the following conditions
+# are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+# IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+"""iocage on-disk inventory of jails."""
+import typing
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+import iocage.Resource
+import iocage.helpers
+import iocage.helpers_object
+
+# MyPy
+import iocage.Datasets
+import iocage.Logger
+import iocage.ZFS
+
+JailInventoryDataType = typing.Dict[str, typing.Union[str, typing.List[str]]]
+
+
+class JailInventoryEntry(dict):
+    """
+    A single jail in the inventory.
+
+    Like a libzfs.ZFSDataset the entry exposes the jails dataset name, so
+    that it can take the place of a child dataset in a ListableResource.
+    """
+
+    @property
+    def name(self) -> str:
+        """Return the name of the jails dataset."""
+        return str(self["dataset"])
+
+    @property
+    def data(self) -> typing.Optional[JailInventoryDataType]:
+        """Return the indexed configuration values or None."""
+        data: typing.Optional[JailInventoryDataType] = self.get("data", None)
+        return data
+
+
+class JailInventory(dict):
+    """
+    On-disk index of the jails of a root dataset.
+
+    The inventory is stored as JSON file in the mountpoint of the root dataset
+    and holds the name, dataset, config file location and the frequently
+    filtered configuration values of each jail. Listing jails from the
+    inventory avoids walking the ZFS datasets and loading the configuration
+    of jails that do not match the filters.
+
+    The list of jails is validated against the directory entries of the jails
+    dataset mountpoint, whereas the indexed values of a jail are validated
+    against the modification time and content hash of its config file.
+
+    An inventory is shared by the jails of a host, so that changes of jails
+    indexed from concurrent worker threads are serialized by a lock.
+    """
+
+    INDEX_FILE = "inventory.json"
+    INDEX_VERSION = 1
+
+    # Configuration keys that are indexed for filtering
+    INDEXED_KEYS = (
+        "boot",
+        "priority",
+        "template",
+        "tags",
+        "ip4_addr"
+    )
+
+    root_datasets: 'iocage.Datasets.RootDatasets'
+    _dirty: bool
+    _current: typing.Dict[str, bool]
+    _file_stat: typing.Optional[typing.Tuple[int, int]]
+    _lock: threading.RLock
+
+    def __init__(
+        self,
+        root_datasets: 'iocage.Datasets.RootDatasets',
+        host: typing.Optional['iocage.Host.HostGenerator']=None,
+        logger: typing.Optional['iocage.Logger.Logger']=None,
+        zfs: typing.Optional['iocage.ZFS.ZFS']=None
+    ) -> None:
+
+        self.logger = iocage.helpers_object.init_logger(self, logger)
+        self.zfs = iocage.helpers_object.init_zfs(self, zfs)
+        self.host = iocage.helpers_object.init_host(self, host)
+
+        self.root_datasets = root_datasets
+        self._dirty = False
+        self._current = {}
+        self._file_stat = None
+        self._lock = threading.RLock()
+        dict.__init__(self)
+
+    @property
+    def path(self) -> str:
+        """Return the absolute path of the inventory file."""
+        return str(os.path.join(
+            self.root_datasets.root.mountpoint,
+            self.INDEX_FILE
+        ))
+
+    @property
+    def names(self) -> typing.List[str]:
+        """
+        Return the validated names of all jails in the inventory.
+
+        The inventory is reconciled with the ZFS datasets when the jails
+        found in the jails dataset mountpoint differ from the indexed ones.
+        """
+        try:
+            jail_names = set(os.listdir(self.root_datasets.jails.mountpoint))
+        except OSError:
+            jail_names = None
+
+        with self._lock:
+            if jail_names != set(self.keys()):
+                self.reconcile()
+                self.save()
+            return sorted(self.keys())
+
+    @property
+    def changed_on_disk(self) -> bool:
+        """Return True when the file was written since it was loaded."""
+        return (self._stat_index_file() != self._file_stat)
+
+    def load(self) -> None:
+        """Read the inventory from disk."""
+        self.clear()
+        self._current = {}
+        self._dirty = False
+        self._file_stat = self._stat_index_file()
+
+        try:
+            with open(self.path, "r", encoding="UTF-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            self.logger.spam(f"No valid jail inventory found at {self.path}")
+            data = {}
+
+        if (isinstance(data, dict) is False) or (
+            data.get("version", None) != self.INDEX_VERSION
+        ):
+            data = {}
+
+        # indexed values depend on the host defaults
+        defaults_changed = (
+            data.get("defaults_mtime", None) != self._get_defaults_mtime()
+        )
+
+        for name, entry in data.get("jails", {}).items():
+            self[name] = JailInventoryEntry(entry)
+            if defaults_changed is True:
+                self[name]["data"] = None
+
+        self._dirty = defaults_changed
+
+    def save(self) -> None:
+        """Atomically write the inventory to disk when it was changed."""
+        with self._lock:
+            self._write()
+
+    def _write(self) -> None:
+        if self._dirty is False:
+            return
+
+        data = dict(
+            version=self.INDEX_VERSION,
+            defaults_mtime=self._get_defaults_mtime(),
+            jails=self
+        )
+
+        try:
+            directory = os.path.dirname(self.path)
+            fd, temporary_path = tempfile.mkstemp(
+                dir=directory,
+                prefix=f".{self.INDEX_FILE}."
+            )
+            try:
+                with os.fdopen(fd, "w", encoding="UTF-8") as f:
+                    json.dump(data, f, sort_keys=True)
+                os.replace(temporary_path, self.path)
+            except BaseException:
+                os.unlink(temporary_path)
+                raise
+        except OSError as e:
+            self.logger.debug(f"Could not write the jail inventory: {e}")
+            return
+
+        self._dirty = False
+        self._file_stat = self._stat_index_file()
+
+    def _stat_index_file(self) -> typing.Optional[typing.Tuple[int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns)
+
+    def reconcile(self) -> None:
+        """Synchronize the indexed jail names with the ZFS datasets."""
+        jails_dataset = self.root_datasets.jails
+        prefix_length = len(jails_dataset.name) + 1
+
+        dataset_names: typing.Dict[str, str] = {}
+        for dataset in jails_dataset.children:
+            dataset_names[dataset.name[prefix_length:]] = dataset.name
+
+        for name in list(self.keys()):
+            if name not in dataset_names:
+                self.remove(name, save=False)
+
+        for name, dataset_name in dataset_names.items():
+            if name not in self.keys():
+                self[name] = JailInventoryEntry(dataset=dataset_name)
+                self._dirty = True
+
+    def expire(self) -> None:
+        """Validate the indexed values against the config files again."""
+        with self._lock:
+            self._current = {}
+
+    def is_current(self, name: str) -> bool:
+        """
+        Return True if the indexed values of a jail are up to date.
+
+        A changed modification time of the jails config file only invalidates
+        the entry when the content hash of the file changed as well.
+        """
+        if name in self._current:
+            return self._current[name]
+
+        self._current[name] = self._validate_entry(name)
+        return self._current[name]
+
+    def get_data(self, name: str) -> typing.Optional[JailInventoryDataType]:
+        """Return the indexed values of a jail or None when outdated."""
+        if self.is_current(name) is False:
+            return None
+        return self[name].data
+
+    def index_jail(
+        self,
+        jail: 'iocage.Jail.JailGenerator',
+        save: bool=True
+    ) -> None:
+        """Index the configuration of a jail."""
+        config_file = jail.config_file
+        if config_file is None:
+            config_path = None
+        else:
+            config_path = os.path.join(jail.dataset.mountpoint, config_file)
+
+        mtime, digest = self._stat_config_file(config_path)
+
+        entry = JailInventoryEntry(
+            dataset=jail.dataset_name,
+            config_type=jail.config_type,
+            config_file=config_path,
+            mtime=mtime,
+            hash=digest,
+            data={
+                key: self._get_index_value(jail.get(key))
+                for key in self.INDEXED_KEYS
+            }
+        )
+
+        with self._lock:
+            self[jail.name] = entry
+            self._current[jail.name] = (mtime is not None)
+            self._dirty = True
+            if save is True:
+                self.save()
+
+    def remove(self, name: str, save: bool=True) -> None:
+        """Remove a jail from the inventory."""
+        with self._lock:
+            if name in self.keys():
+                del self[name]
+                self._dirty = True
+            if name in self._current:
+                del self._current[name]
+
+            if save is True:
+                self.save()
+
+    def _validate_entry(self, name: str) -> bool:
+        entry = self.get(name, None)
+        if (entry is None) or (entry.data is None):
+            return False
+
+        config_path = entry.get("config_file", None)
+        if config_path is None:
+            return False
+
+        try:
+            mtime = os.stat(config_path).st_mtime
+        except OSError:
+            return False
+
+        if mtime == entry["mtime"]:
+            return True
+
+        _, digest = self._stat_config_file(config_path)
+        if (digest is None) or (digest != entry["hash"]):
+            return False
+
+        entry["mtime"] = mtime
+        self._dirty = True
+        return True
+
+    def _stat_config_file(
+        self,
+        config_path: typing.Optional[str]
+    ) -> typing.Tuple[typing.Optional[float], typing.Optional[str]]:
+        if config_path is None:
+            return (None, None)
+
+        try:
+            mtime = os.stat(config_path).st_mtime
+            with open(config_path, "rb") as f:
+                digest = hashlib.sha256(f.read()).hexdigest()
+        except OSError:
+            return (None, None)
+
+        return (mtime, digest)
+
+    def _get_defaults_mtime(self) -> typing.Optional[float]:
+        mountpoint = self.host.datasets.main.root.mountpoint
+        for filename in [
+            iocage.Resource.DefaultResource.DEFAULT_JSON_FILE,
+            iocage.Resource.DefaultResource.DEFAULT_UCL_FILE
+        ]:
+            try:
+                path = os.path.join(mountpoint, filename)
+                return float(os.stat(path).st_mtime)
+            except OSError:
+                pass
+        return None
+
+    def _get_index_value(
+        self,
+        value: typing.Any
+    ) -> typing.Union[str, typing.List[str]]:
+        if isinstance(value, (list, set, tuple)):
+            return [iocage.helpers.to_string(x) for x in value]
+        if (value is None) or isinstance(value, (bool, int, str)):
+            return str(iocage.helpers.to_string(value))
+        return str(value)
@@ -24,10 +24,11 @@
 # POSSIBILITY OF SUCH DAMAGE.
 """iocage Jail module."""
 import typing
+import hashlib
 import os
 import random
 import shlex
-import shutil
+import time
 
 import libzfs
 
@@ -36,9 +37,12 @@ import iocage.errors
 import iocage.events
 import iocage.helpers
 import iocage.helpers_object
+import iocage.JailLaunchPlan
+import iocage.JailPool
 import iocage.JailState
 import iocage.DevfsRules
 import iocage.Host
+import iocage.Inventory
 import iocage.Config.Jail.JailConfig
 import iocage.Network
 import iocage.NullFSBasejailStorage
@@ -281,6 +285,32 @@ class JailGenerator(JailResource):
 
     _class_storage = iocage.Storage.Storage
     _state: typing.Optional['iocage.JailState.JailState']
+
+    # config keys of host side resources that a soft restart keeps in place
+    _host_config_keys = (
+        "vnet",
+        "interfaces",
+        "vnet_interfaces",
+        "mac_prefix",
+        "ip4_addr",
+        "ip6_addr",
+        "defaultrouter",
+        "defaultrouter6",
+        "basejail",
+        "basejail_type",
+        "release",
+        "jail_zfs",
+        "jail_zfs_dataset",
+        "rlimits",
+        "exec_prestart",
+        "exec_created",
+        "exec_poststart",
+        "exec_prestop",
+        "exec_poststop"
+    )
+    _launch_plan: typing.Optional[
+        'iocage.JailLaunchPlan.JailLaunchPlan'
+    ] = None
     _relative_hook_script_dir: str
     _provisioner: 'iocage.Provisioning.Prototype'
 
@@ -412,12 +442,12 @@ class JailGenerator(JailResource):
         return self._provisioner
 
     def _init_state(self) -> 'iocage.JailState.JailState':
+        # resolved from the shared jail state snapshot when accessed
         state = iocage.JailState.JailState(
             self.identifier,
             logger=self.logger
         )
         self.state = state
-        state.query()
         return state
 
     def start(
@@ -575,6 +605,8 @@ class JailGenerator(JailResource):
             self._save_autoconfig()
 
         try:
+            # computed once from the config and reused for this start
+            self._launch_plan = iocage.JailLaunchPlan.JailLaunchPlan(jail=self)
             self._prepare_stop()
             if single_command is None:
                 stdout, stderr, returncode = self._launch_persistent_jail(
@@ -590,9 +622,13 @@ class JailGenerator(JailResource):
                     jail=self,
                     logger=self.logger
                 )
+            if single_command is None:
+                self._save_host_config_fingerprint()
         except iocage.errors.IocageException as e:
+            self._launch_plan = None
             yield from jailLaunchEvent.fail_generator(e)
             raise e
+        self._launch_plan = None
 
         yield jailLaunchEvent.end(stdout=stdout)
 
@@ -915,6 +951,11 @@ class JailGenerator(JailResource):
                 raise e
         yield jailDestroyEvent.end()
 
+        try:
+            os.unlink(self._host_config_fingerprint_path)
+        except OSError:
+            pass
+
         try:
             self.state.query()
         except Exception as e:
@@ -929,8 +970,10 @@ class JailGenerator(JailResource):
             f" for JID {self.jid}"
         )
         self._ensure_script_dir()
-        with open(self.script_env_path, "w") as f:
-            f.write(f"export IOCAGE_JID={self.jid}")
+        iocage.helpers.write_file(
+            self.script_env_path,
+            f"export IOCAGE_JID={self.jid}"
+        )
 
     def _write_jail_conf(self, force: bool=False) -> None:
         if force is True:
@@ -953,13 +996,21 @@ class JailGenerator(JailResource):
             ), (
                 f"exec.stop = \"{stop_command}\";"
             ), (
-                f"exec.jail_user = {self._get_value('exec_jail_user')};"
+                f"exec.jail_user = {self._exec_jail_user};"
             ),
             "}"
         ])
-        self.logger.debug(f"Writing jail.conf file to {self._jail_conf_file}")
-        with open(self._jail_conf_file, "w") as f:
-            f.write(content)
+        if iocage.helpers.write_file(self._jail_conf_file, content) is True:
+            self.logger.debug(
+                f"Written jail.conf file to {self._jail_conf_file}"
+            )
+
+    @property
+    def _exec_jail_user(self) -> str:
+        # stopping a jail must not compute a launch plan with side effects
+        if self._launch_plan is not None:
+            return self._launch_plan.exec_jail_user
+        return self._get_value("exec_jail_user")
 
     @property
     def _jail_conf_file(self) -> str:
@@ -969,9 +1020,28 @@ class JailGenerator(JailResource):
         self,
         shutdown: bool=False,
         force: bool=False,
+        soft: bool=False,
         event_scope: typing.Optional['iocage.events.Scope']=None
     ) -> typing.Generator['iocage.events.IocageEvent', None, None]:
-        """Restart the jail."""
+        """
+        Restart the jail.
+
+        Args:
+
+            shutdown (bool): (default=False)
+                Entirely stop and start the jail instead of only running its
+                stop and start hooks.
+
+            force (bool): (default=False)
+                Start the jail even when a shutdown failed.
+
+            soft (bool): (default=False)
+                Recycle the processes of the jail while its host side network
+                interfaces, firewall rules and mounts remain in place. When
+                the network, fstab or storage configuration changed since the
+                jail was started, or its processes do not stop within the
+                stop_timeout, it is entirely stopped and started instead.
+        """
         failed: bool = False
         jailRestartEvent = iocage.events.JailRestart(
             jail=self,
@@ -992,16 +1062,35 @@ class JailGenerator(JailResource):
 
         yield jailRestartEvent.begin()
 
+        if (soft is True) and (self.host_config_changed is True):
+            self.logger.verbose(
+                f"The host configuration of {self.humanreadable_name} "
+                "changed since it was started - restarting entirely"
+            )
+            shutdown = True
+            soft = False
+
         if shutdown is False:
 
             # soft stop
             yield JailSoftShutdownEvent.begin()
             try:
                 self._run_hook("stop")
+                if soft is True:
+                    self.kill_processes()
                 yield JailSoftShutdownEvent.end()
+            except iocage.errors.JailProcessesNotStopped:
+                yield JailSoftShutdownEvent.fail(exception=False)
+                self.logger.verbose(
+                    f"The processes of {self.humanreadable_name} "
+                    "did not stop - restarting entirely"
+                )
+                shutdown = True
             except iocage.errors.IocageException:
                 yield JailSoftShutdownEvent.fail(exception=False)
 
+        if shutdown is False:
+
             # service start
             yield jailStartEvent.begin()
             try:
@@ -1043,6 +1132,90 @@ class JailGenerator(JailResource):
 
         yield jailRestartEvent.end()
 
+    def kill_processes(self) -> None:
+        """
+        Kill all processes of the running jail.
+
+        Commands running inside of the jail, such as a hanging exec.stop, are
+        killed as well. The jail was launched persistent, so that it remains
+        with its network interfaces and mounts until it is stopped.
+        """
+        jid = str(self.jid)
+        self.logger.verbose(
+            f"Killing the processes of {self.humanreadable_name}"
+        )
+        iocage.helpers.exec(
+            ["/bin/pkill", "-KILL", "-j", jid],
+            logger=self.logger,
+            ignore_error=True
+        )
+
+        deadline = time.monotonic() + float(self.config["stop_timeout"])
+        while time.monotonic() < deadline:
+            _, _, returncode = iocage.helpers.exec(
+                ["/bin/pgrep", "-j", jid],
+                logger=self.logger,
+                ignore_error=True
+            )
+            if returncode != 0:
+                return
+            time.sleep(0.1)
+
+        raise iocage.errors.JailProcessesNotStopped(
+            jail=self,
+            logger=self.logger
+        )
+
+    @property
+    def host_config_fingerprint(self) -> str:
+        """
+        Return a hash of the jails host side resource configuration.
+
+        It covers the config of the jail(8) parameters, network, storage and
+        resource limits as well as the content of the jails fstab file. The
+        fingerprint is computed from the configuration only, so that no
+        launch plan (and no devfs ruleset) is created outside of a start.
+        """
+        digest = hashlib.sha256()
+        keys = list(iocage.JailLaunchPlan.JailLaunchPlan.config_keys)
+        keys += self._host_config_keys
+        keys += iocage.Config.Jail.Properties.ResourceLimit.properties
+        values = [f"{key}={self.config[key]}" for key in keys]
+        for value in values:
+            digest.update(value.encode("UTF-8") + b"\0")
+
+        try:
+            with open(self.fstab.path, "rb") as f:
+                digest.update(f.read())
+        except OSError:
+            pass
+
+        return digest.hexdigest()
+
+    @property
+    def host_config_changed(self) -> bool:
+        """
+        Return True when the host side configuration changed since start.
+
+        Jails started by other iocage variants are considered changed.
+        """
+        try:
+            with open(self._host_config_fingerprint_path, "r") as f:
+                fingerprint = f.read().strip()
+        except OSError:
+            return True
+        return (fingerprint != self.host_config_fingerprint)
+
+    def _save_host_config_fingerprint(self) -> None:
+        iocage.helpers.write_file(
+            self._host_config_fingerprint_path,
+            self.host_config_fingerprint
+        )
+
+    @property
+    def _host_config_fingerprint_path(self) -> str:
+        return f"{self.launch_script_dir}/.host_config"
+
     def destroy(
         self,
         force: bool=False,
@@ -1100,6 +1273,7 @@ class JailGenerator(JailResource):
         except Exception as e:
             zfsDatasetDestroyEvent.fail(e)
             raise e
+        self._remove_from_inventory()
         yield zfsDatasetDestroyEvent.end()
 
     def rename(
@@ -1168,6 +1342,8 @@ class JailGenerator(JailResource):
         for event in fstab_path_events:
             yield event
 
+        self._update_inventory(previous_name=current_id)
+
         yield jailRenameEvent.end()
 
     def _update_fstab_paths(
@@ -1231,6 +1407,7 @@ class JailGenerator(JailResource):
             self.create_from_scratch()
 
         self._ensure_script_dir()
+        self._update_inventory()
 
     def create_from_scratch(
         self
@@ -1334,6 +1511,10 @@ class JailGenerator(JailResource):
         yield jailCloneEvent.end()
 
     def _create_skeleton(self) -> None:
+        self._prepare_skeleton()
+        self.create_resource()
+
+    def _prepare_skeleton(self) -> None:
 
         if self.config["id"] is None:
             self.config["id"] = str(iocage.helpers.get_random_uuid())
@@ -1348,22 +1529,53 @@ class JailGenerator(JailResource):
             msg = f"{key} = {value}"
             self.logger.spam(msg, indent=1)
 
-        self.create_resource()
-
     def _create_from_resource(
         self,
         resource: 'iocage.Resource.Resource'
     ) -> None:
 
-        self._create_skeleton()
+        self._prepare_skeleton()
 
-        backend = self.storage_backend
-        if backend is not None:
-            backend.setup(self.storage, resource)
+        if self._claim_from_pool(resource) is False:
+            self.create_resource()
+            backend = self.storage_backend
+            if backend is not None:
+                backend.setup(self.storage, resource)
 
         self._update_fstab()
         self.save()
 
+    def _claim_from_pool(
+        self,
+        resource: 'iocage.Resource.Resource'
+    ) -> bool:
+        """
+        Claim a pre-cloned dataset from the warm pool of the resource.
+
+        Returns False when the jail is a basejail or no warm pool entry of
+        the release or template was available.
+        """
+        if self.is_basejail is True:
+            return False
+
+        pool = iocage.JailPool.JailPool(
+            resource=resource,
+            root_datasets=self.host.datasets.find_root_datasets(
+                self.dataset_name
+            ),
+            logger=self.logger,
+            zfs=self.zfs
+        )
+        if pool.enabled is False:
+            return False
+
+        dataset = pool.claim(self.dataset_name)
+        if dataset is None:
+            return False
+
+        self.dataset = dataset
+        return True
+
     @property
     def is_basejail(self) -> bool:
         """
@@ -1393,6 +1605,34 @@ class JailGenerator(JailResource):
         """Permanently save a jail's configuration."""
         self._write_config(self.config.data)
         self._save_autoconfig()
+        self._update_inventory()
+
+    @property
+    def inventory(self) -> typing.Optional['iocage.Inventory.JailInventory']:
+        """Return the loaded inventory of the jails root dataset or None."""
+        dataset_name = self.dataset_name
+        for root_name, root_datasets in self.host.datasets.items():
+            if dataset_name.startswith(f"{root_datasets.jails.name}/"):
+                return self.host.get_jail_inventory(root_name)
+        # jails outside of an iocage root dataset are not indexed
+        return None
+
+    def _update_inventory(
+        self,
+        previous_name: typing.Optional[str]=None
+    ) -> None:
+        inventory = self.inventory
+        if inventory is None:
+            return
+        if previous_name is not None:
+            inventory.remove(previous_name, save=False)
+        inventory.index_jail(self)
+
+    def _remove_from_inventory(self) -> None:
+        inventory = self.inventory
+        if inventory is None:
+            return
+        inventory.remove(self.name)
 
     def _save_autoconfig(self) -> None:
         """Save auto-generated files."""
@@ -1446,6 +1686,30 @@ class JailGenerator(JailResource):
 
         return stdout, stderr, returncode
 
+    def exec_generator(
+        self,
+        command: typing.List[str],
+        env: typing.Dict[str, str]={}
+    ) -> typing.Generator[bytes, None, iocage.helpers.CommandOutput]:
+        """
+        Execute a command in a running jail and yield its output lines.
+
+        The CommandOutput is returned when the command finished.
+        """
+        command = ["/usr/sbin/jexec", str(self.jid)] + command
+
+        command_env = self.env
+        for env_key, env_value in env.items():
+            command_env[env_key] = env_value
+
+        output: iocage.helpers.CommandOutput
+        output = yield from iocage.helpers.exec_generator(
+            command,
+            env=command_env,
+            logger=self.logger
+        )
+        return output
+
     def passthru(
         self,
         command: typing.List[str],
@@ -1522,6 +1786,10 @@ class JailGenerator(JailResource):
         Users may reference a rule by numeric identifier or name. This numbers
         are automatically selected, so it's advisable to use names.1
         """
+        with self.host.devfs.lock:
+            return self._get_devfs_ruleset()
+
+    def _get_devfs_ruleset(self) -> iocage.DevfsRules.DevfsRuleset:
         try:
             configured_devfs_ruleset = self.host.devfs.find_by_number(
                 int(self.config["devfs_ruleset"])
@@ -1552,80 +1820,20 @@ class JailGenerator(JailResource):
             return self.host.devfs[ruleset_line_position].number
 
     @property
-    def _launch_command(self) -> typing.List[str]:
-
-        command = ["/usr/sbin/jail", "-c"]
-
-        if self.config["vnet"]:
-            command.append("vnet")
-        else:
-
-            if self.config["ip4_addr"] is not None:
-                ip4_addr = self.config["ip4_addr"]
-                command += [
-                    f"ip4.addr={ip4_addr}",
-                    f"ip4.saddrsel={self.config['ip4_saddrsel']}",
-                    f"ip4={self.config['ip4']}",
-                ]
-
-            if self.config['ip6_addr'] is not None:
-                ip6_addr = self.config['ip6_addr']
-                command += [
-                    f"ip6.addr={ip6_addr}",
-                    f"ip6.saddrsel={self.config['ip6_saddrsel']}",
-                    f"ip6={self.config['ip6']}",
-                ]
-
-        command += [
-            f"name={self.identifier}",
-            f"host.hostname={self.config['host_hostname']}",
-            f"host.domainname={self.config['host_domainname']}",
-            f"path={self.root_dataset.mountpoint}",
-            f"securelevel={self._get_value('securelevel')}",
-            f"host.hostuuid={self.name}",
-            f"devfs_ruleset={self.devfs_ruleset}",
-            f"enforce_statfs={self._get_value('enforce_statfs')}",
-            f"children.max={self._get_value('children_max')}",
-            f"allow.set_hostname={self._get_value('allow_set_hostname')}",
-            f"allow.sysvipc={self._get_value('allow_sysvipc')}",
-            f"exec.prestart=\"{self.get_hook_script_path('prestart')}\"",
-            f"exec.prestop=\"{self.get_hook_script_path('prestop')}\"",
-            f"exec.poststop=\"{self.get_hook_script_path('poststop')}\"",
-            f"exec.jail_user={self._get_value('exec_jail_user')}"
-        ]
-
-        if self.host.userland_version > 10.3:
-            command += [
-                f"sysvmsg={self._get_value('sysvmsg')}",
-                f"sysvsem={self._get_value('sysvsem')}",
-                f"sysvshm={self._get_value('sysvshm')}"
-            ]
-
-        command += [
-            f"allow.raw_sockets={self._get_value('allow_raw_sockets')}",
-            f"allow.chflags={self._get_value('allow_chflags')}",
-            f"allow.mount={self._allow_mount}",
-            f"allow.mount.devfs={self._get_value('allow_mount_devfs')}",
-            f"allow.mount.nullfs={self._get_value('allow_mount_nullfs')}",
-            f"allow.mount.procfs={self._get_value('allow_mount_procfs')}",
-            f"allow.mount.fdescfs={self._get_value('allow_mount_fdescfs')}",
-            f"allow.mount.zfs={self._allow_mount_zfs}",
-            f"allow.quotas={self._get_value('allow_quotas')}",
-            f"allow.socket_af={self._get_value('allow_socket_af')}",
-            f"exec.timeout={self._get_value('exec_timeout')}",
-            f"stop.timeout={self._get_value('stop_timeout')}",
-            f"mount.fstab={self.fstab.path}",
-            f"mount.devfs={self._get_value('mount_devfs')}"
-        ]
+    def launch_plan(self) -> 'iocage.JailLaunchPlan.JailLaunchPlan':
+        """
+        Return the jail(8) launch plan of the jail.
 
-        if self.host.userland_version > 9.3:
-            command += [
-                f"mount.fdescfs={self._get_value('mount_fdescfs')}",
-                f"allow.mount.tmpfs={self._get_value('allow_mount_tmpfs')}"
-            ]
+        While the jail is started the plan computed for this start is reused.
+        Otherwise the plan is computed from the current configuration.
+        """
+        if self._launch_plan is not None:
+            return self._launch_plan
+        return iocage.JailLaunchPlan.JailLaunchPlan(jail=self)
 
-        command += ["allow.dying"]
-        return command
+    @property
+    def _launch_command(self) -> typing.List[str]:
+        return self.launch_plan.command
 
     def _launch_persistent_jail(
         self,
@@ -1647,10 +1855,9 @@ class JailGenerator(JailResource):
             )
             return stdout, stderr, returncode
 
+        # the JID is resolved lazily, together with other started jails
         self.state.query()
-        self.logger.verbose(
-            f"Jail '{self.humanreadable_name}' started with JID {self.jid}"
-        )
+        self.logger.verbose(f"Jail '{self.humanreadable_name}' started")
 
         return stdout, stderr, returncode
 
@@ -1786,7 +1993,6 @@ class JailGenerator(JailResource):
 
     def _write_hook_script(self, hook_name: str, command_string: str) -> None:
         file = self.get_hook_script_path(hook_name)
-        existed = os.path.isfile(file)
         if hook_name in ["created", "poststart", "prestop"]:
             _identifier = str(shlex.quote(self.identifier))
             _jls_command = f"/usr/sbin/jls -j {_identifier} jid"
@@ -1801,14 +2007,17 @@ class JailGenerator(JailResource):
                 ". \"$(dirname $0)/.env\""
                 "\n"
             ) + command_string
-        with open(file, "w") as f:
-            f.write("\n".join([
+        # unchanged hook scripts are not written again
+        iocage.helpers.write_file(
+            file,
+            "\n".join([
                 "#!/bin/sh",
                 command_string
-            ]))
-        if existed is False:
-            shutil.chown(file, "root", "wheel")
-            os.chmod(file, 0o755)  # nosec: executable script
+            ]),
+            mode=0o755,  # nosec: executable script
+            user="root",
+            group="wheel"
+        )
 
     @property
     def launch_script_dir(self) -> str:
@@ -1878,12 +2087,6 @@ class JailGenerator(JailResource):
         self.logger.verbose("Clearing resource limits")
         return [f"/usr/bin/rctl -r jail:{self.identifier} 2>/dev/null || true"]
 
-    @property
-    def _allow_mount(self) -> str:
-        if self._allow_mount_zfs == "1":
-            return "1"
-        return self._get_value("allow_mount")
-
     @property
     def _allow_mount_zfs(self) -> str:
         if self.config["jail_zfs"] is True:
@@ -2026,11 +2229,9 @@ class JailGenerator(JailResource):
 
         root_datasets = resource_selector.filter_datasets(self.host.datasets)
 
-        for datasets_key, datasets in root_datasets.items():
-            for dataset in list(datasets.jails.children):
-                dataset_name = str(
-                    dataset.name[(len(datasets.jails.name) + 1):]
-                )
+        for datasets_key in root_datasets.keys():
+            inventory = self.host.get_jail_inventory(datasets_key)
+            for dataset_name in inventory.names:
                 humanreadable_name = iocage.helpers.to_humanreadable_name(
                     dataset_name
                 )
@@ -0,0 +1,197 @@
+# Copyright (c) 2014-2018, iocage
+# Copyright (c) 2017-2018, Stefan Grönke
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted providing that the following conditions
+# are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+# IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+"""Immutable jail(8) launch parameters of a jail."""
+import typing
+
+import iocage.helpers
+
+# MyPy
+import iocage.Jail
+
+
+class JailLaunchPlan:
+    """
+    The jail(8) parameters of a jail launch.
+
+    The plan is computed from a single pass over the jail configuration, so
+    that every config value is looked up only once, and can then be reused
+    for persistent and single-command launches as well as the jail.conf file
+    written for stopping the jail. The plan cannot be modified after it was
+    created. Config changes require a new plan.
+    """
+
+    __slots__ = ("parameters", "exec_jail_user")
+
+    # jail config keys the launch parameters are computed from
+    config_keys = (
+        "vnet",
+        "ip4_addr",
+        "ip4_saddrsel",
+        "ip4",
+        "ip6_addr",
+        "ip6_saddrsel",
+        "ip6",
+        "host_hostname",
+        "host_domainname",
+        "securelevel",
+        "devfs_ruleset",
+        "enforce_statfs",
+        "children_max",
+        "allow_set_hostname",
+        "allow_sysvipc",
+        "exec_jail_user",
+        "sysvmsg",
+        "sysvsem",
+        "sysvshm",
+        "jail_zfs",
+        "allow_mount_zfs",
+        "allow_mount",
+        "allow_raw_sockets",
+        "allow_chflags",
+        "allow_mount_devfs",
+        "allow_mount_nullfs",
+        "allow_mount_procfs",
+        "allow_mount_fdescfs",
+        "allow_quotas",
+        "allow_socket_af",
+        "exec_timeout",
+        "stop_timeout",
+        "mount_devfs",
+        "mount_fdescfs",
+        "allow_mount_tmpfs"
+    )
+
+    parameters: typing.Tuple[str, ...]
+    exec_jail_user: str
+
+    def __init__(self, jail: 'iocage.Jail.JailGenerator') -> None:
+        config = jail.config
+        values: typing.Dict[str, str] = {}
+
+        def _get_value(key: str) -> str:
+            # jail command consumable config value string
+            if key not in values:
+                values[key] = str(iocage.helpers.to_string(
+                    config[key],
+                    true="1",
+                    false="0",
+                    none=""
+                ))
+            return values[key]
+
+        parameters: typing.List[str] = []
+
+        if config["vnet"]:
+            parameters.append("vnet")
+        else:
+            ip4_addr = config["ip4_addr"]
+            if ip4_addr is not None:
+                parameters += [
+                    f"ip4.addr={ip4_addr}",
+                    f"ip4.saddrsel={config['ip4_saddrsel']}",
+                    f"ip4={config['ip4']}",
+                ]
+
+            ip6_addr = config["ip6_addr"]
+            if ip6_addr is not None:
+                parameters += [
+                    f"ip6.addr={ip6_addr}",
+                    f"ip6.saddrsel={config['ip6_saddrsel']}",
+                    f"ip6={config['ip6']}",
+                ]
+
+        exec_jail_user = _get_value("exec_jail_user")
+        parameters += [
+            f"name={jail.identifier}",
+            f"host.hostname={config['host_hostname']}",
+            f"host.domainname={config['host_domainname']}",
+            f"path={jail.root_dataset.mountpoint}",
+            f"securelevel={_get_value('securelevel')}",
+            f"host.hostuuid={jail.name}",
+            f"devfs_ruleset={jail.devfs_ruleset}",
+            f"enforce_statfs={_get_value('enforce_statfs')}",
+            f"children.max={_get_value('children_max')}",
+            f"allow.set_hostname={_get_value('allow_set_hostname')}",
+            f"allow.sysvipc={_get_value('allow_sysvipc')}",
+            f"exec.prestart=\"{jail.get_hook_script_path('prestart')}\"",
+            f"exec.prestop=\"{jail.get_hook_script_path('prestop')}\"",
+            f"exec.poststop=\"{jail.get_hook_script_path('poststop')}\"",
+            f"exec.jail_user={exec_jail_user}"
+        ]
+
+        userland_version = jail.host.userland_version
+        if userland_version > 10.3:
+            parameters += [
+                f"sysvmsg={_get_value('sysvmsg')}",
+                f"sysvsem={_get_value('sysvsem')}",
+                f"sysvshm={_get_value('sysvshm')}"
+            ]
+
+        if config["jail_zfs"] is True:
+            allow_mount_zfs = "1"
+            allow_mount = "1"
+        else:
+            allow_mount_zfs = _get_value("allow_mount_zfs")
+            if allow_mount_zfs == "1":
+                allow_mount = "1"
+            else:
+                allow_mount = _get_value("allow_mount")
+
+        parameters += [
+            f"allow.raw_sockets={_get_value('allow_raw_sockets')}",
+            f"allow.chflags={_get_value('allow_chflags')}",
+            f"allow.mount={allow_mount}",
+            f"allow.mount.devfs={_get_value('allow_mount_devfs')}",
+            f"allow.mount.nullfs={_get_value('allow_mount_nullfs')}",
+            f"allow.mount.procfs={_get_value('allow_mount_procfs')}",
+            f"allow.mount.fdescfs={_get_value('allow_mount_fdescfs')}",
+            f"allow.mount.zfs={allow_mount_zfs}",
+            f"allow.quotas={_get_value('allow_quotas')}",
+            f"allow.socket_af={_get_value('allow_socket_af')}",
+            f"exec.timeout={_get_value('exec_timeout')}",
+            f"stop.timeout={_get_value('stop_timeout')}",
+            f"mount.fstab={jail.fstab.path}",
+            f"mount.devfs={_get_value('mount_devfs')}"
+        ]
+
+        if userland_version > 9.3:
+            parameters += [
+                f"mount.fdescfs={_get_value('mount_fdescfs')}",
+                f"allow.mount.tmpfs={_get_value('allow_mount_tmpfs')}"
+            ]
+
+        parameters.append("allow.dying")
+
+        object.__setattr__(self, "parameters", tuple(parameters))
+        object.__setattr__(self, "exec_jail_user", exec_jail_user)
+
+    def __setattr__(self, name: str, value: typing.Any) -> None:
+        """Prevent changes of the launch plan."""
+        raise AttributeError("JailLaunchPlan is immutable")
+
+    @property
+    def command(self) -> typing.List[str]:
+        """Return the jail(8) command creating the jail."""
+        return ["/usr/sbin/jail", "-c"] + list(self.parameters)
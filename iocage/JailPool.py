@@ -0,0 +1,478 @@
+# Copyright (c) 2014-2018, iocage
+# Copyright (c) 2017-2018, Stefan Grönke
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted providing that the following conditions
+# are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+# IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+"""Warm pool of pre-cloned jail datasets."""
+import typing
+import contextlib
+import fcntl
+import json
+import os
+import threading
+
+import libzfs
+
+import iocage.errors
+import iocage.helpers
+import iocage.helpers_object
+
+# MyPy
+import iocage.Datasets
+import iocage.Logger
+import iocage.ZFS
+
+JailPoolStateType = typing.Dict[str, typing.Any]
+
+
+class JailPool:
+    """
+    Warm pool of pre-cloned jail datasets of a release or template.
+
+    A pool keeps a configurable number of unconfigured jail datasets whose
+    root dataset was already cloned from the release or template. Creating a
+    jail claims one of them by renaming it into the jails dataset, so that
+    only the jail configuration remains to be written.
+
+    Pool entries are stored below the pool dataset of the jails root
+    datasets (e.g. zroot/iocage/pool/release-11.2-RELEASE/<id>). The pool
+    size, refill policy, the entries and the hit and miss counters are kept
+    in a state file in the mountpoint of this dataset that is shared by all
+    processes.
+
+    Entries of a release pool are discarded once a newer patch level snapshot
+    of the release exists. Entries of a template pool are discarded when the
+    configuration of the template changed, for example because it was unset
+    as template to be modified.
+
+    Refill Policies:
+
+        background:
+            Claimed entries are replaced in a daemon thread after the claim,
+            so that the process does not wait for the refill when it exits.
+            Datasets of entries that an interrupted refill did not register
+            are removed by the next refill.
+
+        sync:
+            Claimed entries are replaced before the claim returns.
+
+        manual:
+            Entries are only created by an explicit refill.
+    """
+
+    STATE_FILE = "pool.json"
+    LOCK_FILE = ".pool.lock"
+    REFILL_POLICIES = ("background", "sync", "manual")
+    DEFAULT_REFILL_POLICY = "background"
+
+    resource: 'iocage.Resource.Resource'
+    root_datasets: 'iocage.Datasets.RootDatasets'
+    _dataset: typing.Optional[libzfs.ZFSDataset]
+    _refill_lock: threading.Lock
+
+    def __init__(
+        self,
+        resource: 'iocage.Resource.Resource',
+        root_datasets: 'iocage.Datasets.RootDatasets',
+        logger: typing.Optional['iocage.Logger.Logger']=None,
+        zfs: typing.Optional['iocage.ZFS.ZFS']=None
+    ) -> None:
+        """
+        Initialize the warm pool of a release or template.
+
+        Args:
+
+            resource (Release or Jail):
+                The release or template jail the pooled datasets are
+                cloned from.
+
+            root_datasets (iocage.Datasets.RootDatasets):
+                The root datasets of the jails created from the pool.
+        """
+        self.logger = iocage.helpers_object.init_logger(self, logger)
+        self.zfs = iocage.helpers_object.init_zfs(self, zfs)
+        self.resource = resource
+        self.root_datasets = root_datasets
+        self._dataset = None
+        self._refill_lock = threading.Lock()
+
+    @property
+    def is_release(self) -> bool:
+        """Return True when the pool holds clones of a release."""
+        import iocage.Release
+        return isinstance(self.resource, iocage.Release.ReleaseGenerator)
+
+    @property
+    def name(self) -> str:
+        """Return the name of the pool (e.g. release-11.2-RELEASE)."""
+        prefix = "release" if (self.is_release is True) else "template"
+        return f"{prefix}-{self.resource.name}"
+
+    @property
+    def dataset(self) -> libzfs.ZFSDataset:
+        """Get or create the dataset holding the pool entries."""
+        if self._dataset is None:
+            self._dataset = self.zfs.get_or_create_dataset(
+                f"{self.root_datasets.pool.name}/{self.name}"
+            )
+        return self._dataset
+
+    @property
+    def enabled(self) -> bool:
+        """
+        Return True when the pool was configured to hold entries.
+
+        Unlike other properties this does not create the pool dataset.
+        """
+        if self._dataset is None:
+            dataset_name = f"{self.root_datasets.root.name}/pool/{self.name}"
+            try:
+                self._dataset = self.zfs.get_dataset(dataset_name)
+            except libzfs.ZFSException:
+                return False
+        return self.size > 0
+
+    @property
+    def path(self) -> str:
+        """Return the absolute path of the pool state file."""
+        return str(os.path.join(self.dataset.mountpoint, self.STATE_FILE))
+
+    @property
+    def size(self) -> int:
+        """Return the number of entries the pool is refilled to."""
+        return int(self._read_state()["size"])
+
+    @property
+    def refill_policy(self) -> str:
+        """Return the refill policy of the pool."""
+        return str(self._read_state()["refill"])
+
+    @property
+    def available(self) -> int:
+        """Return the number of entries that can be claimed."""
+        with self._locked_state() as state:
+            return len(self._get_current_entries(state))
+
+    @property
+    def statistics(self) -> typing.Dict[str, typing.Union[int, str]]:
+        """Return the pool configuration and its hit and miss counters."""
+        with self._locked_state() as state:
+            return dict(
+                size=state["size"],
+                refill=state["refill"],
+                available=len(self._get_current_entries(state)),
+                hits=state["hits"],
+                misses=state["misses"]
+            )
+
+    def configure(
+        self,
+        size: typing.Optional[int]=None,
+        refill: typing.Optional[str]=None
+    ) -> None:
+        """
+        Change the size or refill policy of the pool.
+
+        Reducing the size does not destroy existing entries. They are claimed
+        or removed by a flush.
+        """
+        if (size is not None) and (int(size) < 0):
+            raise iocage.errors.InvalidJailPoolConfig(
+                pool_name=self.name,
+                reason="the size must not be negative",
+                logger=self.logger
+            )
+        if (refill is not None) and (refill not in self.REFILL_POLICIES):
+            policies = ", ".join(self.REFILL_POLICIES)
+            raise iocage.errors.InvalidJailPoolConfig(
+                pool_name=self.name,
+                reason=f"the refill policy must be one of {policies}",
+                logger=self.logger
+            )
+
+        with self._locked_state(write=True) as state:
+            if size is not None:
+                state["size"] = int(size)
+            if refill is not None:
+                state["refill"] = refill
+
+    def claim(
+        self,
+        dataset_name: str
+    ) -> typing.Optional[libzfs.ZFSDataset]:
+        """
+        Rename a pooled dataset to the given name and return it.
+
+        Claims are counted as hit or miss. None is returned when the pool is
+        empty, so that the dataset needs to be created and cloned instead.
+        Depending on the refill policy the pool is refilled afterwards.
+        """
+        dataset: typing.Optional[libzfs.ZFSDataset] = None
+        with self._locked_state(write=True) as state:
+            entries = self._get_current_entries(state)
+            while (dataset is None) and (len(entries) > 0):
+                entry_id = entries.pop(0)
+                del state["entries"][entry_id]
+                dataset = self._rename_entry(entry_id, dataset_name)
+
+            if dataset is None:
+                state["misses"] += 1
+            else:
+                state["hits"] += 1
+            refill_policy = state["refill"]
+
+        if dataset is None:
+            self.logger.verbose(f"Jail pool {self.name} is empty")
+        else:
+            self.logger.verbose(
+                f"Claimed {dataset_name} from jail pool {self.name}"
+            )
+
+        if refill_policy == "sync":
+            self.refill()
+        elif refill_policy == "background":
+            self.refill_in_background()
+
+        return dataset
+
+    def refill(self) -> int:
+        """
+        Create pool entries until the pool has its configured size.
+
+        Entries of an outdated release snapshot or template are removed.
+        Only one refill of a pool runs at a time, so that concurrent refills
+        return immediately. Returns the number of created entries.
+        """
+        if self._refill_lock.acquire(blocking=False) is False:
+            return 0
+        try:
+            with self._exclusive_file(self.LOCK_FILE, blocking=False) as lock:
+                if lock is False:
+                    return 0
+                return self._refill()
+        finally:
+            self._refill_lock.release()
+
+    def refill_in_background(self) -> threading.Thread:
+        """Refill the pool in a daemon thread and return it."""
+        thread = threading.Thread(
+            target=self.refill,
+            name=f"JailPool {self.name}",
+            daemon=True
+        )
+        thread.start()
+        return thread
+
+    def flush(self) -> None:
+        """Destroy all entries of the pool."""
+        with self._locked_state(write=True) as state:
+            entry_ids = list(state["entries"].keys())
+            state["entries"] = {}
+        for entry_id in entry_ids:
+            self._destroy_entry(entry_id)
+
+    def _refill(self) -> int:
+        self._remove_outdated_entries()
+
+        with self._locked_state() as state:
+            missing = state["size"] - len(state["entries"])
+
+        created = 0
+        token = self._get_source_token()
+        for _ in range(max(missing, 0)):
+            entry_id = self._create_entry()
+            with self._locked_state(write=True) as state:
+                state["entries"][entry_id] = token
+            created += 1
+
+        if created > 0:
+            self.logger.verbose(
+                f"Added {created} entries to jail pool {self.name}"
+            )
+        return created
+
+    def _remove_outdated_entries(self) -> None:
+        with self._locked_state(write=True) as state:
+            current_entries = self._get_current_entries(state)
+            outdated_entries = [
+                entry_id for entry_id in state["entries"].keys()
+                if entry_id not in current_entries
+            ]
+            for entry_id in outdated_entries:
+                del state["entries"][entry_id]
+            unregistered_entries = [
+                entry_id for entry_id in self._get_entry_datasets()
+                if (entry_id not in state["entries"]) and (
+                    entry_id not in outdated_entries
+                )
+            ]
+
+        for entry_id in outdated_entries:
+            self.logger.verbose(
+                f"Removing outdated jail pool entry {entry_id}"
+            )
+            self._destroy_entry(entry_id)
+
+        for entry_id in unregistered_entries:
+            self.logger.verbose(
+                f"Removing interrupted jail pool entry {entry_id}"
+            )
+            self._destroy_entry(entry_id)
+
+    def _get_entry_datasets(self) -> typing.List[str]:
+        """Return the entry ids of all datasets in the pool dataset."""
+        return [
+            dataset.name.split("/")[-1] for dataset in self.dataset.children
+        ]
+
+    def _get_current_entries(
+        self,
+        state: JailPoolStateType
+    ) -> typing.List[str]:
+        """Return the entry ids that were cloned from the current source."""
+        token = self._get_source_token()
+        return sorted([
+            entry_id for entry_id, entry_token in state["entries"].items()
+            if entry_token == token
+        ])
+
+    def _get_source_token(self) -> str:
+        """Return a string that changes when the pool source changes."""
+        if self.is_release is True:
+            return str(self.resource.latest_snapshot.name)
+
+        config_file = self.resource.config_file
+        if config_file is None:
+            return ""
+        path = os.path.join(self.resource.dataset.mountpoint, config_file)
+        try:
+            return str(os.stat(path).st_mtime_ns)
+        except OSError:
+            return ""
+
+    def _get_entry_dataset_name(self, entry_id: str) -> str:
+        return f"{self.dataset.name}/{entry_id}"
+
+    def _create_entry(self) -> str:
+        entry_id = str(iocage.helpers.get_random_uuid())
+        dataset_name = self._get_entry_dataset_name(entry_id)
+        dataset = self.zfs.create_dataset(dataset_name)
+        os.chmod(dataset.mountpoint, 0o700)
+
+        root_dataset_name = f"{dataset_name}/root"
+        if self.is_release is True:
+            self.zfs.clone_snapshot(
+                self.resource.latest_snapshot,
+                root_dataset_name
+            )
+        else:
+            self.zfs.clone_dataset(
+                self.resource.root_dataset,
+                root_dataset_name
+            )
+        return entry_id
+
+    def _rename_entry(
+        self,
+        entry_id: str,
+        dataset_name: str
+    ) -> typing.Optional[libzfs.ZFSDataset]:
+        try:
+            dataset = self.zfs.get_dataset(
+                self._get_entry_dataset_name(entry_id)
+            )
+            dataset.rename(dataset_name)
+            renamed_dataset: libzfs.ZFSDataset = self.zfs.get_dataset(
+                dataset_name
+            )
+            return renamed_dataset
+        except libzfs.ZFSException as e:
+            self.logger.verbose(f"Skipping jail pool entry {entry_id}: {e}")
+            return None
+
+    def _destroy_entry(self, entry_id: str) -> None:
+        try:
+            dataset = self.zfs.get_dataset(
+                self._get_entry_dataset_name(entry_id)
+            )
+        except libzfs.ZFSException:
+            return
+        self.zfs.delete_dataset_recursive(dataset)
+
+    def _get_default_state(self) -> JailPoolStateType:
+        return dict(
+            size=0,
+            refill=self.DEFAULT_REFILL_POLICY,
+            hits=0,
+            misses=0,
+            entries={}
+        )
+
+    def _read_state(self) -> JailPoolStateType:
+        state = self._get_default_state()
+        try:
+            with open(self.path, "r", encoding="UTF-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return state
+
+        if isinstance(data, dict) is True:
+            state.update(data)
+        return state
+
+    @contextlib.contextmanager
+    def _locked_state(
+        self,
+        write: bool=False
+    ) -> typing.Generator[JailPoolStateType, None, None]:
+        """Hold the state file lock and optionally write the changed state."""
+        with self._exclusive_file(self.STATE_FILE + ".lock"):
+            state = self._read_state()
+            yield state
+            if write is True:
+                iocage.helpers.write_file(
+                    self.path,
+                    json.dumps(state, sort_keys=True),
+                    mode=0o600
+                )
+
+    @contextlib.contextmanager
+    def _exclusive_file(
+        self,
+        filename: str,
+        blocking: bool=True
+    ) -> typing.Generator[bool, None, None]:
+        """Hold an exclusive lock of a file in the pool dataset."""
+        path = os.path.join(self.dataset.mountpoint, filename)
+        flags = fcntl.LOCK_EX if (blocking is True) else (
+            fcntl.LOCK_EX | fcntl.LOCK_NB
+        )
+        with open(path, "a") as f:
+            try:
+                fcntl.flock(f.fileno(), flags)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
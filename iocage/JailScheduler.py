@@ -0,0 +1,495 @@
+# Copyright (c) 2014-2018, iocage
+# Copyright (c) 2017-2018, Stefan Grönke
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted providing that the following conditions
+# are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+# IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+"""Schedule operations on many jails concurrently."""
+import typing
+import collections
+import concurrent.futures
+import queue
+import threading
+import time
+
+import iocage.errors
+import iocage.events
+import iocage.helpers_object
+import iocage.Jails
+
+# MyPy
+import iocage.Jail
+import iocage.Logger
+
+JailEventCallback = typing.Callable[['iocage.events.IocageEvent'], None]
+
+# marks the end of a graceful stop running in its own thread
+_STOPPED = object()
+
+
+class JailScheduler:
+    """
+    Run an operation on many jails following their priority and depends.
+
+    The jails are grouped into tiers of equal priority that are processed
+    one after another. Inside of a tier independent jails are processed
+    concurrently by a limited number of workers, while a jail waits for the
+    jails it depends on. When processing a jail fails, all jails waiting for
+    it fail without being processed.
+    """
+
+    # add jails that scheduled jails depend on to the schedule
+    include_dependencies: bool = True
+    # fail jails without processing them when a predecessor failed
+    require_predecessors: bool = True
+
+    workers: int
+    succeeded: typing.List['iocage.Jail.JailGenerator']
+    skipped: typing.List['iocage.Jail.JailGenerator']
+    failed: typing.List[typing.Tuple[
+        'iocage.Jail.JailGenerator',
+        BaseException
+    ]]
+
+    _jails: 'collections.OrderedDict[str, iocage.Jail.JailGenerator]'
+    _dependencies: typing.Dict[str, typing.List[str]]
+    _executor: typing.Optional[concurrent.futures.ThreadPoolExecutor] = None
+
+    def __init__(
+        self,
+        jails: typing.Iterable['iocage.Jail.JailGenerator'],
+        workers: int=1,
+        event_callback: typing.Optional[JailEventCallback]=None,
+        logger: typing.Optional['iocage.Logger.Logger']=None
+    ) -> None:
+        """
+        Initialize a jail scheduler.
+
+        Args:
+
+            jails (list):
+                The jails to process. Unless disabled by the scheduler class,
+                jails they depend on are added to the schedule automatically.
+
+            workers (int): (default=1)
+                The maximum number of jails processed at the same time.
+
+            event_callback (function): (optional)
+                Receives the events of all jail operations. Calls are
+                serialized, but events of concurrently processed jails are
+                interleaved.
+        """
+        self.logger = iocage.helpers_object.init_logger(self, logger)
+        self.workers = max(1, int(workers))
+        self.event_callback = event_callback
+        self._event_lock = threading.Lock()
+
+        self.succeeded = []
+        self.skipped = []
+        self.failed = []
+
+        self._jails = collections.OrderedDict()
+        self._dependencies = {}
+        for jail in jails:
+            self._jails[str(jail.full_name)] = jail
+        for key in list(self._jails.keys()):
+            self._add_dependencies(key)
+
+    def _add_dependencies(self, key: str) -> None:
+        jail = self._jails[key]
+        self._dependencies[key] = []
+        for dependency in self._resolve_dependencies(jail):
+            dependency_key = str(dependency.full_name)
+            if dependency_key == key:
+                self.logger.warn(f"The jail {jail.name} depends on itself")
+                continue
+            if dependency_key not in self._jails:
+                if self.include_dependencies is False:
+                    continue
+                self._jails[dependency_key] = dependency
+                self._add_dependencies(dependency_key)
+            self._dependencies[key].append(dependency_key)
+
+    def _resolve_dependencies(
+        self,
+        jail: 'iocage.Jail.JailGenerator'
+    ) -> typing.List['iocage.Jail.JailGenerator']:
+        """Return the jails the given jail depends on."""
+        _depends = jail.config["depends"]
+        if len(_depends) == 0:
+            return []
+        return list(iocage.Jails.JailsGenerator(
+            filters=_depends,
+            host=jail.host,
+            logger=self.logger,
+            zfs=jail.zfs
+        ))
+
+    def _get_predecessors(self, key: str) -> typing.List[str]:
+        """Return the jails that need to be processed before a jail."""
+        return self._dependencies[key]
+
+    def _get_priority(self, key: str) -> int:
+        return int(self._jails[key].config["priority"])
+
+    def _get_tiers(self) -> typing.List[typing.List[str]]:
+        """
+        Group the jails into tiers of equal priority in processing order.
+
+        A jail is moved to an earlier tier when a jail processed in that tier
+        needs it as predecessor, so that no jail waits for a later tier.
+        """
+        tier_priorities = dict([
+            (key, self._get_priority(key)) for key in self._jails
+        ])
+        for _ in range(len(self._jails)):
+            changed = False
+            for key in self._jails:
+                for predecessor in self._get_predecessors(key):
+                    tier_priority = self._order_tiers([
+                        tier_priorities[key],
+                        tier_priorities[predecessor]
+                    ])[0]
+                    if tier_priorities[predecessor] != tier_priority:
+                        tier_priorities[predecessor] = tier_priority
+                        changed = True
+            if changed is False:
+                break
+
+        tiers: typing.Dict[int, typing.List[str]] = {}
+        for key in self._jails:
+            tiers.setdefault(tier_priorities[key], []).append(key)
+        return [tiers[x] for x in self._order_tiers(list(tiers.keys()))]
+
+    def _order_tiers(self, priorities: typing.List[int]) -> typing.List[int]:
+        """Sort priority values in the order their tiers are processed."""
+        return sorted(priorities)
+
+    def run(self) -> bool:
+        """
+        Process all scheduled jails.
+
+        Returns True when no jail failed. The processed, skipped and failed
+        jails are available in the according attributes afterwards.
+        """
+        finished: typing.Dict[str, bool] = {}
+        executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.workers
+        )
+        self._executor = executor
+        try:
+            for tier in self._get_tiers():
+                self._run_tier(tier, finished, executor)
+        finally:
+            executor.shutdown(wait=True)
+        return (len(self.failed) == 0)
+
+    def _run_tier(
+        self,
+        tier: typing.List[str],
+        finished: typing.Dict[str, bool],
+        executor: concurrent.futures.ThreadPoolExecutor
+    ) -> None:
+        pending = list(tier)
+        running: typing.Dict[concurrent.futures.Future, str] = {}
+
+        while (len(pending) > 0) or (len(running) > 0):
+            for key in list(pending):
+                if len(running) >= self.workers:
+                    break
+                predecessors = self._get_predecessors(key)
+                failed_predecessors = [
+                    x for x in predecessors if finished.get(x) is False
+                ]
+                if self.require_predecessors is False:
+                    failed_predecessors = []
+                if len(failed_predecessors) > 0:
+                    pending.remove(key)
+                    self._fail(key, failed_predecessors[0])
+                    finished[key] = False
+                    continue
+                if all([(x in finished) for x in predecessors]):
+                    pending.remove(key)
+                    future = executor.submit(self._process, key)
+                    running[future] = key
+
+            if (len(running) == 0) and (len(pending) > 0):
+                # only circular dependencies remain
+                key = pending.pop(0)
+                self.logger.spam(
+                    f"Circular dependency {self._jails[key].name}"
+                    " - ignoring its dependencies"
+                )
+                running[executor.submit(self._process, key)] = key
+
+            done, _ = concurrent.futures.wait(
+                running.keys(),
+                return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                key = running.pop(future)
+                finished[key] = self._record(key, future)
+
+    def _process(self, key: str) -> bool:
+        """Process a jail and return False when it was skipped."""
+        jail = self._jails[key]
+        if self._skip(jail) is True:
+            return False
+        self._forward_events(self._run_jail(jail))
+        return True
+
+    def _forward_events(
+        self,
+        events: typing.Iterable['iocage.events.IocageEvent']
+    ) -> None:
+        for event in events:
+            if self.event_callback is not None:
+                with self._event_lock:
+                    self.event_callback(event)
+
+    def _record(self, key: str, future: concurrent.futures.Future) -> bool:
+        jail = self._jails[key]
+        try:
+            processed = future.result()
+        except Exception as e:
+            self.failed.append((jail, e))
+            return False
+        if processed is True:
+            self.succeeded.append(jail)
+        else:
+            self.skipped.append(jail)
+        return True
+
+    def _fail(self, key: str, predecessor_key: str) -> None:
+        error = iocage.errors.JailDependencyFailed(
+            jail=self._jails[key],
+            dependency=self._jails[predecessor_key],
+            logger=self.logger
+        )
+        self.failed.append((self._jails[key], error))
+
+    def _skip(self, jail: 'iocage.Jail.JailGenerator') -> bool:
+        """Return True when the operation is not required for a jail."""
+        return False
+
+    def _run_jail(
+        self,
+        jail: 'iocage.Jail.JailGenerator'
+    ) -> typing.Iterable['iocage.events.IocageEvent']:
+        raise NotImplementedError("_run_jail unimplemented for JailScheduler")
+
+
+class JailStartScheduler(JailScheduler):
+    """Start jails concurrently following their priority and depends."""
+
+    def _skip(self, jail: 'iocage.Jail.JailGenerator') -> bool:
+        if jail.running is True:
+            self.logger.log(f"{jail.name} is already running - skipping start")
+            return True
+        return False
+
+    def _run_jail(
+        self,
+        jail: 'iocage.Jail.JailGenerator'
+    ) -> typing.Iterable['iocage.events.IocageEvent']:
+        return jail.start()
+
+
+class JailStopScheduler(JailScheduler):
+    """
+    Stop jails concurrently in reverse priority and dependency order.
+
+    Jails are stopped before the jails they depend on, starting with the
+    highest priority value. Other than when starting, a jail is stopped even
+    when a jail that depends on it failed to stop.
+
+    When a deadline is configured, all jails that were not stopped when it
+    expires are stopped forcefully, without running their exec.stop command.
+    A graceful stop still in progress at the deadline is aborted by killing
+    the processes of the jail before the forced stop begins, so that a jail
+    hanging in exec.stop does not delay the shutdown.
+    """
+
+    include_dependencies = False
+    require_predecessors = False
+
+    # seconds an aborted graceful stop may take to end
+    abort_timeout: float = 10.0
+
+    force: bool
+    deadline: typing.Optional[float]
+    _deadline_at: typing.Optional[float] = None
+
+    def __init__(  # noqa: T484
+        self,
+        jails: typing.Iterable['iocage.Jail.JailGenerator'],
+        force: bool=False,
+        deadline: typing.Optional[float]=None,
+        **kwargs
+    ) -> None:
+        """
+        Initialize a jail stop scheduler.
+
+        Args:
+
+            force (bool): (default=False)
+                Stop all jails forcefully.
+
+            deadline (float): (optional)
+                The number of seconds after which stopping the remaining jails
+                is enforced.
+        """
+        self.force = force
+        self.deadline = deadline
+        JailScheduler.__init__(self, jails, **kwargs)
+
+    def _resolve_dependencies(
+        self,
+        jail: 'iocage.Jail.JailGenerator'
+    ) -> typing.List['iocage.Jail.JailGenerator']:
+        # only the order of the scheduled jails is relevant for stopping
+        _depends = jail.config["depends"]
+        if len(_depends) == 0:
+            return []
+        return [
+            x for x in self._jails.values()
+            if (x is not jail) and (_depends.match_resource(x) is True)
+        ]
+
+    def _get_predecessors(self, key: str) -> typing.List[str]:
+        """Return the jails that depend on a jail."""
+        return [
+            x for x, dependencies in self._dependencies.items()
+            if key in dependencies
+        ]
+
+    def _order_tiers(self, priorities: typing.List[int]) -> typing.List[int]:
+        return sorted(priorities, reverse=True)
+
+    def run(self) -> bool:
+        """Stop all scheduled jails within the deadline."""
+        if self.deadline is not None:
+            self._deadline_at = time.monotonic() + self.deadline
+        return JailScheduler.run(self)
+
+    @property
+    def deadline_exceeded(self) -> bool:
+        """Return True when the deadline expired."""
+        if self._deadline_at is None:
+            return False
+        return (time.monotonic() >= self._deadline_at)
+
+    @property
+    def _remaining_time(self) -> typing.Optional[float]:
+        if self._deadline_at is None:
+            return None
+        return max(0.0, self._deadline_at - time.monotonic())
+
+    def _skip(self, jail: 'iocage.Jail.JailGenerator') -> bool:
+        if (self.force is False) and (jail.running is False):
+            self.logger.log(f"{jail.name} is not running - skipping stop")
+            return True
+        return False
+
+    def _run_jail(
+        self,
+        jail: 'iocage.Jail.JailGenerator'
+    ) -> typing.Iterable['iocage.events.IocageEvent']:
+        if (self.force is True) or (self.deadline_exceeded is True):
+            return self._force_stop(jail)
+        return self._stop(jail)
+
+    def _stop(
+        self,
+        jail: 'iocage.Jail.JailGenerator'
+    ) -> typing.Generator['iocage.events.IocageEvent', None, None]:
+        # the graceful stop runs in a daemon thread that can be abandoned
+        # without blocking the worker or the exit of the process
+        results: queue.Queue = queue.Queue()
+        thread = threading.Thread(
+            target=self._collect_stop_events,
+            args=(jail, results,),
+            name=f"Stop {jail.name}",
+            daemon=True
+        )
+        thread.start()
+
+        while True:
+            try:
+                result = results.get(timeout=self._remaining_time)
+            except queue.Empty:
+                break
+            if result is _STOPPED:
+                return
+            if isinstance(result, BaseException):
+                if self.deadline_exceeded is False:
+                    raise result
+                yield from self._force_stop(jail)
+                return
+            yield result
+
+        # the deadline expired while the graceful stop is still in progress
+        self.logger.warn(
+            f"Deadline exceeded - aborting graceful stop of {jail.name}"
+        )
+        try:
+            jail.kill_processes()
+        except iocage.errors.IocageException:
+            pass
+        thread.join(self.abort_timeout)
+        if thread.is_alive() is True:
+            raise iocage.errors.JailStopNotAborted(
+                jail=jail,
+                logger=self.logger
+            )
+
+        # the graceful stop ended, so that no other stop of the jail runs
+        while True:
+            result = results.get()
+            if result is _STOPPED:
+                return
+            if isinstance(result, BaseException):
+                yield from self._force_stop(jail)
+                return
+            yield result
+
+    def _collect_stop_events(
+        self,
+        jail: 'iocage.Jail.JailGenerator',
+        results: queue.Queue
+    ) -> None:
+        try:
+            for event in jail.stop():
+                results.put(event)
+        except BaseException as e:
+            results.put(e)
+            return
+        results.put(_STOPPED)
+
+    def _force_stop(
+        self,
+        jail: 'iocage.Jail.JailGenerator'
+    ) -> typing.Generator['iocage.events.IocageEvent', None, None]:
+        if self.force is False:
+            self.logger.warn(
+                f"Deadline exceeded - forcing stop of {jail.name}"
+            )
+        yield from jail.stop(force=True)
@@ -27,18 +27,24 @@ import typing
 import subprocess
 import json
 import shlex
+import threading
+import time
 
 import iocage.errors
 import iocage.helpers
+import iocage.HostFacts
 
 JailStatesDict = typing.Dict[str, 'JailState']
 
 
 def _get_userland_version() -> float:
-        return float(iocage.helpers.get_os_version()["userland"])
+        return float(iocage.HostFacts.host_facts["os_version"]["userland"])
 
 
-def _parse(text: str) -> JailStatesDict:
+def _parse(
+    text: str,
+    names: typing.Optional[typing.Set[str]]=None
+) -> JailStatesDict:
     output: JailStatesDict = {}
     for line in text.splitlines():
         if line == "":
@@ -53,101 +59,88 @@ def _parse(text: str) -> JailStatesDict:
                     data[pair[0]] = pair[1]
                 else:
                     data[pair[0]] = ""
+        if (names is not None) and (data["name"] not in names):
+            continue
         output[data["name"]] = JailState(data["name"], data)
     return output
 
 
-def _parse_json(data: str) -> JailStatesDict:
+def _parse_json(
+    data: str,
+    names: typing.Optional[typing.Set[str]]=None
+) -> JailStatesDict:
     output: typing.Dict[str, 'JailState'] = {}
     jail_states = json.loads(data)["jail-information"]["jail"]
     for jail_state_data in jail_states:
         identifier = jail_state_data["name"]
+        if (names is not None) and (identifier not in names):
+            continue
         output[identifier] = JailState(identifier, jail_state_data)
     return output
 
 
 class JailState(dict):
-    """State of a running Resource/Jail."""
+    """
+    State of a running Resource/Jail.
+
+    A JailState either holds the data it was created with (for example when
+    parsed from jls output), or lazily resolves its data from a JailStates
+    snapshot, which is shared by all jails unless specified otherwise.
+
+    Lazy jail states are registered as pending in the snapshot, so that the
+    first access of any of them resolves all pending states in one batch.
+    """
 
     name: str
     _data: typing.Optional[typing.Dict[str, str]] = None
     updated = False
 
     logger: typing.Optional['iocage.Logger.Logger']
+    states: typing.Optional['JailStates']
 
     def __init__(
         self,
         name: str,
         data: typing.Optional[typing.Dict[str, str]]=None,
-        logger: typing.Optional['iocage.Logger.Logger']=None
+        logger: typing.Optional['iocage.Logger.Logger']=None,
+        states: typing.Optional['JailStates']=None
     ) -> None:
 
         self.logger = logger
         self.name = name
+        self.states = states
 
         if data is not None:
             self._data = data
-
-    def query(self) -> typing.Dict[str, str]:
-        """Execute jls to update a jails state."""
-        if isinstance(self.logger, iocage.Logger.Logger):
-            self.logger.verbose(f"Querying jail status of {self.name}")
-        if _get_userland_version() >= 11:
-            return self._query_libxo()
         else:
-            return self._query_list()
+            self._states.request(name)
 
-    def _query_libxo(self) -> typing.Dict[str, str]:
-        stdout, _, returncode = iocage.helpers.exec(
-            [
-                "/usr/sbin/jls",
-                "-j",
-                self.name,
-                "-v",
-                "--libxo=json"
-            ],
-            stderr=subprocess.DEVNULL,
-            ignore_error=True,
-            logger=self.logger
-        )
-
-        if returncode > 0:
-            self.clear()
-            return {}
-
-        data = _parse_json(stdout)[self.name]._data
-        self._data = data
-        return data if (data is not None) else {}
-
-    def _query_list(self) -> typing.Dict[str, str]:
-        stdout, _, returncode = iocage.helpers.exec(
-            [
-                "/usr/sbin/jls",
-                "-j",
-                self.name,
-                "-v",
-                "-n",
-                "-q"
-            ],
-            stderr=subprocess.DEVNULL,
-            ignore_error=True,
-            logger=self.logger
-        )
+    def query(self) -> 'JailState':
+        """
+        Update the jail state.
 
-        if returncode > 0:
-            self.clear()
-            return {}
+        The jails entry in the JailStates snapshot is invalidated and the
+        state is resolved on the next access, together with all other jail
+        states pending at that time.
+        """
+        if isinstance(self.logger, iocage.Logger.Logger):
+            self.logger.verbose(f"Querying jail status of {self.name}")
+        self._states.invalidate(self.name)
+        self._data = None
+        return self
 
-        data = _parse(stdout)[self.name]._data
-        self._data = data
-        return data if (data is not None) else {}
+    @property
+    def _states(self) -> 'JailStates':
+        if self.states is not None:
+            return self.states
+        return shared_states
 
     @property
     def data(self) -> typing.Dict[str, str]:
         """Return the jail state data that was previously queried."""
         if self._data is not None:
             return self._data
-        return self.query()
+        return self._states.get_data(self.name, logger=self.logger)
 
     def clear(self) -> None:
         """Clear the jail state."""
@@ -176,42 +169,174 @@ class JailState(dict):
 
 
 class JailStates(dict):
-    """A dictionary of JailStates."""
+    """
+    A dictionary of JailStates.
+
+    The states of all jails are queried with a single jls invocation. This
+    snapshot is reused until its TTL expired or the entry of a jail was
+    invalidated, for example because the jail was started or stopped.
 
-    queried: bool
+    Invalidated and pending jail states are resolved in one batch, so that a
+    single parse of the jls output serves all of them.
+    """
+
+    ttl: typing.Optional[float]
+    _queried_at: typing.Optional[float]
+    _invalidated: typing.Set[str]
+    _pending: typing.Set[str]
+    _resolved_at: typing.Dict[str, float]
 
     def __init__(
         self,
-        states: typing.Optional[JailStatesDict]=None
+        states: typing.Optional[JailStatesDict]=None,
+        ttl: typing.Optional[float]=None
     ) -> None:
+        """
+        Initialize a JailStates snapshot.
+
+        Args:
+
+            ttl (float): (optional)
+                The number of seconds a queried snapshot is valid. Without a
+                TTL the snapshot is valid until it gets invalidated.
+        """
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._invalidated = set()
+        self._pending = set()
+        self._resolved_at = {}
 
         if states is None:
             dict.__init__(self, {})
-            self.queried = False
+            self._queried_at = None
         else:
             dict.__init__(self, states)
-            self.queried = True
+            self._queried_at = time.monotonic()
 
-    def query(
+    @property
+    def queried(self) -> bool:
+        """Return True when the snapshot was queried and is not expired."""
+        return self._is_fresh(self._queried_at)
+
+    def _is_fresh(self, queried_at: typing.Optional[float]) -> bool:
+        if queried_at is None:
+            return False
+        if self.ttl is None:
+            return True
+        return (time.monotonic() - queried_at) < self.ttl
+
+    def is_current(self, name: str) -> bool:
+        """Return True when the state of a jail is known and not expired."""
+        if name in self._invalidated:
+            return False
+        if self._is_fresh(self._resolved_at.get(name, None)) is True:
+            return True
+        return self.queried
+
+    def request(self, name: str) -> None:
+        """Register a jail whose state is resolved with the next batch."""
+        with self._lock:
+            if self.is_current(name) is False:
+                self._pending.add(name)
+
+    def invalidate(self, name: typing.Optional[str]=None) -> None:
+        """
+        Invalidate the state of a jail or the whole snapshot.
+
+        Args:
+
+            name (str): (optional)
+                The identifier of the jail whose state changed. The whole
+                snapshot is invalidated when no name is given.
+        """
+        with self._lock:
+            if name is None:
+                self._queried_at = None
+                self._resolved_at.clear()
+            else:
+                self._invalidated.add(name)
+
+    def get_data(
         self,
+        name: str,
         logger: typing.Optional['iocage.Logger.Logger']=None
+    ) -> typing.Dict[str, str]:
+        """
+        Return the state data of a jail from the snapshot.
+
+        When the jails entry expired or was invalidated, its state is queried
+        together with all other pending and invalidated jails. Jails that are
+        not running have an empty state.
+        """
+        with self._lock:
+            if self.is_current(name) is False:
+                self.query(
+                    logger=logger,
+                    names=(self._pending | self._invalidated | set([name]))
+                )
+
+            try:
+                data = dict.__getitem__(self, name)._data
+            except KeyError:
+                return {}
+            return data if (data is not None) else {}
+
+    def query(
+        self,
+        logger: typing.Optional['iocage.Logger.Logger']=None,
+        names: typing.Optional[typing.Iterable[str]]=None
     ) -> None:
-        """Invoke update of the jail state from jls output."""
-        if logger is not None:
-            logger.verbose("Querying all running jails status")
-        try:
-            if _get_userland_version() >= 11:
-                self._query_libxo(logger=logger)
-            else:
-                self._query_list(logger=logger)
-        except BaseException:
-            raise iocage.errors.JailStateUpdateFailed()
-        self.queried = True
+        """
+        Invoke update of the jail state from jls output.
+
+        Args:
+
+            names (list): (optional)
+                Only update the states of the jails with these identifiers.
+                All of them are resolved from one jls invocation, while the
+                states of other jails remain untouched. The whole snapshot is
+                replaced when no names are given.
+        """
+        with self._lock:
+            _names = None if (names is None) else set(names)
+            if logger is not None:
+                if _names is None:
+                    logger.verbose("Querying all running jails status")
+                else:
+                    logger.verbose(f"Querying status of {len(_names)} jails")
+            try:
+                if _get_userland_version() >= 11:
+                    _query = self._query_libxo
+                else:
+                    _query = self._query_list
+                output_data = _query(logger=logger, names=_names)
+            except BaseException:
+                raise iocage.errors.JailStateUpdateFailed()
+
+            now = time.monotonic()
+            if _names is None:
+                dict.clear(self)
+                dict.update(self, output_data)
+                self._queried_at = now
+                self._invalidated.clear()
+                self._pending.clear()
+                self._resolved_at.clear()
+                return
+
+            for name in _names:
+                if name in output_data:
+                    dict.__setitem__(self, name, output_data[name])
+                elif dict.__contains__(self, name):
+                    dict.__delitem__(self, name)
+                self._resolved_at[name] = now
+            self._invalidated -= _names
+            self._pending -= _names
 
     def _query_libxo(
         self,
-        logger: typing.Optional['iocage.Logger.Logger']=None
-    ) -> None:
+        logger: typing.Optional['iocage.Logger.Logger']=None,
+        names: typing.Optional[typing.Set[str]]=None
+    ) -> JailStatesDict:
         stdout, _, returncode = iocage.helpers.exec(
             [
                 "/usr/sbin/jls",
@@ -224,17 +349,15 @@ class JailStates(dict):
         )
 
         if returncode > 0:
-            self.clear()
-            return
+            return {}
 
-        output_data = _parse_json(stdout)
-        for name in output_data:
-            dict.__setitem__(self, name, output_data[name])
+        return _parse_json(stdout, names=names)
 
     def _query_list(
         self,
-        logger: typing.Optional['iocage.Logger.Logger']=None
-    ) -> None:
+        logger: typing.Optional['iocage.Logger.Logger']=None,
+        names: typing.Optional[typing.Set[str]]=None
+    ) -> JailStatesDict:
         stdout, _, returncode = iocage.helpers.exec(
             [
                 "/usr/sbin/jls",
@@ -248,9 +371,13 @@ class JailStates(dict):
         )
 
         if returncode > 0:
-            self.clear()
-            return
+            return {}
+
+        return _parse(stdout, names=names)
+
+
+# The number of seconds the shared jail state snapshot is reused
+DEFAULT_TTL = 5.0
 
-        output_data = _parse(stdout)
-        for name in output_data:
-            dict.__setitem__(self, name, output_data[name])
+# The jail state snapshot shared by all jails of a process
+shared_states = JailStates(ttl=DEFAULT_TTL)
@@ -28,6 +28,7 @@ import typing
 
 import iocage.Jail
 import iocage.Filter
+import iocage.Inventory
 import iocage.ListableResource
 import iocage.helpers_object
 
@@ -35,7 +36,7 @@ import iocage.helpers_object
 class JailsGenerator(iocage.ListableResource.ListableResource):
     """Asynchronous representation of a collection of jails."""
 
-    states = iocage.JailState.JailStates()
+    states = iocage.JailState.shared_states
 
     # Keys that are stored on the Jail object, not the configuration
     JAIL_KEYS = [
@@ -46,25 +47,62 @@ class JailsGenerator(iocage.ListableResource.ListableResource):
         "ip6.addr"
     ]
 
+    _prefilter_data_sources = ("name", "source", "state")
+    _inventories: typing.Dict[str, 'iocage.Inventory.JailInventory']
+
     def __init__(
         self,
         filters: typing.Optional[iocage.Filter.Terms]=None,
         host: typing.Optional['iocage.Host.HostGenerator']=None,
         logger: typing.Optional['iocage.Logger.Logger']=None,
-        zfs: typing.Optional['iocage.ZFS.ZFS']=None
+        zfs: typing.Optional['iocage.ZFS.ZFS']=None,
+        use_inventory: bool=True,
+        workers: typing.Optional[int]=None,
+        prefetch: typing.Optional[int]=None,
+        data_sources: typing.Optional[typing.Iterable[str]]=None
     ) -> None:
+        """
+        Initialize a collection of jails.
+
+        Args:
+
+            data_sources (list): (optional)
+                The data sources (see iocage.Filter.DATA_SOURCES) that are
+                read from the listed jails. The jail states are only queried
+                when the filters or these data sources require them. All
+                data sources are fetched when unset.
 
+            use_inventory (bool): (default=True)
+                List jails from the on-disk inventory of each root dataset
+                instead of walking the ZFS datasets, and skip jails that do
+                not match the indexed configuration values.
+
+            workers (int): (optional)
+                Load the jail configurations in a pool of worker threads.
+                Jails are still yielded in dataset order.
+
+            prefetch (int): (optional)
+                The maximum number of jails loaded ahead of the iteration.
+        """
         self.logger = iocage.helpers_object.init_logger(self, logger)
         self.zfs = iocage.helpers_object.init_zfs(self, zfs)
         self.host = iocage.helpers_object.init_host(self, host)
 
+        self.use_inventory = use_inventory
+        self.data_sources = None if (data_sources is None) else set(
+            data_sources
+        )
+        self._inventories = {}
+
         iocage.ListableResource.ListableResource.__init__(
             self,
             sources=self.host.datasets,
             namespace="jails",
             filters=filters,
             zfs=zfs,
-            logger=logger
+            logger=logger,
+            workers=workers,
+            prefetch=prefetch
         )
 
     @property
@@ -86,32 +124,148 @@ class JailsGenerator(iocage.ListableResource.ListableResource):
             zfs=self.zfs
         )
 
-        if jail.identifier in self.states:
-            self.logger.spam(
-                f"Injecting pre-loaded state to '{jail.humanreadable_name}'"
+        # resolve the state from the jail state snapshot when accessed
+        jail.state = iocage.JailState.JailState(
+            jail.identifier,
+            logger=self.logger,
+            states=self.states
+        )
+
+        return jail
+
+    def _get_children(
+        self,
+        root_name: str,
+        root_datasets: 'iocage.Datasets.RootDatasets'
+    ) -> typing.Iterable[libzfs.ZFSDataset]:
+        """Return the jail datasets or inventory entries of a root dataset."""
+        if self.use_inventory is False:
+            return iocage.ListableResource.ListableResource._get_children(
+                self,
+                root_name,
+                root_datasets
             )
-            jail.jail_state = self.states[jail.identifier]
+
+        inventory = self.host.get_jail_inventory(root_name)
+        # config files may have changed since the last listing
+        inventory.expire()
+        self._inventories[root_name] = inventory
+        return [inventory[name] for name in inventory.names]
+
+    def _get_resource_from_dataset(
+        self,
+        dataset: libzfs.ZFSDataset
+    ) -> 'iocage.Resource.Resource':
+
+        jail = self._create_resource_instance(dataset)
+
+        inventory = self._inventories.get(jail.root_datasets_name, None)
+        if inventory is not None:
+            if inventory.is_current(jail.name) is False:
+                # refresh outdated entries with the loaded configuration
+                inventory.index_jail(jail, save=False)
 
         return jail
 
+    def _match_prefilters(
+        self,
+        filters: iocage.Filter.CompiledTerms,
+        root_name: str,
+        name: str
+    ) -> bool:
+        """Match state and indexed config filters before loading a jail."""
+        if filters.requires_data_source("state") is True:
+            identifier = f"{root_name}-{name}"
+            if filters.match_data_source(
+                "state",
+                lambda key: self._get_state_value(identifier, key)
+            ) is False:
+                return False
+
+        if filters.requires_data_source("config") is False:
+            return True
+
+        inventory = self._inventories.get(root_name, None)
+        if inventory is None:
+            return True
+
+        data = inventory.get_data(name)
+        if data is None:
+            # the jail was not yet indexed or its config changed since
+            return True
+
+        return filters.match_data_source(
+            "config",
+            lambda key: data[key],  # noqa: T484
+            keys=data.keys()
+        )
+
+    def _get_state_value(self, identifier: str, key: str) -> typing.Any:
+        try:
+            jid: typing.Optional[int] = int(self.states[identifier]["jid"])
+        except (KeyError, TypeError, ValueError):
+            jid = None
+
+        if key == "running":
+            return jid is not None
+        if key == "stopped":
+            return jid is None
+        if key == "jid":
+            return jid
+
+        try:
+            return self.states[identifier][key]
+        except KeyError:
+            return None
+
+    def _query_states(
+        self,
+        filters: typing.Optional['iocage.Filter.CompiledTerms']
+    ) -> None:
+        """Query the jail states when filters or consumers require them."""
+        if self.states.queried is True:
+            return
+
+        requires_states = (self.data_sources is None)
+        requires_states |= ("state" in (self.data_sources or []))
+        if filters is not None:
+            requires_states |= filters.requires_data_source("state")
+
+        if requires_states is True:
+            with self.statistics.measure("state"):
+                self.states.query(logger=self.logger)
+
+    def _count_datasets(
+        self,
+        filters: typing.Optional['iocage.Filter.CompiledTerms']
+    ) -> int:
+        """Count matching jails from their names and the jail state table."""
+        self._query_states(filters)
+
+        self._inventories = {}
+        try:
+            return iocage.ListableResource.ListableResource._count_datasets(
+                self,
+                filters
+            )
+        finally:
+            for inventory in self._inventories.values():
+                inventory.save()
+
     def __iter__(
         self
     ) -> typing.Generator['iocage.Resource.Resource', None, None]:
         """Iterate over all jails matching the filter criteria."""
-        if self.states.queried is False:
-            self.states.query(logger=self.logger)
-
-        iterator = iocage.ListableResource.ListableResource.__iter__(self)
-        for jail in iterator:
-
-            if jail.identifier in self.states:
-                jail.state = self.states[jail.identifier]
-            else:
-                jail.state = iocage.JailState.JailState(
-                    jail.identifier, {}
-                )
+        self._query_states(
+            None if (self.filters is None) else self.filters.compile()
+        )
 
-            yield jail
+        self._inventories = {}
+        try:
+            yield from iocage.ListableResource.ListableResource.__iter__(self)
+        finally:
+            for inventory in self._inventories.values():
+                inventory.save()
 
 
 class Jails(JailsGenerator):
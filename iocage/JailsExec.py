@@ -0,0 +1,198 @@
+# Copyright (c) 2014-2018, iocage
+# Copyright (c) 2017-2018, Stefan Grönke
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted providing that the following conditions
+# are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+# IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+"""Execute a command in many jails concurrently."""
+import typing
+import concurrent.futures
+import threading
+
+import iocage.errors
+import iocage.helpers_object
+
+# MyPy
+import iocage.Jail
+import iocage.Logger
+
+JailOutputCallback = typing.Callable[['iocage.Jail.JailGenerator', str], None]
+
+
+class JailExecResult:
+    """The outcome of a command executed in a single jail."""
+
+    jail: 'iocage.Jail.JailGenerator'
+    returncode: typing.Optional[int]
+    error: typing.Optional[BaseException]
+
+    def __init__(
+        self,
+        jail: 'iocage.Jail.JailGenerator',
+        returncode: typing.Optional[int]=None,
+        error: typing.Optional[BaseException]=None
+    ) -> None:
+        self.jail = jail
+        self.returncode = returncode
+        self.error = error
+
+    @property
+    def skipped(self) -> bool:
+        """Return True when the command was not executed."""
+        return (self.returncode is None) and (self.error is None)
+
+    @property
+    def succeeded(self) -> bool:
+        """Return True when the command exited with status 0."""
+        return (self.returncode == 0)
+
+    @property
+    def status(self) -> str:
+        """Return the exit status in human readable format."""
+        if self.error is not None:
+            return "error"
+        if self.returncode is None:
+            return "not running"
+        return str(self.returncode)
+
+
+class JailsExec:
+    """
+    Execute a command concurrently in many running jails.
+
+    The number of jails the command runs in at the same time is limited by
+    the workers. Each line of output is passed to the output callback along
+    with the jail it originates from. Calls of the callback are serialized,
+    so that lines of concurrently executed commands do not mix. Jails that
+    are not running are skipped.
+    """
+
+    workers: int
+    command: typing.List[str]
+    results: typing.List[JailExecResult]
+
+    def __init__(
+        self,
+        jails: typing.Iterable['iocage.Jail.JailGenerator'],
+        command: typing.List[str],
+        workers: int=4,
+        env: typing.Optional[typing.Dict[str, str]]=None,
+        output_callback: typing.Optional[JailOutputCallback]=None,
+        logger: typing.Optional['iocage.Logger.Logger']=None
+    ) -> None:
+        """
+        Initialize the execution of a command in many jails.
+
+        Args:
+
+            jails (list):
+                The jails the command is executed in.
+
+            command (list):
+                The command and its arguments.
+
+            workers (int): (default=4)
+                The maximum number of jails the command runs in at a time.
+
+            env (dict): (optional)
+                Additional environment variables of the command.
+
+            output_callback (function): (optional)
+                Receives the jail and each line of output of its command.
+        """
+        self.logger = iocage.helpers_object.init_logger(self, logger)
+        self.jails = list(jails)
+        self.command = list(command)
+        self.workers = max(1, int(workers))
+        self.env = {} if (env is None) else env
+        self.output_callback = output_callback
+        self._output_lock = threading.Lock()
+        self.results = []
+
+    @property
+    def failed(self) -> typing.List[JailExecResult]:
+        """Return the results of commands that failed."""
+        return [
+            result for result in self.results
+            if (result.skipped is False) and (result.succeeded is False)
+        ]
+
+    @property
+    def skipped(self) -> typing.List[JailExecResult]:
+        """Return the results of jails that were not running."""
+        return [result for result in self.results if result.skipped]
+
+    @property
+    def summary(self) -> typing.Dict[str, str]:
+        """Return the exit status of the command in each jail by name."""
+        return {
+            str(result.jail.humanreadable_name): result.status
+            for result in self.results
+        }
+
+    def run(self) -> bool:
+        """
+        Execute the command in all jails.
+
+        Returns True when no command failed. Results are ordered like the
+        jails.
+        """
+        executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.workers
+        )
+        try:
+            futures = [
+                executor.submit(self._exec, jail) for jail in self.jails
+            ]
+            self.results = [future.result() for future in futures]
+        finally:
+            executor.shutdown(wait=True)
+
+        return (len(self.failed) == 0)
+
+    def _exec(self, jail: 'iocage.Jail.JailGenerator') -> JailExecResult:
+        if jail.running is False:
+            self.logger.verbose(
+                f"Skipping jail {jail.humanreadable_name} that is not running"
+            )
+            return JailExecResult(jail)
+
+        try:
+            lines = jail.exec_generator(self.command, env=self.env)
+            while True:
+                line = next(lines)
+                self._output(jail, line)
+        except StopIteration as return_statement:
+            _, _, returncode = return_statement.value
+            return JailExecResult(jail, returncode=returncode)
+        except Exception as e:
+            self.logger.error(
+                f"Executing the command in {jail.humanreadable_name} "
+                f"failed: {e}"
+            )
+            return JailExecResult(jail, error=e)
+
+    def _output(self, jail: 'iocage.Jail.JailGenerator', line: bytes) -> None:
+        if self.output_callback is None:
+            return
+        text = line.decode("UTF-8", errors="replace").rstrip("\r")
+        with self._output_lock:
+            self.output_callback(jail, text)
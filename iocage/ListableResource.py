@@ -24,6 +24,11 @@
 # POSSIBILITY OF SUCH DAMAGE.
 """iocage Resource module."""
 import typing
+import collections
+import concurrent.futures
+import contextlib
+import threading
+import time
 import libzfs
 import abc
 
@@ -31,11 +36,46 @@ import iocage.Filter
 import iocage.Resource
 import iocage.helpers_object
 
+# MyPy
+import iocage.Datasets
+
+
+class DataSourceStatistics(dict):
+    """Count and time the data source lookups of a listing."""
+
+    def __init__(self) -> None:
+        dict.__init__(self)
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def measure(
+        self,
+        data_source: str
+    ) -> typing.Generator[None, None, None]:
+        """Measure a lookup of the given data source."""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            duration = time.monotonic() - start
+            with self._lock:
+                lookups, seconds = self.get(data_source, (0, 0.0))
+                self[data_source] = (lookups + 1, seconds + duration)
+
+    def __str__(self) -> str:
+        """Return the statistics in human readable format."""
+        return ", ".join([
+            f"{data_source}: {lookups} lookups in {seconds:.3f}s"
+            for data_source, (lookups, seconds) in self.items()
+        ])
+
 
 class ListableResource(list):
     """Representation of Resources that can be listed."""
 
     _filters: typing.Optional['iocage.Filter.Terms'] = None
+    # filter data sources that are matched before a resource is loaded
+    _prefilter_data_sources: typing.Tuple[str, ...] = ("name", "source")
     sources: 'iocage.Datasets.Datasets'
     namespace: typing.Optional[str]
 
@@ -46,8 +86,24 @@ class ListableResource(list):
         filters: typing.Optional['iocage.Filter.Terms']=None,
         logger: typing.Optional['iocage.Logger.Logger']=None,
         zfs: typing.Optional['iocage.ZFS.ZFS']=None,
+        workers: typing.Optional[int]=None,
+        prefetch: typing.Optional[int]=None
     ) -> None:
+        """
+        Initialize a listable resource.
+
+        Args:
+
+            workers (int): (optional)
+                Load resources with this number of threads. Resources are
+                loaded one after another unless more than one worker is
+                configured.
 
+            prefetch (int): (optional)
+                The maximum number of resources that are loaded ahead of the
+                iteration when loading in parallel. Defaults to four times
+                the number of workers.
+        """
         list.__init__(self, [])
 
         self.logger = iocage.helpers_object.init_logger(self, logger)
@@ -56,6 +112,9 @@ class ListableResource(list):
         self.namespace = namespace
         self.sources = sources
         self.filters = filters
+        self.workers = workers
+        self.prefetch = prefetch
+        self.statistics = DataSourceStatistics()
 
     @property
     def filters(self) -> typing.Optional['iocage.Filter.Terms']:
@@ -86,30 +145,148 @@ class ListableResource(list):
                 logger=self.logger
             )
 
-        filters = self._filters
-        has_filters = (filters is not None)
+        # compile the filters once for all iterated resources
+        filters = None if (self._filters is None) else self._filters.compile()
+        resource_data_sources = self._get_resource_data_sources()
 
+        datasets = self._iter_filtered_datasets(filters)
+        if (self.workers is not None) and (self.workers > 1):
+            resources = self._load_resources_parallel(datasets)
+        else:
+            resources = map(self._load_resource, datasets)
+
+        for resource in resources:
+            if filters is not None:
+                if filters.match_resource(
+                    resource,
+                    data_sources=resource_data_sources
+                ):
+                    yield resource
+
+    def _iter_filtered_datasets(
+        self,
+        filters: typing.Optional['iocage.Filter.CompiledTerms']
+    ) -> typing.Generator[libzfs.ZFSDataset, None, None]:
+        """Yield the child datasets that pass the prefilters in order."""
+        has_filters = (filters is not None)
         for root_name, root_datasets in self.sources.items():
             if (filters is not None):
                 if (filters.match_source(root_name) is False):
                     # skip when the resources defined source does not match
                     continue
-            children = root_datasets.__getattribute__(self.namespace).children
+            with self.statistics.measure("name"):
+                children = list(self._get_children(root_name, root_datasets))
             for child_dataset in children:
                 name = self._get_asset_name_from_dataset(child_dataset)
                 if has_filters and (filters.match_key("name", name) is False):
                         # Skip all jails that do not even match the name
                         continue
 
-                # ToDo: Do not load jail if filters do not require to
-                resource = self._get_resource_from_dataset(child_dataset)
-                if self._filters is not None:
-                    if self._filters.match_resource(resource):
-                        yield resource
+                if has_filters and (self._match_prefilters(
+                    filters,
+                    root_name=root_name,
+                    name=name
+                ) is False):
+                    # Skip before the resource configuration is loaded
+                    continue
+
+                yield child_dataset
+
+    def _load_resources_parallel(
+        self,
+        datasets: typing.Iterable[libzfs.ZFSDataset]
+    ) -> typing.Generator['iocage.Resource.Resource', None, None]:
+        """
+        Load resources in a thread pool and yield them in dataset order.
+
+        Reading resource configurations is bound by I/O, so that loading
+        them concurrently reduces the wall time of listing many resources.
+        At most `prefetch` resources are loaded ahead of the consumer.
+        """
+        workers = int(self.workers)  # type: ignore
+        prefetch = workers * 4 if (self.prefetch is None) else self.prefetch
+        prefetch = max(prefetch, 1)
+
+        window: typing.Deque[concurrent.futures.Future] = collections.deque()
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        try:
+            for dataset in datasets:
+                window.append(executor.submit(self._load_resource, dataset))
+                if len(window) >= prefetch:
+                    yield window.popleft().result()
+            while len(window) > 0:
+                yield window.popleft().result()
+        finally:
+            # do not load resources that are no longer consumed
+            for future in window:
+                future.cancel()
+            executor.shutdown(wait=True)
+
+    def _load_resource(
+        self,
+        dataset: libzfs.ZFSDataset
+    ) -> 'iocage.Resource.Resource':
+        with self.statistics.measure("config"):
+            return self._get_resource_from_dataset(dataset)
+
+    def _get_children(
+        self,
+        root_name: str,
+        root_datasets: 'iocage.Datasets.RootDatasets'
+    ) -> typing.Iterable[libzfs.ZFSDataset]:
+        """Return the child datasets of a root datasets namespace."""
+        children: typing.Iterable[libzfs.ZFSDataset]
+        children = root_datasets.__getattribute__(self.namespace).children
+        return children
+
+    def _get_resource_data_sources(self) -> typing.List[str]:
+        """Return the data sources that require a loaded resource."""
+        return list(filter(
+            lambda x: x not in self._prefilter_data_sources,
+            iocage.Filter.DATA_SOURCES
+        ))
+
+    def _match_prefilters(
+        self,
+        filters: 'iocage.Filter.CompiledTerms',
+        root_name: str,
+        name: str
+    ) -> bool:
+        """
+        Match filter terms that do not require the resource to be loaded.
+
+        Inheriting classes that add data sources to _prefilter_data_sources
+        implement the according matching here.
+        """
+        return True
 
     def __len__(self) -> int:
-        """Return the number of resources matching the filters."""
-        return len(list(self.__iter__()))
+        """
+        Return the number of resources matching the filters.
+
+        When no filter term requires a loaded resource, the matching datasets
+        are counted without creating any Resource. Otherwise the resources
+        are streamed and counted without being held in memory.
+        """
+        if self.namespace is None:
+            raise iocage.errors.ListableResourceNamespaceUndefined(
+                logger=self.logger
+            )
+
+        filters = None if (self._filters is None) else self._filters.compile()
+        if filters is not None:
+            for data_source in self._get_resource_data_sources():
+                if filters.requires_data_source(data_source) is True:
+                    return sum(1 for _ in self.__iter__())
+
+        return self._count_datasets(filters)
+
+    def _count_datasets(
+        self,
+        filters: typing.Optional['iocage.Filter.CompiledTerms']
+    ) -> int:
+        """Count the datasets passing the filters without loading them."""
+        return sum(1 for _ in self._iter_filtered_datasets(filters))
 
     def _get_asset_name_from_dataset(
         self,
@@ -24,7 +24,7 @@
 # POSSIBILITY OF SUCH DAMAGE.
 """iocage release module."""
 import typing
-import hashlib
+import functools
 import os
 import urllib.request
 import urllib.error
@@ -42,6 +42,7 @@ import iocage.LaunchableResource
 import iocage.ResourceSelector
 import iocage.Jail
 import iocage.SecureTarfile
+import iocage.Downloader
 
 # MyPy
 import iocage.Resource
@@ -237,6 +238,16 @@ class ReleaseGenerator(ReleaseResource):
     _resource: iocage.Resource.Resource
     _assets: typing.List[str]
     _mirror_url: typing.Optional[str]
+    _download_pool: typing.Optional['iocage.Downloader.ConnectionPool']
+
+    # The number of release assets downloaded at the same time
+    download_workers: int = 4
+
+    # Keep the downloaded asset files after a release was fetched
+    keep_assets: bool = False
+
+    # Fetch assets only from the host asset cache without network access
+    offline: bool = False
 
     def __init__(
         self,
@@ -278,6 +289,7 @@ class ReleaseGenerator(ReleaseResource):
         self.name = name
         self._hbsd_release_branch = None
         self._mirror_url = None
+        self._download_pool = None
 
         self._hashes = None
         self.check_hashes = check_hashes is True
@@ -634,9 +646,19 @@ class ReleaseGenerator(ReleaseResource):
         self,
         update: typing.Optional[bool]=None,
         fetch_updates: typing.Optional[bool]=None,
-        event_scope: typing.Optional['iocage.events.Scope']=None
+        event_scope: typing.Optional['iocage.events.Scope']=None,
+        stream: bool=False
     ) -> typing.Generator['iocage.events.IocageEvent', None, None]:
-        """Fetch the release from the remote."""
+        """
+        Fetch the release from the remote.
+
+        Args:
+
+            stream (bool): (default=False)
+                Extract the release assets while they are downloaded. The
+                data is hashed on the fly and the extraction is rolled back
+                when an asset hash does not match.
+        """
         release_changed = False
         self._require_release_supported()
 
@@ -667,7 +689,8 @@ class ReleaseGenerator(ReleaseResource):
             scope=_scope
         )
 
-        if self.fetched is False:
+        fetched = self.fetched
+        if fetched is False:
 
             yield fetchReleaseEvent.begin()
             yield releasePrepareStorageEvent.begin()
@@ -678,9 +701,36 @@ class ReleaseGenerator(ReleaseResource):
             self._ensure_dataset_mounted()
 
             yield releasePrepareStorageEvent.end()
+
+        if (fetched is False) and (stream is True):
+
             yield releaseDownloadEvent.begin()
+            try:
+                for event in self._stream_assets(
+                    releaseDownloadEvent,
+                    event_scope=_scope
+                ):
+                    yield event
+            except Exception as e:
+                yield releaseDownloadEvent.fail(e)
+                raise
 
-            self._fetch_assets()
+            yield releaseDownloadEvent.end()
+            yield releaseExtractionEvent.skip(message="streamed")
+            release_changed = True
+
+            yield fetchReleaseEvent.end()
+
+        elif fetched is False:
+
+            yield releaseDownloadEvent.begin()
+
+            try:
+                for event in self._fetch_assets(event_scope=_scope):
+                    yield event
+            except Exception as e:
+                yield releaseDownloadEvent.fail(e)
+                raise
 
             yield releaseDownloadEvent.end()
             yield releaseExtractionEvent.begin()
@@ -807,25 +857,313 @@ class ReleaseGenerator(ReleaseResource):
         if not self.dataset.mountpoint:
             self.dataset.mount()
 
+    @property
+    def _downloader(self) -> 'iocage.Downloader.Downloader':
+        """Return a downloader sharing the keep-alive mirror connections."""
+        if self._download_pool is None:
+            self._download_pool = iocage.Downloader.ConnectionPool(
+                max_connections=self.download_workers
+            )
+        return iocage.Downloader.Downloader(
+            workers=self.download_workers,
+            pool=self._download_pool,
+            logger=self.logger
+        )
+
+    @property
+    def _hashfile_cache_name(self) -> str:
+        hash_file = self.host.distribution.hash_file
+        return f"{self.host.distribution.name}/{self.real_name}/{hash_file}"
+
     def _fetch_hashes(self) -> None:
         url = f"{self.remote_url}/{self.host.distribution.hash_file}"
         path = self.__get_hashfile_location()
+        asset_cache = self.host.asset_cache
+
+        if self.offline is True:
+            if (asset_cache is None) or (asset_cache.get_file(
+                self._hashfile_cache_name,
+                path
+            ) is False):
+                raise iocage.errors.ReleaseAssetNotCached(
+                    release_name=self.name,
+                    asset_name=self.host.distribution.hash_file,
+                    logger=self.logger
+                )
+            return
+
         self.logger.verbose(f"Downloading hashes from {url}")
-        urllib.request.urlretrieve(url, path)  # nosec: validated in @setter
+        self._downloader.download(url, path)  # nosec: validated in @setter
         self.logger.debug(f"Hashes downloaded to {path}")
+        if asset_cache is not None:
+            try:
+                asset_cache.put_file(self._hashfile_cache_name, path)
+            except OSError as e:
+                self.logger.warn(f"Could not cache the release hashes: {e}")
+
+    def _get_asset_digest(self, asset_name: str) -> typing.Optional[str]:
+        """Return the SHA-256 of an asset when the asset cache is used."""
+        if self.host.asset_cache is None:
+            return None
+        return self.hashes.get(asset_name, None)
 
-    def _fetch_assets(self) -> None:
+    def _restore_cached_asset(self, asset_name: str) -> bool:
+        """Place an asset from the cache in the download directory."""
+        digest = self._get_asset_digest(asset_name)
+        if digest is not None:
+            asset_location = self._get_asset_location(asset_name)
+            try:
+                if self.host.asset_cache.get(digest, asset_location) is True:
+                    return True
+            except OSError as e:
+                self.logger.warn(
+                    f"Could not restore {asset_name}.txz from cache: {e}"
+                )
+        if self.offline is True:
+            raise iocage.errors.ReleaseAssetNotCached(
+                release_name=self.name,
+                asset_name=f"{asset_name}.txz",
+                logger=self.logger
+            )
+        return False
+
+    def _cache_asset(self, asset_name: str, path: str) -> None:
+        """Add an asset with verified hash to the cache."""
+        digest = self._get_asset_digest(asset_name)
+        if (digest is None) or (digest in self.host.asset_cache):
+            return
+        try:
+            self.host.asset_cache.put(digest, path)
+        except OSError as e:
+            self.logger.warn(f"Could not cache {asset_name}.txz: {e}")
+
+    def _fetch_assets(
+        self,
+        event_scope: typing.Optional['iocage.events.Scope']=None
+    ) -> typing.Generator['iocage.events.ReleaseDownload', None, None]:
+        """
+        Download the missing release assets in parallel.
+
+        Each asset download is reflected by its own ReleaseDownload event.
+        Interrupted downloads are resumed from their partial file, also
+        when the fetch is started again later.
+        """
+        files: typing.Dict[str, str] = {}
+        assetDownloadEvents: typing.Dict[
+            str,
+            'iocage.events.ReleaseDownload'
+        ] = {}
         for asset in self.assets:
             url = f"{self.remote_url}/{asset}.txz"
             path = self._get_asset_location(asset)
 
             if os.path.isfile(path):
                 self.logger.verbose(f"{path} already exists - skipping.")
-                return
+                continue
+
+            assetDownloadEvent = iocage.events.ReleaseDownload(
+                self,
+                asset=asset,
+                scope=event_scope
+            )
+            if self._restore_cached_asset(asset) is True:
+                yield assetDownloadEvent.skip(message="cached")
+                continue
+
+            self.logger.debug(f"Starting download of {url}")
+            files[url] = path
+            assetDownloadEvents[url] = assetDownloadEvent
+
+        for assetDownloadEvent in assetDownloadEvents.values():
+            yield assetDownloadEvent.begin()
+
+        try:
+            for status in self._downloader.download_all(files):
+                assetDownloadEvent = assetDownloadEvents[status.url]
+                if status.done is True:
+                    yield assetDownloadEvent.end()
+                else:
+                    yield assetDownloadEvent.progress(
+                        received=status.received,
+                        total=status.total
+                    )
+        except Exception as e:
+            for assetDownloadEvent in assetDownloadEvents.values():
+                if assetDownloadEvent.pending is True:
+                    yield assetDownloadEvent.fail(e)
+            raise
+
+    def _stream_assets(
+        self,
+        releaseDownloadEvent: 'iocage.events.ReleaseDownload',
+        event_scope: typing.Optional['iocage.events.Scope']=None
+    ) -> typing.Generator['iocage.events.ReleaseDownload', None, None]:
+        """
+        Download, hash and extract the release assets in a single pass.
+
+        The root dataset is snapshotted before the extraction and rolled
+        back when a download fails or an asset hash does not match.
+        """
+        if (self.check_hashes is True) or (self.host.asset_cache is not None):
+            # the expected hashes need to be known before streaming
+            self.hashes
+
+        for asset in self.assets:
+            # streamed from the download directory instead of the network
+            if os.path.isfile(self._get_asset_location(asset)) is False:
+                self._restore_cached_asset(asset)
+
+        snapshot_name = iocage.ZFS.append_snapshot_datetime(
+            f"{self.root_dataset.name}@pre-fetch"
+        )
+        self.root_dataset.snapshot(snapshot_name)
+
+        def _rollback_snapshot() -> None:
+            self.logger.spam(f"Rolling back to snapshot {snapshot_name}")
+            snapshot = self.zfs.get_snapshot(snapshot_name)
+            snapshot.rollback(force=True)
+            snapshot.delete()
+
+        releaseDownloadEvent.add_rollback_step(_rollback_snapshot)
+
+        downloader = self._downloader
+        jobs: typing.Dict[str, 'iocage.Downloader.DownloadJob'] = {}
+        assetDownloadEvents: typing.Dict[
+            str,
+            'iocage.events.ReleaseDownload'
+        ] = {}
+        for asset in self.assets:
+            url = f"{self.remote_url}/{asset}.txz"
+            jobs[url] = functools.partial(
+                self._stream_asset,
+                downloader,
+                asset,
+                url
+            )
+            assetDownloadEvents[url] = iocage.events.ReleaseDownload(
+                self,
+                asset=asset,
+                scope=event_scope
+            )
+
+        for assetDownloadEvent in assetDownloadEvents.values():
+            yield assetDownloadEvent.begin()
+
+        try:
+            for status in downloader.run_all(jobs):
+                assetDownloadEvent = assetDownloadEvents[status.url]
+                if status.done is True:
+                    yield assetDownloadEvent.end()
+                else:
+                    yield assetDownloadEvent.progress(
+                        received=status.received,
+                        total=status.total
+                    )
+        except Exception as e:
+            for assetDownloadEvent in assetDownloadEvents.values():
+                if assetDownloadEvent.pending is True:
+                    yield assetDownloadEvent.fail(e)
+            raise
+
+        self.zfs.get_snapshot(snapshot_name).delete()
+
+    def _stream_asset(
+        self,
+        downloader: 'iocage.Downloader.Downloader',
+        asset_name: str,
+        url: str,
+        progress: 'iocage.Downloader.DownloadProgressCallback'
+    ) -> None:
+        """
+        Extract an asset from its download stream and verify its hash.
+
+        Assets already found in the download directory are read from there.
+        Downloaded data is copied to the download directory while streaming
+        when the asset is kept or added to the asset cache. The assets are
+        extracted into the release root one after another, so that an asset
+        downloaded while another one is extracted is buffered in the
+        download directory until it is its turn.
+        """
+        asset_location = self._get_asset_location(asset_name)
+        part_location = f"{asset_location}.part"
+        cache = (self.check_hashes is True) and (
+            self._get_asset_digest(asset_name) is not None
+        )
+        extract_lock = iocage.SecureTarfile.get_destination_lock(
+            self.root_dir
+        )
+
+        stream: typing.BinaryIO
+        copy_to: typing.Optional[typing.BinaryIO] = None
+        locked = False
+        if os.path.isfile(asset_location):
+            self.logger.verbose(f"Reading {asset_name} from {asset_location}")
+            stream = open(asset_location, "rb")
+            cache = False
+        else:
+            stream = downloader.open(url, progress=progress)  # type: ignore
+            locked = extract_lock.acquire(blocking=False)
+            if (self.keep_assets is True) or (cache is True) or (
+                locked is False
+            ):
+                copy_to = open(part_location, "wb")
+
+        try:
+            with stream:
+                reader = iocage.Downloader.HashingReader(
+                    stream,  # type: ignore
+                    copy_to=copy_to
+                )
+                if (locked is False) and (copy_to is not None):
+                    # another asset is extracted - buffer the download
+                    reader.drain()
+                    copy_to.flush()
+                    extract_lock.acquire()
+                    locked = True
+                    with open(part_location, "rb") as part:
+                        self._extract_asset_stream(asset_name, part)
+                else:
+                    if locked is False:
+                        extract_lock.acquire()
+                        locked = True
+                    self._extract_asset_stream(
+                        asset_name,
+                        reader  # type: ignore
+                    )
+                    # the archive may end before the stream does
+                    reader.drain()
+            if self.check_hashes is True:
+                self._verify_asset_hash(asset_name, reader.hexdigest())
+        except BaseException:
+            if copy_to is not None:
+                copy_to.close()
+                os.remove(part_location)
+            raise
+        finally:
+            if locked is True:
+                extract_lock.release()
+
+        if copy_to is not None:
+            copy_to.close()
+            if cache is True:
+                self._cache_asset(asset_name, part_location)
+            if self.keep_assets is True:
+                os.replace(part_location, asset_location)
             else:
-                self.logger.debug(f"Starting download of {url}")
-                urllib.request.urlretrieve(url, path)  # nosec: validated
-                self.logger.verbose(f"{url} was saved to {path}")
+                os.remove(part_location)
+
+    def _extract_asset_stream(
+        self,
+        asset_name: str,
+        fileobj: typing.BinaryIO
+    ) -> None:
+        iocage.SecureTarfile.extract_stream(
+            fileobj=fileobj,
+            destination=self.root_dir,
+            name=f"{asset_name}.txz",
+            compression_format="xz",
+            logger=self.logger
+        )
 
     def read_hashes(self) -> typing.Dict[str, str]:
         """Read the release asset hashes."""
@@ -858,11 +1196,13 @@ class ReleaseGenerator(ReleaseResource):
 
     def _extract_assets(self) -> None:
 
-        for asset in self.assets:
-
-            if self.check_hashes:
-                self._check_asset_hash(asset)
+        if self.check_hashes:
+            # verify all assets concurrently before extracting any of them
+            self._check_asset_hashes(self.assets)
+            for asset in self.assets:
+                self._cache_asset(asset, self._get_asset_location(asset))
 
+        for asset in self.assets:
             iocage.SecureTarfile.extract(
                 file=self._get_asset_location(asset),
                 compression_format="xz",
@@ -904,13 +1244,31 @@ class ReleaseGenerator(ReleaseResource):
         self.logger.debug(f"Base release '{self.name}' updated")
 
     def _cleanup(self) -> None:
+        if self._download_pool is not None:
+            self._download_pool.close()
+            self._download_pool = None
+        if self.keep_assets is True:
+            return
         for asset in self.assets:
             asset_location = self._get_asset_location(asset)
             if os.path.isfile(asset_location):
                 os.remove(asset_location)
 
     def _check_asset_hash(self, asset_name: str) -> None:
-        local_file_hash = self._read_asset_hash(asset_name)
+        self._verify_asset_hash(asset_name, self._read_asset_hash(asset_name))
+
+    def _check_asset_hashes(self, asset_names: typing.List[str]) -> None:
+        """Verify the hashes of multiple assets in parallel."""
+        for asset_name, local_file_hash in self._read_asset_hashes(
+            asset_names
+        ).items():
+            self._verify_asset_hash(asset_name, local_file_hash)
+
+    def _verify_asset_hash(
+        self,
+        asset_name: str,
+        local_file_hash: str
+    ) -> None:
         expected_hash = self.hashes[asset_name]
 
         has_valid_hash = local_file_hash == expected_hash
@@ -920,7 +1278,7 @@ class ReleaseGenerator(ReleaseResource):
                 f"(was '{local_file_hash}' but expected '{expected_hash}')"
             )
             raise iocage.errors.InvalidReleaseAssetSignature(
-                release_name=self.name,
+                name=self.name,
                 asset_name=asset_name,
                 logger=self.logger
             )
@@ -931,11 +1289,21 @@ class ReleaseGenerator(ReleaseResource):
 
     def _read_asset_hash(self, asset_name: str) -> str:
         asset_location = self._get_asset_location(asset_name)
-        sha256 = hashlib.sha256()
-        with open(asset_location, 'rb') as f:
-            for block in iter(lambda: f.read(65536), b''):
-                sha256.update(block)
-        return sha256.hexdigest()
+        return iocage.helpers.hash_file(asset_location)
+
+    def _read_asset_hashes(
+        self,
+        asset_names: typing.List[str]
+    ) -> typing.Dict[str, str]:
+        locations = dict([
+            (self._get_asset_location(asset_name), asset_name)
+            for asset_name in asset_names
+        ])
+        digests = iocage.helpers.hash_files(locations.keys())
+        return dict([
+            (locations[location], digest)
+            for location, digest in digests.items()
+        ])
 
     def __str__(self) -> str:
         """Return the release name."""
@@ -970,14 +1338,16 @@ class Release(ReleaseGenerator):
         self,
         update: typing.Optional[bool]=None,
         fetch_updates: typing.Optional[bool]=None,
-        event_scope: typing.Optional['iocage.events.Scope']=None
+        event_scope: typing.Optional['iocage.events.Scope']=None,
+        stream: bool=False
     ) -> typing.List['iocage.events.IocageEvent']:
         """Fetch the release from the remote synchronously."""
         return list(ReleaseGenerator.fetch(
             self,
             update=update,
             fetch_updates=fetch_updates,
-            event_scope=event_scope
+            event_scope=event_scope,
+            stream=stream
         ))
 
     def destroy(  # noqa: T484
@@ -47,7 +47,9 @@ class ReleasesGenerator(iocage.ListableResource.ListableResource):
         filters: typing.Optional[iocage.Filter.Terms]=None,
         host: typing.Optional['iocage.Host.HostGenerator']=None,
         zfs: typing.Optional['iocage.ZFS.ZFS']=None,
-        logger: typing.Optional['iocage.Logger.Logger']=None
+        logger: typing.Optional['iocage.Logger.Logger']=None,
+        workers: typing.Optional[int]=None,
+        prefetch: typing.Optional[int]=None
     ) -> None:
 
         self.logger = iocage.helpers_object.init_logger(self, logger)
@@ -60,7 +62,9 @@ class ReleasesGenerator(iocage.ListableResource.ListableResource):
             namespace="releases",
             filters=filters,
             zfs=zfs,
-            logger=logger
+            logger=logger,
+            workers=workers,
+            prefetch=prefetch
         )
 
     @property
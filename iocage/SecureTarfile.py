@@ -24,10 +24,15 @@
 # POSSIBILITY OF SUCH DAMAGE.
 """Secure tarfile wrapper that prevents extraction of insecure paths."""
 import typing
+import os
 import tarfile
+import threading
 
 import iocage.errors
 
+_destination_locks: typing.Dict[str, 'threading.RLock'] = {}
+_destination_locks_lock = threading.Lock()
+
 
 class SecureTarfile:
     """Secure tarfile wrapper that mitigates extraction of unsafe paths."""
@@ -77,6 +82,42 @@ class SecureTarfile:
             tar.extractall(destination)
             self._log(f"{self.file} was extracted to {destination}")
 
+    def extract_stream(
+        self,
+        fileobj: typing.BinaryIO,
+        destination: str
+    ) -> None:
+        """
+        Extract a tar stream while it is read.
+
+        Unlike extract, the members are not verified upfront, because the
+        archive is read only once. Each member is checked before it gets
+        written, so that no unsafe path is extracted. Streams extracted to
+        the same destination wait for each other, because their archives
+        may share directories and hardlinks.
+
+        Args:
+
+            fileobj (file):
+
+                A readable file object providing the archive data, for
+                example a download stream.
+
+            destination (str):
+
+                Path to the extraction destination folder.
+        """
+        mode = self.mode.replace(":", "|")
+        if "|" not in mode:
+            mode += "|*"
+        with get_destination_lock(destination):
+            self._log(f"Extracting stream of {self.file}")
+            with tarfile.open(fileobj=fileobj, mode=mode) as tar:
+                for tar_info in tar:
+                    self._check_tar_info(tar_info)
+                    tar.extract(tar_info, destination)
+        self._log(f"{self.file} was extracted to {destination}")
+
     def _check_tar_members(
         self,
         tar_infos: typing.List[typing.Any]
@@ -101,6 +142,15 @@ class SecureTarfile:
         )
 
 
+def get_destination_lock(destination: str) -> 'threading.RLock':
+    """Return the lock held while extracting into a destination folder."""
+    key = os.path.realpath(destination)
+    with _destination_locks_lock:
+        if key not in _destination_locks:
+            _destination_locks[key] = threading.RLock()
+        return _destination_locks[key]
+
+
 def extract(
     file: str,
     destination: str,
@@ -126,3 +176,44 @@ def extract(
     """
     secure_tarfile = SecureTarfile(file, logger=logger)
     secure_tarfile.extract(destination)
+
+
+def extract_stream(
+    fileobj: typing.BinaryIO,
+    destination: str,
+    name: str,
+    compression_format: typing.Optional[str]=None,
+    logger: typing.Optional['iocage.Logger.Logger']=None
+) -> None:
+    """
+    Instantiate SecureTarfile and extract an archive stream while reading.
+
+    Args:
+
+        fileobj (file):
+
+            Readable file object of the source archive.
+
+        destination (str):
+
+            Path to the extraction destination folder.
+
+        name (str):
+
+            The name of the archive used in log messages and errors.
+
+        compression_format (str):
+
+            The compression of the archive stream, for example "xz".
+            Detected automatically when omitted.
+
+        logger (iocage.Logger.Logger):
+
+            Logging is enabled when a Logger instance is provided.
+    """
+    secure_tarfile = SecureTarfile(
+        name,
+        compression_format=compression_format,
+        logger=logger
+    )
+    secure_tarfile.extract_stream(fileobj, destination)
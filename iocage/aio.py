@@ -0,0 +1,309 @@
+# Copyright (c) 2014-2018, iocage
+# Copyright (c) 2017-2018, Stefan Grönke
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted providing that the following conditions
+# are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+# IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+"""asyncio interface of jails, releases and commands."""
+import typing
+import asyncio
+import concurrent.futures
+
+import iocage.errors
+import iocage.helpers
+import iocage.helpers_object
+
+# MyPy
+import iocage.events
+import iocage.Jail
+import iocage.Logger
+import iocage.Release
+
+EventGenerator = typing.Generator['iocage.events.IocageEvent', None, None]
+AsyncEventIterator = typing.AsyncIterator['iocage.events.IocageEvent']
+OutputCallback = typing.Callable[[bytes], None]
+
+_END = object()
+
+
+async def exec(
+    command: typing.List[str],
+    logger: typing.Optional['iocage.Logger.Logger']=None,
+    ignore_error: bool=False,
+    env: typing.Optional[typing.Dict[str, str]]=None,
+    output_callback: typing.Optional[OutputCallback]=None
+) -> iocage.helpers.CommandOutput:
+    """
+    Execute a command without blocking the event loop.
+
+    Like iocage.helpers.exec a CommandFailure is raised when the command
+    exited with a non-zero status unless errors are ignored.
+
+    Args:
+
+        output_callback (function): (optional)
+            Receives each line of the standard output when it was read. The
+            standard error output is merged with the standard output then.
+    """
+    if isinstance(command, str):
+        command = [command]
+
+    command_str = " ".join(command)
+    if logger is not None:
+        logger.log(f"Executing: {command_str}", level="spam")
+
+    stderr = asyncio.subprocess.PIPE
+    if output_callback is not None:
+        stderr = asyncio.subprocess.STDOUT
+
+    child = await asyncio.create_subprocess_exec(
+        *command,
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=stderr,
+        env=env
+    )
+
+    if output_callback is None:
+        stdout_data, stderr_data = await child.communicate()
+    else:
+        lines = []
+        while True:
+            line = await child.stdout.readline()
+            if len(line) == 0:
+                break
+            lines.append(line)
+            output_callback(line.rstrip(b"\n"))
+        stdout_data, stderr_data = b"".join(lines), None
+    returncode = await child.wait()
+
+    stdout = stdout_data.decode("UTF-8").strip()
+    _stderr = None if (stderr_data is None) else (
+        stderr_data.decode("UTF-8").strip()
+    )
+
+    if returncode > 0:
+        if logger is not None:
+            log_level = "spam" if ignore_error else "warn"
+            logger.log(
+                f"Command exited with {returncode}: {command_str}",
+                level=log_level
+            )
+            if _stderr:
+                logger.log(_stderr, level=log_level)
+
+        if ignore_error is False:
+            raise iocage.errors.CommandFailure(
+                returncode=returncode,
+                logger=logger
+            )
+
+    return stdout, _stderr, returncode
+
+
+async def iterate(
+    events: EventGenerator,
+    executor: typing.Optional[concurrent.futures.Executor]=None
+) -> AsyncEventIterator:
+    """
+    Iterate the events of a libiocage operation asynchronously.
+
+    The operation advances from one event to the next in the executor of
+    the event loop, while the event loop continues to serve other tasks.
+    Errors and the rollback of failed steps are handled by the operation
+    like in synchronous use. When the iteration is stopped early, the
+    operation is closed.
+    """
+    loop = asyncio.get_event_loop()
+    try:
+        while True:
+            event = await loop.run_in_executor(executor, next, events, _END)
+            if event is _END:
+                return
+            yield event
+    finally:
+        await loop.run_in_executor(executor, events.close)
+
+
+async def complete(
+    events: AsyncEventIterator
+) -> typing.List['iocage.events.IocageEvent']:
+    """Wait for an asynchronous operation and return all of its events."""
+    return [event async for event in events]
+
+
+class AsyncJail:
+    """
+    asyncio interface of a jail.
+
+    The lifecycle operations yield the same events as the JailGenerator,
+    whereas commands in the jail are executed without any thread. Other
+    attributes are read from the wrapped JailGenerator.
+
+    Example:
+
+        jail = iocage.aio.AsyncJail("myjail")
+        async for event in jail.start():
+            print(event)
+        stdout, _, returncode = await jail.exec(["hostname"])
+    """
+
+    jail: 'iocage.Jail.JailGenerator'
+    executor: typing.Optional[concurrent.futures.Executor]
+
+    def __init__(
+        self,
+        jail: typing.Union['iocage.Jail.JailGenerator', str, typing.Dict],
+        executor: typing.Optional[concurrent.futures.Executor]=None,
+        **kwargs: typing.Any
+    ) -> None:
+        """
+        Initialize an asynchronous jail.
+
+        Args:
+
+            jail (JailGenerator, str or dict):
+                An existing jail or the data a JailGenerator is initialized
+                with together with the other keyword arguments.
+
+            executor (concurrent.futures.Executor): (optional)
+                The executor the lifecycle operations advance in. Defaults to
+                the executor of the event loop.
+        """
+        if isinstance(jail, iocage.Jail.JailGenerator) is False:
+            jail = iocage.Jail.JailGenerator(jail, **kwargs)
+        self.jail = jail
+        self.executor = executor
+
+    def __getattr__(self, key: str) -> typing.Any:
+        """Get an attribute of the wrapped jail."""
+        return getattr(self.jail, key)
+
+    def _iterate(self, events: EventGenerator) -> AsyncEventIterator:
+        return iterate(events, executor=self.executor)
+
+    def start(self, **kwargs: typing.Any) -> AsyncEventIterator:
+        """Start the jail."""
+        return self._iterate(self.jail.start(**kwargs))
+
+    def stop(self, **kwargs: typing.Any) -> AsyncEventIterator:
+        """Stop the jail."""
+        return self._iterate(self.jail.stop(**kwargs))
+
+    def restart(self, **kwargs: typing.Any) -> AsyncEventIterator:
+        """Restart the jail."""
+        return self._iterate(self.jail.restart(**kwargs))
+
+    def destroy(self, **kwargs: typing.Any) -> AsyncEventIterator:
+        """Destroy the jail and its datasets."""
+        return self._iterate(self.jail.destroy(**kwargs))
+
+    def update(self, **kwargs: typing.Any) -> AsyncEventIterator:
+        """Apply the fetched release updates to the jail."""
+        return self._iterate(self.jail.updater.apply(**kwargs))
+
+    def export(
+        self,
+        destination: str,
+        **kwargs: typing.Any
+    ) -> AsyncEventIterator:
+        """Export the jail to a backup archive."""
+        return self._iterate(self.jail.backup.export(destination, **kwargs))
+
+    async def exec(
+        self,
+        command: typing.List[str],
+        env: typing.Dict[str, str]={},
+        output_callback: typing.Optional[OutputCallback]=None
+    ) -> iocage.helpers.CommandOutput:
+        """
+        Execute a command in the running jail.
+
+        Unlike JailGenerator.exec a CommandFailure is not raised when the
+        command exited with a non-zero status.
+        """
+        command_env = self.jail.env
+        for env_key, env_value in env.items():
+            command_env[env_key] = env_value
+
+        output: iocage.helpers.CommandOutput = await exec(
+            ["/usr/sbin/jexec", str(self.jail.jid)] + command,
+            logger=self.jail.logger,
+            ignore_error=True,
+            env=command_env,
+            output_callback=output_callback
+        )
+        return output
+
+
+class AsyncRelease:
+    """asyncio interface of a release."""
+
+    release: 'iocage.Release.ReleaseGenerator'
+    executor: typing.Optional[concurrent.futures.Executor]
+
+    def __init__(
+        self,
+        release: typing.Union['iocage.Release.ReleaseGenerator', str],
+        executor: typing.Optional[concurrent.futures.Executor]=None,
+        **kwargs: typing.Any
+    ) -> None:
+        """
+        Initialize an asynchronous release.
+
+        Args:
+
+            release (ReleaseGenerator or str):
+                An existing release or the name of the release a
+                ReleaseGenerator is initialized with together with the other
+                keyword arguments.
+
+            executor (concurrent.futures.Executor): (optional)
+                The executor the operations advance in. Defaults to the
+                executor of the event loop.
+        """
+        if isinstance(release, iocage.Release.ReleaseGenerator) is False:
+            release = iocage.Release.ReleaseGenerator(name=release, **kwargs)
+        self.release = release
+        self.executor = executor
+
+    def __getattr__(self, key: str) -> typing.Any:
+        """Get an attribute of the wrapped release."""
+        return getattr(self.release, key)
+
+    def _iterate(self, events: EventGenerator) -> AsyncEventIterator:
+        return iterate(events, executor=self.executor)
+
+    def fetch(self, **kwargs: typing.Any) -> AsyncEventIterator:
+        """Fetch the release from the remote."""
+        return self._iterate(self.release.fetch(**kwargs))
+
+    def update(self, **kwargs: typing.Any) -> AsyncEventIterator:
+        """Fetch and apply the updates of the release."""
+        return self._iterate(self._update(**kwargs))
+
+    def _update(self, **kwargs: typing.Any) -> EventGenerator:
+        yield from self.release.updater.fetch(**kwargs)
+        yield from self.release.updater.apply(**kwargs)
+
+    def destroy(self, **kwargs: typing.Any) -> AsyncEventIterator:
+        """Delete the release."""
+        return self._iterate(self.release.destroy(**kwargs))
@@ -223,6 +223,25 @@ class JailLaunchFailed(JailException):
         JailException.__init__(self, message=msg, jail=jail, logger=logger)
 
 
+class JailDependencyFailed(JailException):
+    """Raised when a jail is skipped because a jail it depends on failed."""
+
+    dependency: 'iocage.Jail.JailGenerator'
+
+    def __init__(
+        self,
+        jail: 'iocage.Jail.JailGenerator',
+        dependency: 'iocage.Jail.JailGenerator',
+        logger: typing.Optional['iocage.Logger.Logger']=None
+    ) -> None:
+        self.dependency = dependency
+        msg = (
+            f"Jail {jail.full_name} was skipped because "
+            f"{dependency.full_name} failed"
+        )
+        JailException.__init__(self, message=msg, jail=jail, logger=logger)
+
+
 class JailDestructionFailed(JailException):
     """Raised when the jail could not be destroyed."""
 
@@ -237,6 +256,30 @@ class JailDestructionFailed(JailException):
         JailException.__init__(self, message=msg, jail=jail, logger=logger)
 
 
+class JailProcessesNotStopped(JailException):
+    """Raised when processes of a jail remain after they were killed."""
+
+    def __init__(
+        self,
+        jail: 'iocage.Jail.JailGenerator',
+        logger: typing.Optional['iocage.Logger.Logger']=None
+    ) -> None:
+        msg = f"The processes of jail {jail.full_name} did not stop"
+        JailException.__init__(self, message=msg, jail=jail, logger=logger)
+
+
+class JailStopNotAborted(JailException):
+    """Raised when a graceful jail stop does not end after it was aborted."""
+
+    def __init__(
+        self,
+        jail: 'iocage.Jail.JailGenerator',
+        logger: typing.Optional['iocage.Logger.Logger']=None
+    ) -> None:
+        msg = f"Aborting the graceful stop of jail {jail.full_name} failed"
+        JailException.__init__(self, message=msg, jail=jail, logger=logger)
+
+
 class JailCommandFailed(IocageException):
     """Raised when a jail command fails with an exit code > 0."""
 
@@ -278,6 +321,22 @@ class JailStateUpdateFailed(IocageException):
         IocageException.__init__(self, message=msg, logger=logger)
 
 
+# Jail Pool
+
+
+class InvalidJailPoolConfig(IocageException, ValueError):
+    """Raised when a jail pool configuration value is invalid."""
+
+    def __init__(
+        self,
+        pool_name: str,
+        reason: str,
+        logger: typing.Optional['iocage.Logger.Logger']=None
+    ) -> None:
+        msg = f"Invalid configuration of jail pool {pool_name}: {reason}"
+        IocageException.__init__(self, message=msg, logger=logger)
+
+
 # Jail Fstab
 
 
@@ -1053,6 +1112,39 @@ class ReleaseAssetHashesUnavailable(IocageException):
         super().__init__(message=msg, logger=logger)
 
 
+class DownloadFailed(IocageException):
+    """Raised when a file could not be downloaded from a mirror."""
+
+    def __init__(
+        self,
+        url: str,
+        reason: typing.Optional[str]=None,
+        logger: typing.Optional['iocage.Logger.Logger']=None
+    ) -> None:
+
+        msg = f"Download of {url} failed"
+        if reason is not None:
+            msg += f": {reason}"
+        super().__init__(message=msg, logger=logger)
+
+
+class ReleaseAssetNotCached(IocageException):
+    """Raised when an asset is not cached while fetching offline."""
+
+    def __init__(
+        self,
+        release_name: str,
+        asset_name: str,
+        logger: typing.Optional['iocage.Logger.Logger']=None
+    ) -> None:
+
+        msg = (
+            f"Asset {asset_name} of release '{release_name}' "
+            "is not in the asset cache"
+        )
+        super().__init__(message=msg, logger=logger)
+
+
 class UpdateFailure(IocageException):
     """Raised when an update fails."""
 
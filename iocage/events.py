@@ -196,6 +196,22 @@ class IocageEvent:
         self._pending = new_state
         self.scope.PENDING_COUNT += 1 if (state is True) else -1
 
+    @property
+    def started_at(self) -> typing.Optional[float]:
+        """Return the timer value when the event began."""
+        try:
+            return self._started_at
+        except AttributeError:
+            return None
+
+    @property
+    def stopped_at(self) -> typing.Optional[float]:
+        """Return the timer value when the event finished."""
+        try:
+            return self._stopped_at
+        except AttributeError:
+            return None
+
     @property
     def duration(self) -> typing.Optional[float]:
         """Return the duration of finished events."""
@@ -433,9 +449,52 @@ class ReleasePrepareStorage(FetchRelease):
 
 
 class ReleaseDownload(FetchRelease):
-    """Download release assets."""
+    """
+    Download release assets.
 
-    pass
+    When an asset name is given, the event reflects the download progress
+    of this single asset.
+    """
+
+    asset: typing.Optional[str]
+    received: int
+    total: typing.Optional[int]
+
+    def __init__(
+        self,
+        release: 'iocage.Release.ReleaseGenerator',
+        asset: typing.Optional[str]=None,
+        message: typing.Optional[str]=None,
+        scope: typing.Optional[Scope]=None
+    ) -> None:
+
+        self.asset = asset
+        self.received = 0
+        self.total = None
+        FetchRelease.__init__(
+            self,
+            release=release,
+            message=message,
+            scope=scope
+        )
+        if asset is not None:
+            self.identifier = f"{release.full_name}/{asset}"
+
+    def progress(
+        self,
+        received: int,
+        total: typing.Optional[int]=None
+    ) -> 'IocageEvent':
+        """Reflect the number of downloaded bytes."""
+        self.received = received
+        self.total = total
+        received_mib = received / 1024 / 1024
+        if total is None:
+            message = f"{received_mib:.1f} MiB"
+        else:
+            total_mib = total / 1024 / 1024
+            message = f"{received_mib:.1f}/{total_mib:.1f} MiB"
+        return self.step(message)
 
 
 class ReleaseExtraction(FetchRelease):
@@ -24,14 +24,20 @@
 # POSSIBILITY OF SUCH DAMAGE.
 """Collection of iocage helper functions."""
 import typing
+import concurrent.futures
+import hashlib
 import json
+import mmap
 import os
 import random
 import re
+import shutil
+import stat
 import subprocess  # nosec: B404
 import sys
 import pty
 import select
+import tempfile
 
 import iocage.errors
 import iocage.Logger
@@ -40,6 +46,9 @@ import iocage.Logger
 import iocage.Types
 CommandOutput = typing.Tuple[typing.Optional[str], typing.Optional[str], int]
 
+# content hashes of files written by write_file, keyed by their path
+_written_file_hashes: typing.Dict[str, typing.Tuple[int, int, str]] = {}
+
 
 def get_os_version(
     version_file: str="/bin/freebsd-version"
@@ -400,6 +409,13 @@ def to_string(
     return str(parsed_data)
 
 
+# the number of bytes read from a command output at once
+EXEC_READ_SIZE = 65536
+
+# seconds between checks whether a command exited while its output is quiet
+EXEC_EXIT_POLL_INTERVAL = 0.5
+
+
 def exec_generator(
     command: typing.List[str],
     buffer_lines: bool=True,
@@ -409,13 +425,26 @@ def exec_generator(
     stdin: typing.Optional[typing.Union[typing.TextIO, int]]=None,
     stdout: typing.Optional[typing.TextIO]=None,
     env: typing.Optional[typing.Dict[str, typing.Any]]=None,
-    logger: typing.Optional['iocage.Logger.Logger']=None
+    logger: typing.Optional['iocage.Logger.Logger']=None,
+    max_summary_size: typing.Optional[int]=None
 ) -> typing.Generator[
     bytes,
     None,
     CommandOutput
 ]:
-    """Execute a command in an interactive shell."""
+    """
+    Execute a command in an interactive shell.
+
+    The output is read whenever the pseudo terminal has data available, so
+    that waiting for long running commands does not consume CPU time.
+
+    Args:
+
+        max_summary_size (int): (optional)
+            Only keep the last number of bytes of the output for the
+            returned CommandOutput, so that commands with huge output are
+            summarized with bounded memory.
+    """
     if isinstance(command, str):
         command = [command]
 
@@ -424,13 +453,14 @@ def exec_generator(
     if logger is not None:
         logger.spam(f"Executing (interactive): {command_str}")
 
-    controller_pts, delegate_pts = pty.openpty()
+    controller_pts, _delegate_pts = pty.openpty()
+    delegate_pts: typing.Optional[int] = _delegate_pts
 
     if stdin is None:
         stdin = delegate_pts
 
-    stdout_result = b""
-    stdout_line_buf = b""
+    stdout_result = bytearray()
+    stdout_line_buf = bytearray()
     try:
         child = subprocess.Popen(  # nosec: TODO: #113
             command,
@@ -442,40 +472,79 @@ def exec_generator(
             universal_newlines=universal_newlines,
             env=env
         )
-        while child.poll() is None:
-            read, _, _ = select.select([controller_pts], [], [], 0)
-            if read:
-                stdout_chunk = os.read(controller_pts, 512)
-
-                if summarize is True:
-                    stdout_result += stdout_chunk
-
-                # pipe to stdout if it was set
-                if stdout is not None:
-                    stdout.write(stdout_chunk.decode("UTF-8"))
-
-                if buffer_lines is False:
-                    # unbuffered chunk output
-                    yield stdout_chunk
-                else:
-                    # line buffered output
-                    stdout_line_buf += stdout_chunk
-                    while b"\n" in stdout_line_buf:
-                        lines = stdout_line_buf.split(b"\n", maxsplit=1)
-                        stdout_line_buf = lines.pop()
-                        yield from lines
+        # only the child holds the terminal, so that reading it ends
+        # when the child and all processes it forked closed it
+        os.close(delegate_pts)
+        delegate_pts = None
+
+        exited = False
+        while True:
+            read, _, _ = select.select(
+                [controller_pts],
+                [],
+                [],
+                0 if exited else EXEC_EXIT_POLL_INTERVAL
+            )
+            if not read:
+                if exited is True:
+                    # drained while forked processes hold the terminal
+                    break
+                exited = (child.poll() is not None)
+                continue
+
+            try:
+                stdout_chunk = os.read(controller_pts, EXEC_READ_SIZE)
+            except OSError:
+                # EIO when the terminal was closed
+                break
+            if len(stdout_chunk) == 0:
+                break
+
+            if summarize is True:
+                stdout_result += stdout_chunk
+                if (max_summary_size is not None) and (
+                    len(stdout_result) > 2 * max_summary_size
+                ):
+                    del stdout_result[:len(stdout_result) - max_summary_size]
+
+            # pipe to stdout if it was set
+            if stdout is not None:
+                stdout.write(stdout_chunk.decode("UTF-8"))
+
+            if buffer_lines is False:
+                # unbuffered chunk output
+                yield stdout_chunk
+            elif b"\n" in stdout_chunk:
+                # line buffered output
+                stdout_line_buf += stdout_chunk
+                lines = stdout_line_buf.split(b"\n")
+                stdout_line_buf = lines.pop()
+                for line in lines:
+                    yield bytes(line)
+            else:
+                stdout_line_buf += stdout_chunk
+
+        child.wait()
 
     except KeyboardInterrupt:
         child.terminate()
         raise
     finally:
         os.close(controller_pts)
-        os.close(delegate_pts)
+        if delegate_pts is not None:
+            os.close(delegate_pts)
         # push last line when buffering lines
         if len(stdout_line_buf) > 0:
-            yield stdout_line_buf
-
-    _stdout = stdout_result.decode(encoding) if (summarize is True) else None
+            yield bytes(stdout_line_buf)
+
+    if summarize is True:
+        if (max_summary_size is not None) and (
+            len(stdout_result) > max_summary_size
+        ):
+            del stdout_result[:len(stdout_result) - max_summary_size]
+        _stdout = stdout_result.decode(encoding, errors="replace")
+    else:
+        _stdout = None
     return _stdout, None, child.returncode
 
 
@@ -622,3 +691,167 @@ def makedirs_safe(
     if logger is not None:
         logger.verbose(f"Safely creating {target} directory")
     os.makedirs(target, mode=mode, exist_ok=True)
+
+
+# Files of at least this size are hashed through a memory map
+HASH_MMAP_THRESHOLD = 1024 * 1024
+
+# The number of bytes passed to the hash function at once
+HASH_CHUNK_SIZE = 64 * 1024 * 1024
+
+
+def hash_file(path: str, algorithm: str="sha256") -> str:
+    """
+    Return the hex digest of a file.
+
+    Large files are memory-mapped and passed to hashlib in large slices, so
+    that the hashing runs in C without the GIL instead of a Python loop over
+    small reads. Hashing multiple files in threads therefore runs in
+    parallel.
+    """
+    _hash = hashlib.new(algorithm)
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < HASH_MMAP_THRESHOLD:
+            _hash.update(f.read())
+            return str(_hash.hexdigest())
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            if hasattr(mapped, "madvise"):
+                mapped.madvise(mmap.MADV_SEQUENTIAL)
+            view = memoryview(mapped)
+            try:
+                for offset in range(0, size, HASH_CHUNK_SIZE):
+                    _hash.update(view[offset:offset + HASH_CHUNK_SIZE])
+            finally:
+                view.release()
+    return str(_hash.hexdigest())
+
+
+def hash_files(
+    paths: typing.Iterable[str],
+    algorithm: str="sha256",
+    workers: typing.Optional[int]=None
+) -> typing.Dict[str, str]:
+    """
+    Return the hex digests of multiple files hashed concurrently.
+
+    Args:
+
+        workers (int): (optional)
+            The number of threads hashing files at the same time. Defaults
+            to the number of CPUs.
+    """
+    _paths = list(paths)
+    if len(_paths) < 2:
+        return {path: hash_file(path, algorithm) for path in _paths}
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(_paths)))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        digests = pool.map(lambda path: hash_file(path, algorithm), _paths)
+        return dict(zip(_paths, digests))
+
+
+def _hash_content(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+def file_has_content(path: str, content: str) -> bool:
+    """
+    Return True if the file at the given path has exactly this content.
+
+    Files previously written by write_file are identified by their size and
+    modification time, so that their content does not need to be read.
+    """
+    try:
+        file_stat = os.stat(path)
+    except OSError:
+        return False
+
+    data = content.encode("UTF-8")
+    if file_stat.st_size != len(data):
+        return False
+
+    content_hash = _hash_content(data)
+    cached = _written_file_hashes.get(path, None)
+    if cached is not None:
+        if cached[0:2] == (file_stat.st_mtime_ns, file_stat.st_size):
+            return (cached[2] == content_hash)
+
+    try:
+        with open(path, "rb") as f:
+            return (_hash_content(f.read()) == content_hash)
+    except OSError:
+        return False
+
+
+def write_file(
+    path: str,
+    content: str,
+    mode: typing.Optional[int]=None,
+    user: typing.Optional[str]=None,
+    group: typing.Optional[str]=None
+) -> bool:
+    """
+    Atomically write a file unless it already has the given content.
+
+    The content is written to a temporary file in the same directory that
+    replaces the target file, so that readers never observe partial writes.
+    Unless specified, the mode and ownership of an existing file are kept.
+
+    Returns True when the file was written.
+
+    Args:
+
+        mode (int): (optional)
+            The file mode. Defaults to the mode of the existing file or 0o644.
+
+        user (str): (optional)
+            The name of the user that owns the file.
+
+        group (str): (optional)
+            The name of the group that owns the file.
+    """
+    if file_has_content(path, content) is True:
+        return False
+
+    try:
+        existing_stat: typing.Optional[os.stat_result] = os.stat(path)
+    except FileNotFoundError:
+        existing_stat = None
+
+    if mode is None:
+        if existing_stat is None:
+            mode = 0o644
+        else:
+            mode = stat.S_IMODE(existing_stat.st_mode)
+
+    data = content.encode("UTF-8")
+    fd, temporary_path = tempfile.mkstemp(
+        dir=os.path.dirname(path),
+        prefix=f".{os.path.basename(path)}."
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.chmod(temporary_path, mode)
+        if (user is not None) or (group is not None):
+            shutil.chown(temporary_path, user, group)
+        elif existing_stat is not None:
+            os.chown(
+                temporary_path,
+                existing_stat.st_uid,
+                existing_stat.st_gid
+            )
+        os.replace(temporary_path, path)
+    except BaseException:
+        os.unlink(temporary_path)
+        raise
+
+    file_stat = os.stat(path)
+    _written_file_hashes[path] = (
+        file_stat.st_mtime_ns,
+        file_stat.st_size,
+        _hash_content(data)
+    )
+    return True
@@ -23,6 +23,7 @@
 # IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 # POSSIBILITY OF SUCH DAMAGE.
 """Unit test configuration."""
+import os
 import typing
 import helper_functions
 import libzfs
@@ -43,6 +44,69 @@ import iocage.Release
 _force_clean = False
 
 
+class ResourceMock(object):
+    """Mock a resource that answers filter lookups from a dict."""
+
+    # number of constructed resources
+    instances = 0
+
+    def __init__(self, data: typing.Dict[str, typing.Any]) -> None:
+        ResourceMock.instances += 1
+        self.data = data
+
+    def get(self, key: str) -> typing.Any:
+        """Return the resource property or None."""
+        return self.data.get(key, None)
+
+
+class DatasetMock(object):
+    """Mock a ZFS dataset with a name, mountpoint and child datasets."""
+
+    def __init__(
+        self,
+        name: str,
+        mountpoint: typing.Optional[str]=None
+    ) -> None:
+        self.name = name
+        self.mountpoint = mountpoint
+        self.children: typing.List['DatasetMock'] = []
+
+
+class RootDatasetsMock(object):
+    """
+    Mock iocage.Datasets.RootDatasets.
+
+    When a path is given, the mountpoints of the datasets are created below
+    it, otherwise the datasets have no mountpoint.
+    """
+
+    def __init__(
+        self,
+        path: typing.Optional[str]=None,
+        name: str="zroot/iocage"
+    ) -> None:
+        self.root = DatasetMock(name, path)
+        self.jails = DatasetMock(
+            f"{name}/jails",
+            None if (path is None) else f"{path}/jails"
+        )
+        if self.jails.mountpoint is not None:
+            os.mkdir(self.jails.mountpoint)
+
+    def add_jail(self, name: str) -> DatasetMock:
+        """Create a jail dataset and its mountpoint."""
+        dataset = DatasetMock(
+            f"{self.jails.name}/{name}",
+            None if (self.jails.mountpoint is None) else (
+                f"{self.jails.mountpoint}/{name}"
+            )
+        )
+        if dataset.mountpoint is not None:
+            os.mkdir(dataset.mountpoint)
+        self.jails.children.append(dataset)
+        return dataset
+
+
 def pytest_addoption(parser: typing.Any) -> None:
     """Add force option to pytest."""
     parser.addoption(
@@ -55,6 +119,39 @@ def pytest_addoption(parser: typing.Any) -> None:
         action="store",
         help="Select a ZFS pool for the unit tests"
     )
+    parser.addoption(
+        "--hash-benchmark-size",
+        action="store",
+        type=int,
+        default=8,
+        help="Size in MiB of each file generated for the hashing benchmark"
+    )
+    parser.addoption(
+        "--benchmark",
+        action="store_true",
+        help="Run the microbenchmarks comparing wall-clock durations"
+    )
+
+
+def pytest_configure(config: typing.Any) -> None:
+    """Register the benchmark marker."""
+    config.addinivalue_line(
+        "markers",
+        "benchmark: microbenchmark only run with the --benchmark option"
+    )
+
+
+def pytest_collection_modifyitems(
+    config: typing.Any,
+    items: typing.List[typing.Any]
+) -> None:
+    """Skip microbenchmarks unless the --benchmark option was passed."""
+    if config.getoption("benchmark") is True:
+        return
+    skip_benchmark = pytest.mark.skip(reason="requires --benchmark")
+    for item in items:
+        if item.get_closest_marker("benchmark") is not None:
+            item.add_marker(skip_benchmark)
 
 
 def pytest_generate_tests(metafunc: typing.Any) -> None:
@@ -68,6 +165,12 @@ def force_clean() -> bool:
     return _force_clean
 
 
+@pytest.fixture
+def hash_benchmark_size(request: typing.Any) -> int:
+    """Return the size in bytes of files in the hashing benchmark."""
+    return int(request.config.getoption("hash_benchmark_size")) * 1024 * 1024
+
+
 @pytest.fixture
 def zfs() -> libzfs.ZFS:
     """Make ZFS available to the tests."""
@@ -112,6 +215,19 @@ def logger() -> 'iocage.Logger.Logger':
     return iocage.Logger.Logger()
 
 
+@pytest.fixture
+def resource_mock() -> typing.Type[ResourceMock]:
+    """Return the resource mock with a reset instance counter."""
+    ResourceMock.instances = 0
+    return ResourceMock
+
+
+@pytest.fixture
+def root_datasets(tmpdir: typing.Any) -> RootDatasetsMock:
+    """Return mocked root datasets mounted in a temporary directory."""
+    return RootDatasetsMock(str(tmpdir))
+
+
 @pytest.fixture
 def root_dataset(
     force_clean: bool,
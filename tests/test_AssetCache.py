@@ -0,0 +1,162 @@
+# Copyright (c) 2014-2018, iocage
+# Copyright (c) 2017-2018, Stefan Grönke
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted providing that the following conditions
+# are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+# IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+"""Unit tests for the content-addressed release asset cache."""
+import hashlib
+import os
+import typing
+
+import iocage.AssetCache
+
+
+def _create_asset(directory: str, name: str, size: int) -> typing.Tuple[
+    str,
+    str
+]:
+    """Write an asset with random content and return its path and hash."""
+    data = os.urandom(size)
+    path = os.path.join(directory, name)
+    with open(path, "wb") as f:
+        f.write(data)
+    return path, hashlib.sha256(data).hexdigest()
+
+
+class TestAssetCache(object):
+    """Run AssetCache unit tests."""
+
+    def test_asset_is_shared_between_download_directories(
+        self,
+        tmpdir: typing.Any,
+        logger: 'iocage.Logger.Logger'
+    ) -> None:
+        """Test that a cached asset is linked into another directory."""
+        cache = iocage.AssetCache.AssetCache(
+            directory=str(tmpdir.mkdir("cache")),
+            logger=logger
+        )
+        first = str(tmpdir.mkdir("first"))
+        second = str(tmpdir.mkdir("second"))
+        path, digest = _create_asset(first, "base.txz", 1024)
+
+        assert digest not in cache
+        assert cache.get(digest, os.path.join(second, "base.txz")) is False
+
+        cache.put(digest, path)
+        assert digest in cache
+        assert cache.get(digest, os.path.join(second, "base.txz")) is True
+
+        restored = os.path.join(second, "base.txz")
+        assert os.stat(restored).st_ino == os.stat(path).st_ino
+        with open(restored, "rb") as a, open(path, "rb") as b:
+            assert a.read() == b.read()
+
+    def test_least_recently_used_assets_are_evicted(
+        self,
+        tmpdir: typing.Any,
+        logger: 'iocage.Logger.Logger'
+    ) -> None:
+        """Test that the cache size is capped by evicting old entries."""
+        cache = iocage.AssetCache.AssetCache(
+            directory=str(tmpdir.mkdir("cache")),
+            max_size=3000,
+            logger=logger
+        )
+        downloads = str(tmpdir.mkdir("downloads"))
+
+        digests = []
+        for i, name in enumerate(["base", "lib32", "src"]):
+            path, digest = _create_asset(downloads, f"{name}.txz", 1000)
+            cache.put(digest, path)
+            os.remove(path)
+            os.utime(cache.get_asset_path(digest), (i, i))
+            digests.append(digest)
+
+        # base is used again and lib32 becomes the least recently used
+        assert cache.get(digests[0], os.path.join(downloads, "x")) is True
+        os.remove(os.path.join(downloads, "x"))
+        path, digest = _create_asset(downloads, "ports.txz", 1000)
+        cache.put(digest, path)
+        os.remove(path)
+        cache.evict()
+
+        assert cache.size == 3000
+        assert digests[0] in cache
+        assert digests[1] not in cache
+        assert digests[2] in cache
+        assert digest in cache
+
+    def test_hardlinked_assets_are_not_evicted(
+        self,
+        tmpdir: typing.Any,
+        logger: 'iocage.Logger.Logger'
+    ) -> None:
+        """Test that assets linked into download directories are kept."""
+        cache = iocage.AssetCache.AssetCache(
+            directory=str(tmpdir.mkdir("cache")),
+            max_size=1000,
+            logger=logger
+        )
+        kept = str(tmpdir.mkdir("kept"))
+        downloads = str(tmpdir.mkdir("downloads"))
+
+        kept_path, kept_digest = _create_asset(kept, "base.txz", 1000)
+        cache.put(kept_digest, kept_path)
+        os.utime(cache.get_asset_path(kept_digest), (0, 0))
+        path, digest = _create_asset(downloads, "lib32.txz", 1000)
+        cache.put(digest, path)
+        os.remove(path)
+
+        # removing the kept asset from the cache would free no space
+        assert cache.size == 1000
+        assert cache.evict(max_size=0) == 1000
+        assert kept_digest in cache
+        assert digest not in cache
+
+        os.remove(kept_path)
+        assert cache.size == 1000
+        assert cache.evict(max_size=0) == 1000
+        assert kept_digest not in cache
+
+    def test_named_files_are_cached(
+        self,
+        tmpdir: typing.Any,
+        logger: 'iocage.Logger.Logger'
+    ) -> None:
+        """Test that hash files are cached by their name."""
+        cache = iocage.AssetCache.AssetCache(
+            directory=str(tmpdir.mkdir("cache")),
+            logger=logger
+        )
+        downloads = str(tmpdir.mkdir("downloads"))
+        path, _ = _create_asset(downloads, "MANIFEST", 64)
+        name = "FreeBSD/12.0-RELEASE/MANIFEST"
+
+        cache.put_file(name, path)
+        os.remove(path)
+
+        assert cache.get_file(name, path) is True
+        assert cache.get_file("FreeBSD/11.2-RELEASE/MANIFEST", path) is False
+        assert cache.get_file_path("../../etc/passwd").startswith(
+            cache.directory
+        )
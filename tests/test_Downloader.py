@@ -0,0 +1,432 @@
+# Copyright (c) 2014-2018, iocage
+# Copyright (c) 2017-2018, Stefan Grönke
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted providing that the following conditions
+# are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+# IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+"""Unit tests for parallel and resumable downloads."""
+import http.server
+import hashlib
+import io
+import os
+import socketserver
+import tarfile
+import threading
+import time
+import typing
+
+import pytest
+
+import iocage.Downloader
+import iocage.SecureTarfile
+import iocage.errors
+
+
+def _create_tarball(name: str, size: int) -> bytes:
+    """Create an xz compressed tarball with a random file of a size."""
+    data = io.BytesIO()
+    with tarfile.open(fileobj=data, mode="w:xz") as tar:
+        info = tarfile.TarInfo(f"./{name}")
+        info.size = size
+        tar.addfile(info, io.BytesIO(os.urandom(size)))
+    return data.getvalue()
+
+
+class FixtureRequestHandler(http.server.BaseHTTPRequestHandler):
+    """Serve fixture tarballs with Range support and dropped transfers."""
+
+    protocol_version = "HTTP/1.1"
+    server: 'FixtureServer'
+
+    def setup(self) -> None:
+        """Count the accepted connections."""
+        self.server.count("connections")
+        http.server.BaseHTTPRequestHandler.setup(self)
+
+    def do_GET(self) -> None:
+        """Serve the requested fixture or a part of it."""
+        name = self.path.lstrip("/")
+        if name not in self.server.files:
+            self.send_error(404)
+            return
+        data = self.server.files[name]
+
+        start = 0
+        range_header = self.headers.get("Range", None)
+        if (range_header is not None) and (self.server.ignore_range is False):
+            self.server.count("ranges")
+            start = int(range_header.split("=")[1].split("-")[0])
+            if start >= len(data):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(data)}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header(
+                "Content-Range",
+                f"bytes {start}-{len(data) - 1}/{len(data)}"
+            )
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(data) - start))
+        self.end_headers()
+
+        body = data[start:]
+        if self.server.take_drop(name) is True:
+            # drop the connection in the middle of the transfer
+            self.wfile.write(body[:len(body) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+    def log_message(self, *args: typing.Any) -> None:
+        """Do not log requests."""
+        pass
+
+
+class FixtureServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    """Local HTTP server with fixture files and request counters."""
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        files: typing.Dict[str, bytes],
+        drops: typing.Optional[typing.Dict[str, int]]=None,
+        ignore_range: bool=False
+    ) -> None:
+        self.files = files
+        self.drops = dict() if (drops is None) else dict(drops)
+        self.ignore_range = ignore_range
+        self.counters: typing.Dict[str, int] = {}
+        self.lock = threading.Lock()
+        http.server.HTTPServer.__init__(
+            self,
+            ("127.0.0.1", 0),
+            FixtureRequestHandler
+        )
+        self.thread = threading.Thread(target=self.serve_forever)
+        self.thread.start()
+
+    @property
+    def url(self) -> str:
+        """Return the base URL of the server."""
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def count(self, name: str) -> None:
+        """Increase a counter."""
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + 1
+
+    def take_drop(self, name: str) -> bool:
+        """Return True when the transfer of a file should be dropped."""
+        with self.lock:
+            if self.drops.get(name, 0) > 0:
+                self.drops[name] -= 1
+                return True
+            return False
+
+    def stop(self) -> None:
+        """Stop serving."""
+        self.shutdown()
+        self.server_close()
+        self.thread.join()
+
+
+class TestDownloader(object):
+    """Run Downloader unit tests against a local HTTP server."""
+
+    assets = ["base", "lib32", "src"]
+
+    @pytest.fixture
+    def fixtures(self) -> typing.Dict[str, bytes]:
+        """Return fixture tarballs by their file name."""
+        return {
+            f"{asset}.txz": _create_tarball(f"{asset}.bin", 256 * 1024)
+            for asset in self.assets
+        }
+
+    def _download_all(
+        self,
+        downloader: iocage.Downloader.Downloader,
+        server: FixtureServer,
+        directory: str
+    ) -> typing.List[iocage.Downloader.DownloadStatus]:
+        files = {
+            f"{server.url}/{name}": os.path.join(directory, name)
+            for name in server.files
+        }
+        return list(downloader.download_all(files, interval=0))
+
+    def test_parallel_downloads_resume_dropped_transfers(
+        self,
+        fixtures: typing.Dict[str, bytes],
+        tmpdir: typing.Any,
+        logger: 'iocage.Logger.Logger'
+    ) -> None:
+        """Test that connections dropped mid-transfer are resumed."""
+        server = FixtureServer(fixtures, drops={"base.txz": 2, "src.txz": 1})
+        try:
+            downloader = iocage.Downloader.Downloader(workers=3, logger=logger)
+            statuses = self._download_all(downloader, server, str(tmpdir))
+            downloader.pool.close()
+        finally:
+            server.stop()
+
+        for name, data in fixtures.items():
+            with open(os.path.join(str(tmpdir), name), "rb") as f:
+                assert f.read() == data
+            assert os.path.exists(os.path.join(str(tmpdir), f"{name}.part")) \
+                is False
+
+        done = [status for status in statuses if status.done is True]
+        assert len(done) == len(fixtures)
+        assert all(status.received == status.total for status in done)
+        assert server.counters["ranges"] == 3
+
+    def test_partial_file_is_resumed_with_range_request(
+        self,
+        fixtures: typing.Dict[str, bytes],
+        tmpdir: typing.Any,
+        logger: 'iocage.Logger.Logger'
+    ) -> None:
+        """Test that a partial file from an earlier fetch is continued."""
+        data = fixtures["base.txz"]
+        path = os.path.join(str(tmpdir), "base.txz")
+        with open(f"{path}.part", "wb") as f:
+            f.write(data[:1000])
+
+        server = FixtureServer({"base.txz": data})
+        received = []
+        try:
+            downloader = iocage.Downloader.Downloader(logger=logger)
+            downloader.download(
+                f"{server.url}/base.txz",
+                path,
+                progress=lambda url, done, total: received.append(done)
+            )
+        finally:
+            server.stop()
+
+        with open(path, "rb") as f:
+            assert f.read() == data
+        assert server.counters["ranges"] == 1
+        assert received[0] == 1000
+
+    def test_range_ignoring_mirror_restarts_transfer(
+        self,
+        fixtures: typing.Dict[str, bytes],
+        tmpdir: typing.Any,
+        logger: 'iocage.Logger.Logger'
+    ) -> None:
+        """Test that a full response replaces the partial file."""
+        data = fixtures["src.txz"]
+        path = os.path.join(str(tmpdir), "src.txz")
+        with open(f"{path}.part", "wb") as f:
+            f.write(b"stale partial content")
+
+        server = FixtureServer(
+            {"src.txz": data},
+            drops={"src.txz": 1},
+            ignore_range=True
+        )
+        try:
+            downloader = iocage.Downloader.Downloader(logger=logger)
+            downloader.download(f"{server.url}/src.txz", path)
+        finally:
+            server.stop()
+
+        with open(path, "rb") as f:
+            assert f.read() == data
+
+    def test_keep_alive_connection_is_reused(
+        self,
+        fixtures: typing.Dict[str, bytes],
+        tmpdir: typing.Any,
+        logger: 'iocage.Logger.Logger'
+    ) -> None:
+        """Test that one pooled connection serves all downloads."""
+        server = FixtureServer(fixtures)
+        try:
+            downloader = iocage.Downloader.Downloader(workers=1, logger=logger)
+            self._download_all(downloader, server, str(tmpdir))
+            downloader.pool.close()
+        finally:
+            server.stop()
+
+        assert server.counters["connections"] == 1
+        assert downloader.pool.connections_opened == 1
+
+    def test_failed_download_raises(
+        self,
+        tmpdir: typing.Any,
+        logger: 'iocage.Logger.Logger'
+    ) -> None:
+        """Test that missing files fail the download."""
+        server = FixtureServer({})
+        try:
+            downloader = iocage.Downloader.Downloader(logger=logger)
+            with pytest.raises(iocage.errors.DownloadFailed):
+                downloader.download(
+                    f"{server.url}/base.txz",
+                    os.path.join(str(tmpdir), "base.txz")
+                )
+        finally:
+            server.stop()
+
+
+class TestStreamingExtraction(object):
+    """Extract tarballs in the same pass they are downloaded and hashed."""
+
+    def test_stream_is_hashed_and_extracted_despite_drops(
+        self,
+        tmpdir: typing.Any,
+        logger: 'iocage.Logger.Logger'
+    ) -> None:
+        """Test that a resumed stream is extracted and hashed once."""
+        data = _create_tarball("base.bin", 512 * 1024)
+        server = FixtureServer({"base.txz": data}, drops={"base.txz": 2})
+        copy_path = os.path.join(str(tmpdir), "base.txz")
+        destination = os.path.join(str(tmpdir), "root")
+        try:
+            downloader = iocage.Downloader.Downloader(logger=logger)
+            with open(copy_path, "wb") as copy_to:
+                with downloader.open(f"{server.url}/base.txz") as stream:
+                    reader = iocage.Downloader.HashingReader(
+                        stream,  # type: ignore
+                        copy_to=copy_to
+                    )
+                    iocage.SecureTarfile.extract_stream(
+                        fileobj=reader,  # type: ignore
+                        destination=destination,
+                        name="base.txz",
+                        compression_format="xz"
+                    )
+                    reader.drain()
+        finally:
+            server.stop()
+
+        assert reader.hexdigest() == hashlib.sha256(data).hexdigest()
+        assert os.path.getsize(os.path.join(destination, "base.bin")) \
+            == 512 * 1024
+        with open(copy_path, "rb") as f:
+            assert f.read() == data
+        assert server.counters["ranges"] == 2
+
+    def test_unsafe_member_is_not_extracted(
+        self,
+        tmpdir: typing.Any
+    ) -> None:
+        """Test that members are checked before they are written."""
+        data = io.BytesIO()
+        with tarfile.open(fileobj=data, mode="w:xz") as tar:
+            for name in ["./safe", "./../unsafe"]:
+                info = tarfile.TarInfo(name)
+                info.size = 4
+                tar.addfile(info, io.BytesIO(b"data"))
+        data.seek(0)
+
+        destination = os.path.join(str(tmpdir), "root")
+        with pytest.raises(iocage.errors.IllegalArchiveContent):
+            iocage.SecureTarfile.extract_stream(
+                fileobj=data,
+                destination=destination,
+                name="unsafe.txz"
+            )
+
+        assert os.path.isfile(os.path.join(destination, "safe")) is True
+        assert os.path.exists(os.path.join(str(tmpdir), "unsafe")) is False
+
+    def test_streams_into_same_destination_are_serialized(
+        self,
+        tmpdir: typing.Any
+    ) -> None:
+        """Test that archives sharing directories and links do not race."""
+        archives = {}
+        for name in ["base", "lib32"]:
+            data = io.BytesIO()
+            with tarfile.open(fileobj=data, mode="w:xz") as tar:
+                for directory in ["./usr", "./usr/share"]:
+                    info = tarfile.TarInfo(directory)
+                    info.type = tarfile.DIRTYPE
+                    info.mode = 0o755
+                    tar.addfile(info)
+                info = tarfile.TarInfo(f"./usr/share/{name}")
+                info.size = 64 * 1024
+                tar.addfile(info, io.BytesIO(os.urandom(info.size)))
+                info = tarfile.TarInfo(f"./usr/{name}.link")
+                info.type = tarfile.LNKTYPE
+                info.linkname = f"./usr/share/{name}"
+                tar.addfile(info)
+            archives[name] = data.getvalue()
+
+        class SlowReader(io.RawIOBase):
+            """Record when an archive is read in small chunks."""
+
+            def __init__(self, data: bytes) -> None:
+                io.RawIOBase.__init__(self)
+                self.source = io.BytesIO(data)
+                self.reads: typing.List[float] = []
+
+            def readable(self) -> bool:
+                return True
+
+            def readinto(self, buffer: typing.Any) -> int:  # noqa: T484
+                self.reads.append(time.monotonic())
+                time.sleep(0.001)
+                data = self.source.read(min(len(buffer), 1024))
+                buffer[:len(data)] = data
+                return len(data)
+
+        destination = os.path.join(str(tmpdir), "root")
+        readers = dict([(x, SlowReader(y)) for x, y in archives.items()])
+        errors: typing.List[BaseException] = []
+
+        def _extract(name: str) -> None:
+            try:
+                iocage.SecureTarfile.extract_stream(
+                    fileobj=readers[name],  # type: ignore
+                    destination=destination,
+                    name=f"{name}.txz",
+                    compression_format="xz"
+                )
+            except BaseException as e:
+                errors.append(e)
+
+        threads = [
+            threading.Thread(target=_extract, args=(name,))
+            for name in archives
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert errors == []
+        first, second = sorted(readers.values(), key=lambda x: x.reads[0])
+        assert first.reads[-1] <= second.reads[0]
+        for name in archives:
+            target = os.stat(os.path.join(destination, f"usr/share/{name}"))
+            link = os.stat(os.path.join(destination, f"usr/{name}.link"))
+            assert target.st_size == 64 * 1024
+            assert (link.st_ino, link.st_nlink) == (target.st_ino, 2)
@@ -0,0 +1,134 @@
+# Copyright (c) 2014-2018, iocage
+# Copyright (c) 2017-2018, Stefan Grönke
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted providing that the following conditions
+# are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+# IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+"""Unit tests for the event tracer."""
+import json
+import os.path
+import threading
+import time
+import typing
+
+import iocage.events
+import iocage.EventTracer
+
+
+class JailMock(object):
+    """Mock a jail that identifies events by its name."""
+
+    def __init__(self, full_name: str="web1") -> None:
+        self.full_name = full_name
+
+
+def _start_jail(
+) -> typing.Generator['iocage.events.IocageEvent', None, None]:
+    jail = JailMock()
+    scope = iocage.events.Scope()
+    launch_event = iocage.events.JailLaunch(jail=jail, scope=scope)
+    resolver_event = iocage.events.JailResolverConfig(jail=jail, scope=scope)
+    dependants_event = iocage.events.JailDependantsStart(
+        jail=jail,
+        scope=scope
+    )
+
+    yield resolver_event.begin()
+    time.sleep(0.01)
+    yield resolver_event.end()
+    yield dependants_event.begin()
+    yield dependants_event.skip("No dependant jails")
+    yield launch_event.begin()
+    time.sleep(0.02)
+    yield launch_event.end()
+
+
+def _traced_start(
+) -> typing.Generator['iocage.events.IocageEvent', None, None]:
+    event = iocage.events.JailStart(jail=JailMock())
+    yield event.begin()
+    yield from _start_jail()
+    yield event.end()
+
+
+class TestEventTracer(object):
+    """Run EventTracer unit tests."""
+
+    def test_nested_events_are_exported(self, tmpdir: typing.Any) -> None:
+        """Test that the event tree is written as trace and folded stacks."""
+        tracer = iocage.EventTracer.EventTracer()
+        list(tracer.trace(_traced_start()))
+
+        assert [span.name for span in tracer.spans] == [
+            "JailStart@web1",
+            "JailResolverConfig@web1",
+            "JailDependantsStart@web1",
+            "JailLaunch@web1"
+        ]
+
+        trace_file = os.path.join(str(tmpdir), "trace.json")
+        tracer.write_chrome_trace(trace_file)
+        with open(trace_file, "r") as f:
+            trace_events = json.load(f)["traceEvents"]
+        root = trace_events[0]
+        launch = trace_events[3]
+        assert root["dur"] >= launch["dur"] >= 20000
+        assert root["ts"] <= launch["ts"]
+        assert launch["ts"] + launch["dur"] <= root["ts"] + root["dur"]
+        assert trace_events[2]["args"]["state"] == "skipped"
+
+        folded = dict([
+            line.rsplit(" ", maxsplit=1) for line in tracer.to_folded_stacks()
+        ])
+        assert int(folded["JailStart@web1;JailLaunch@web1"]) >= 20000
+        assert int(folded["JailStart@web1"]) < 20000
+
+    def test_worker_events_are_nested_by_scope(self) -> None:
+        """Test that events of a scope on worker threads share a parent."""
+        tracer = iocage.EventTracer.EventTracer()
+        event = iocage.events.JailStart(jail=JailMock())
+        tracer.record(event.begin())
+
+        def _worker(name: str) -> None:
+            worker_event = iocage.events.JailLaunch(
+                jail=JailMock(name),
+                scope=event.scope
+            )
+            tracer.record(worker_event.begin())
+            barrier.wait()
+            tracer.record(worker_event.end())
+
+        barrier = threading.Barrier(2)
+        threads = [
+            threading.Thread(target=_worker, args=(name,))
+            for name in ["web1", "web2"]
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        tracer.record(event.end())
+
+        assert len(tracer.roots) == 1
+        assert sorted([x.name for x in tracer.roots[0].children]) == [
+            "JailLaunch@web1",
+            "JailLaunch@web2"
+        ]
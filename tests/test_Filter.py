@@ -0,0 +1,141 @@
+# Copyright (c) 2014-2018, iocage
+# Copyright (c) 2017-2018, Stefan Grönke
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted providing that the following conditions
+# are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+# IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+"""Unit tests and microbenchmark for compiled filter Terms."""
+import time
+import typing
+
+import pytest
+
+import iocage.Filter
+import iocage.helpers
+
+from conftest import ResourceMock
+
+
+def _reference_matches(
+    term: iocage.Filter.Term,
+    value: typing.Any,
+    short: bool=False
+) -> bool:
+    """Match a term without compilation, one filter string at a time."""
+    if isinstance(value, list):
+        return any(map(lambda x: _reference_matches(term, x), value))
+
+    input_value = iocage.helpers.to_string(value)
+    for filter_string in term.filter_strings:
+        if iocage.Filter.match_filter(input_value, filter_string) is True:
+            return True
+        if term._filter_string_has_globs(filter_string) is True:
+            continue
+        if (short is True) and (len(filter_string) == 8):
+            shortname = iocage.helpers.to_humanreadable_name(input_value)
+            if shortname == filter_string:
+                return True
+        parse = iocage.helpers.parse_user_input
+        if parse(input_value) == parse(filter_string):
+            return True
+    return False
+
+
+def _reference_match_resource(
+    terms: iocage.Filter.Terms,
+    resource: ResourceMock
+) -> bool:
+    for term in terms:
+        value = resource.get(term.key)
+        if _reference_matches(term, value, term.short) is False:
+            return False
+    return True
+
+
+def _synthetic_resources(count: int) -> typing.List[ResourceMock]:
+    return [ResourceMock({
+        "name": (
+            f"{i:08x}-0000-0000-0000-000000000000" if (i % 7 == 0)
+            else f"web{i}" if (i % 3 == 0) else f"db{i}"
+        ),
+        "boot": (i % 2 == 0),
+        "template": None if (i % 5 == 0) else (i % 4 == 0),
+        "ip4_addr": [f"vnet0|10.{i % 256}.0.{i % 100}/24"],
+        "release": "11.2-RELEASE" if (i % 2) else "12.0-RELEASE"
+    }) for i in range(count)]
+
+
+class TestCompiledTerms(object):
+    """Run tests for compiled filter terms."""
+
+    filters = [
+        "name=web*,0000000e",
+        "boot=yes",
+        "template=no,-",
+        "ip4_addr=*10.1*",
+        "release=1+.2-RELEASE",
+        "release=1[12].2-RELEASE,13.0|12.0-RELEASE"
+    ]
+
+    def test_compiled_terms_match_like_uncompiled_terms(self) -> None:
+        """Test that compiled terms match the same resources."""
+        resources = _synthetic_resources(1000)
+        for filter_string in self.filters:
+            terms = iocage.Filter.Terms([filter_string])
+            for resource in resources:
+                expected = _reference_match_resource(terms, resource)
+                assert terms.match_resource(resource) == expected
+
+    def test_filter_strings_keep_regular_expression_semantics(self) -> None:
+        """Test that filter strings without globs are regular expressions."""
+        terms = iocage.Filter.Terms(["release=1[12].2,1\\,3,14{2}"])
+        for value in ["11.2", "12.2", "1,3", "144"]:
+            assert terms.match_resource(ResourceMock(dict(release=value)))
+        for value in ["13.2", "1[12].2", "1\\,3", "14{2}"]:
+            assert not terms.match_resource(ResourceMock(dict(release=value)))
+
+    def test_compiled_terms_are_cached(self) -> None:
+        """Test that terms are only recompiled when they change."""
+        terms = iocage.Filter.Terms(["boot=yes"])
+        compiled = terms.compile()
+        assert terms.compile() is compiled
+
+        terms.add("template=no")
+        assert terms.compile() is not compiled
+        assert len(terms.compile()) == 2
+
+    @pytest.mark.benchmark
+    def test_microbenchmark(self) -> None:
+        """Compare compiled and uncompiled matching of 10k resources."""
+        resources = _synthetic_resources(10000)
+        terms = iocage.Filter.Terms(self.filters)
+
+        start = time.perf_counter()
+        expected = [_reference_match_resource(terms, x) for x in resources]
+        reference_duration = time.perf_counter() - start
+
+        start = time.perf_counter()
+        compiled = terms.compile()
+        results = [compiled.match_resource(x) for x in resources]
+        compiled_duration = time.perf_counter() - start
+
+        assert results == expected
+        assert compiled_duration < reference_duration
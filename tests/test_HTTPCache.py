@@ -0,0 +1,195 @@
+# Copyright (c) 2014-2018, iocage
+# Copyright (c) 2017-2018, Stefan Grönke
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted providing that the following conditions
+# are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+# IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+"""Unit tests for the HTTP cache of the release list and EOL information."""
+import http.server
+import socketserver
+import threading
+import typing
+
+import pytest
+
+import iocage.HTTPCache
+import iocage.errors
+
+
+class CountingRequestHandler(http.server.BaseHTTPRequestHandler):
+    """Serve a page with an ETag and answer conditional requests."""
+
+    server: 'CountingServer'
+
+    def do_GET(self) -> None:
+        """Serve the page or confirm that it was not modified."""
+        with self.server.lock:
+            self.server.requests += 1
+            self.server.conditional_headers.append(
+                self.headers.get("If-None-Match", None)
+            )
+            body = self.server.body
+        etag = '"' + str(hash(body)) + '"'
+
+        if self.headers.get("If-None-Match", None) == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args: typing.Any) -> None:
+        """Do not log requests."""
+        pass
+
+
+class CountingServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    """Local HTTP stub that counts the requests it receives."""
+
+    daemon_threads = True
+
+    def __init__(self, body: bytes) -> None:
+        self.body = body
+        self.requests = 0
+        self.conditional_headers: typing.List[typing.Optional[str]] = []
+        self.lock = threading.Lock()
+        http.server.HTTPServer.__init__(
+            self,
+            ("127.0.0.1", 0),
+            CountingRequestHandler
+        )
+        self.thread = threading.Thread(target=self.serve_forever)
+        self.thread.start()
+
+    @property
+    def url(self) -> str:
+        """Return the URL of the served page."""
+        return f"http://127.0.0.1:{self.server_address[1]}/releases/"
+
+    def stop(self) -> None:
+        """Stop serving."""
+        self.shutdown()
+        self.server_close()
+        self.thread.join()
+
+
+class TestHTTPCache(object):
+    """Run HTTPCache unit tests against a local HTTP stub."""
+
+    @pytest.fixture
+    def server(self) -> typing.Generator[CountingServer, None, None]:
+        """Serve a release index."""
+        server = CountingServer(b'<a href="12.0-RELEASE/">')
+        yield server
+        server.stop()
+
+    def _cache(
+        self,
+        tmpdir: typing.Any,
+        logger: 'iocage.Logger.Logger',
+        **kwargs: typing.Any
+    ) -> iocage.HTTPCache.HTTPCache:
+        return iocage.HTTPCache.HTTPCache(
+            directory=str(tmpdir),
+            logger=logger,
+            **kwargs
+        )
+
+    def test_fresh_response_is_served_without_request(
+        self,
+        server: CountingServer,
+        tmpdir: typing.Any,
+        logger: 'iocage.Logger.Logger'
+    ) -> None:
+        """Test that following processes reuse the cached response."""
+        response = self._cache(tmpdir, logger).get(server.url)
+        assert response.text == '<a href="12.0-RELEASE/">'
+
+        for _ in range(3):
+            # a new cache object simulates another process
+            cached = self._cache(tmpdir, logger).get(server.url)
+            assert cached.body == response.body
+
+        assert server.requests == 1
+
+    def test_expired_response_is_revalidated(
+        self,
+        server: CountingServer,
+        tmpdir: typing.Any,
+        logger: 'iocage.Logger.Logger'
+    ) -> None:
+        """Test that unchanged resources are confirmed by a 304 response."""
+        cache = self._cache(tmpdir, logger, ttl=0, stale_ttl=0)
+        first = cache.get(server.url)
+        second = cache.get(server.url)
+
+        assert second.body == first.body
+        assert server.requests == 2
+        assert server.conditional_headers[0] is None
+        assert server.conditional_headers[1] == first.etag
+
+        with server.lock:
+            server.body = b'<a href="13.0-RELEASE/">'
+        assert cache.get(server.url).text == '<a href="13.0-RELEASE/">'
+        assert server.requests == 3
+
+    def test_stale_response_is_revalidated_in_background(
+        self,
+        server: CountingServer,
+        tmpdir: typing.Any,
+        logger: 'iocage.Logger.Logger'
+    ) -> None:
+        """Test that a stale response is returned while it is refreshed."""
+        cache = self._cache(tmpdir, logger, ttl=0, stale_ttl=3600)
+        first = cache.get(server.url)
+        with server.lock:
+            server.body = b'<a href="13.0-RELEASE/">'
+
+        stale = cache.get(server.url)
+        assert stale.body == first.body
+        cache.wait()
+
+        assert server.requests == 2
+        fresh = self._cache(tmpdir, logger).get(server.url)
+        assert fresh.text == '<a href="13.0-RELEASE/">'
+        assert server.requests == 2
+
+    def test_unreachable_remote_uses_cached_response(
+        self,
+        server: CountingServer,
+        tmpdir: typing.Any,
+        logger: 'iocage.Logger.Logger'
+    ) -> None:
+        """Test that an outdated response is preferred over an error."""
+        url = server.url
+        cache = self._cache(tmpdir, logger, ttl=0, stale_ttl=0)
+        first = cache.get(url)
+        server.stop()
+
+        assert cache.get(url).body == first.body
+        with pytest.raises(iocage.errors.DownloadFailed):
+            cache.get(url.replace("/releases/", "/other/"))
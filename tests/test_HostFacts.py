@@ -0,0 +1,106 @@
+# Copyright (c) 2014-2018, iocage
+# Copyright (c) 2017-2018, Stefan Grönke
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted providing that the following conditions
+# are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+# IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+"""Unit tests for the memoized host facts."""
+import os.path
+import threading
+import time
+import typing
+
+import iocage.HostFacts
+
+
+class CountingHostFacts(iocage.HostFacts.HostFacts):
+    """Count how often host facts are collected."""
+
+    boot_id = "1"
+
+    def __init__(  # noqa: T484
+        self,
+        *args,
+        **kwargs
+    ) -> None:
+        self.collected: typing.List[str] = []
+        iocage.HostFacts.HostFacts.__init__(self, *args, **kwargs)
+
+    def _collect_boot_id(self) -> str:
+        return self.boot_id
+
+    def _collect_processor(self) -> str:
+        self.collected.append("processor")
+        time.sleep(0.01)
+        return "amd64"
+
+
+class TestHostFacts(object):
+    """Run HostFacts unit tests."""
+
+    def test_facts_are_collected_once(self) -> None:
+        """Test that a fact is memoized until it is refreshed."""
+        facts = CountingHostFacts()
+
+        assert facts["processor"] == "amd64"
+        assert facts["processor"] == "amd64"
+        assert facts.collected == ["processor"]
+
+        facts.refresh("processor")
+        assert facts["processor"] == "amd64"
+        assert facts.collected == ["processor", "processor"]
+
+    def test_persisted_facts_expire_on_reboot(
+        self,
+        tmpdir: typing.Any
+    ) -> None:
+        """Test that persisted facts are only reused within one boot."""
+        cache_file = os.path.join(str(tmpdir), "host_facts.json")
+
+        assert CountingHostFacts(cache_file)["processor"] == "amd64"
+        assert os.path.isfile(cache_file)
+
+        facts = CountingHostFacts(cache_file)
+        assert facts["processor"] == "amd64"
+        assert facts.collected == []
+
+        facts = CountingHostFacts(cache_file)
+        facts.boot_id = "2"
+        assert facts["processor"] == "amd64"
+        assert facts.collected == ["processor"]
+
+    def test_concurrent_access_collects_once(self) -> None:
+        """Test that threads accessing a new fact wait for its collection."""
+        facts = CountingHostFacts()
+        results: typing.List[str] = []
+
+        threads = [
+            threading.Thread(target=lambda: results.append(
+                facts["processor"]
+            )) for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert results == ["amd64"] * 8
+        assert facts.collected == ["processor"]
@@ -0,0 +1,245 @@
+# Copyright (c) 2014-2018, iocage
+# Copyright (c) 2017-2018, Stefan Grönke
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted providing that the following conditions
+# are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+# IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+"""Unit tests for the jail inventory."""
+import json
+import os
+import threading
+import time
+import typing
+
+import iocage.Host
+import iocage.Inventory
+import iocage.ZFS
+
+from conftest import DatasetMock, RootDatasetsMock
+
+
+class DatasetsMock(dict):
+    """Mock iocage.Datasets.Datasets with a single root dataset."""
+
+    def __init__(self, root_datasets: RootDatasetsMock) -> None:
+        dict.__init__(self, iocage=root_datasets)
+        self.main = root_datasets
+
+
+class HostMock(iocage.Host.HostGenerator):
+    """Mock a host that only knows about its datasets."""
+
+    def __init__(
+        self,
+        datasets: DatasetsMock,
+        logger: typing.Optional['iocage.Logger.Logger']=None
+    ) -> None:
+        self.datasets = datasets
+        self.logger = logger
+        self.zfs = iocage.ZFS.get_zfs(logger=logger)
+        self.jail_inventories = {}
+        self._jail_inventories_lock = threading.Lock()
+
+
+class JailMock(object):
+    """Mock a jail with a JSON config file."""
+
+    config_type = "json"
+    config_file = "config.json"
+
+    def __init__(
+        self,
+        dataset: DatasetMock,
+        data: typing.Dict[str, typing.Any]
+    ) -> None:
+        self.dataset = dataset
+        self.dataset_name = dataset.name
+        self.name = dataset.name.split("/").pop()
+        self.data = data
+        self.write_config()
+
+    def write_config(self) -> None:
+        """Write the jail configuration to its config file."""
+        with open(f"{self.dataset.mountpoint}/config.json", "w") as f:
+            json.dump(self.data, f)
+
+    def get(self, key: str) -> typing.Any:
+        """Return a config value or None."""
+        return self.data.get(key, None)
+
+
+class TestJailInventory(object):
+    """Run JailInventory unit tests."""
+
+    def _inventory(
+        self,
+        root_datasets: RootDatasetsMock,
+        logger: 'iocage.Logger.Logger'
+    ) -> iocage.Inventory.JailInventory:
+        inventory = iocage.Inventory.JailInventory(
+            root_datasets=root_datasets,
+            host=HostMock(DatasetsMock(root_datasets)),
+            logger=logger
+        )
+        inventory.load()
+        return inventory
+
+    def test_indexed_values_are_persisted(
+        self,
+        root_datasets: RootDatasetsMock,
+        logger: 'iocage.Logger.Logger'
+    ) -> None:
+        """Test that indexed jails are read back from disk."""
+        jail = JailMock(
+            root_datasets.add_jail("web1"),
+            dict(boot=True, priority=10, tags=["www", "prod"])
+        )
+        self._inventory(root_datasets, logger).index_jail(jail)
+
+        inventory = self._inventory(root_datasets, logger)
+        assert inventory.names == ["web1"]
+        assert inventory.get_data("web1") == dict(
+            boot="yes",
+            priority="10",
+            template="-",
+            tags=["www", "prod"],
+            ip4_addr="-"
+        )
+
+    def test_config_changes_invalidate_entries(
+        self,
+        root_datasets: RootDatasetsMock,
+        logger: 'iocage.Logger.Logger'
+    ) -> None:
+        """Test that only changed config file contents invalidate entries."""
+        jail = JailMock(root_datasets.add_jail("web1"), dict(boot=True))
+        self._inventory(root_datasets, logger).index_jail(jail)
+
+        config_file = f"{jail.dataset.mountpoint}/config.json"
+        os.utime(config_file, (0, 0))
+        assert self._inventory(root_datasets, logger).is_current("web1")
+
+        jail.data["boot"] = False
+        jail.write_config()
+        inventory = self._inventory(root_datasets, logger)
+        assert inventory.is_current("web1") is False
+        assert inventory.get_data("web1") is None
+
+    def test_names_are_reconciled_with_datasets(
+        self,
+        root_datasets: RootDatasetsMock,
+        logger: 'iocage.Logger.Logger'
+    ) -> None:
+        """Test that jails created elsewhere are added to the inventory."""
+        root_datasets.add_jail("web1")
+        assert self._inventory(root_datasets, logger).names == ["web1"]
+
+        root_datasets.add_jail("db1")
+        assert self._inventory(root_datasets, logger).names == ["db1", "web1"]
+
+        # the reconciled inventory was persisted
+        root_datasets.jails.children = []
+        assert self._inventory(root_datasets, logger).names == ["db1", "web1"]
+
+    def test_writes_of_other_instances_are_detected(
+        self,
+        root_datasets: RootDatasetsMock,
+        logger: 'iocage.Logger.Logger'
+    ) -> None:
+        """Test that a loaded inventory knows when it was changed on disk."""
+        jail = JailMock(root_datasets.add_jail("web1"), dict(boot=True))
+        inventory = self._inventory(root_datasets, logger)
+        inventory.index_jail(jail)
+        assert inventory.changed_on_disk is False
+
+        other_inventory = self._inventory(root_datasets, logger)
+        other_inventory.remove("web1")
+
+        assert other_inventory.changed_on_disk is False
+        assert inventory.changed_on_disk is True
+
+    def test_host_shares_loaded_inventory(
+        self,
+        root_datasets: RootDatasetsMock,
+        logger: 'iocage.Logger.Logger'
+    ) -> None:
+        """Test that the host reloads its inventory only when written."""
+        jail = JailMock(root_datasets.add_jail("web1"), dict(boot=True))
+        host = HostMock(DatasetsMock(root_datasets), logger=logger)
+
+        inventory = host.get_jail_inventory("iocage")
+        inventory.index_jail(jail)
+        assert host.get_jail_inventory("iocage") is inventory
+
+        self._inventory(root_datasets, logger).remove("web1")
+        reloaded_inventory = host.get_jail_inventory("iocage")
+        assert reloaded_inventory is not inventory
+        assert "web1" not in reloaded_inventory.keys()
+
+    def test_concurrent_indexing_is_serialized(
+        self,
+        root_datasets: RootDatasetsMock,
+        logger: 'iocage.Logger.Logger',
+        monkeypatch: typing.Any
+    ) -> None:
+        """Test that jails are not indexed while the inventory is saved."""
+        _dump = json.dump
+        changes_while_saving: typing.List[int] = []
+
+        def _slow_dump(
+            data: typing.Dict[str, typing.Any],
+            *args: typing.Any,
+            **kwargs: typing.Any
+        ) -> None:
+            count = len(data["jails"])
+            time.sleep(0.002)
+            changes_while_saving.append(len(data["jails"]) - count)
+            _dump(data, *args, **kwargs)
+
+        jails = [
+            JailMock(root_datasets.add_jail(f"jail{i}"), dict(priority=i))
+            for i in range(32)
+        ]
+        inventory = self._inventory(root_datasets, logger)
+        errors: typing.List[BaseException] = []
+
+        def _index(jail: JailMock) -> None:
+            try:
+                inventory.index_jail(jail, save=False)
+                inventory.save()
+            except BaseException as e:
+                errors.append(e)
+
+        monkeypatch.setattr(json, "dump", _slow_dump)
+        threads = [
+            threading.Thread(target=_index, args=(jail,)) for jail in jails
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert errors == []
+        assert set(changes_while_saving) == {0}
+        inventory = self._inventory(root_datasets, logger)
+        assert all([
+            inventory.is_current(jail.name) is True for jail in jails
+        ])
@@ -0,0 +1,130 @@
+# Copyright (c) 2014-2018, iocage
+# Copyright (c) 2017-2018, Stefan Grönke
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted providing that the following conditions
+# are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+# IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+"""Unit tests and microbenchmark of the jail launch plan."""
+import time
+import typing
+
+import pytest
+
+import iocage.JailLaunchPlan
+
+
+class ConfigMock(dict):
+    """Count the lookups of jail config values."""
+
+    def __init__(self, data: typing.Dict[str, typing.Any]) -> None:
+        self.lookups: typing.Dict[str, int] = {}
+        dict.__init__(self, data)
+
+    def __getitem__(self, key: str) -> typing.Any:
+        """Return a config value, defaulting to None."""
+        self.lookups[key] = self.lookups.get(key, 0) + 1
+        return self.get(key, None)
+
+
+class ObjectMock(object):
+    """Mock an object with arbitrary attributes."""
+
+    def __init__(self, **kwargs: typing.Any) -> None:
+        self.__dict__.update(kwargs)
+
+
+class JailMock(object):
+    """Mock the attributes of a jail used by the launch plan."""
+
+    identifier = "ioc-web1"
+    name = "web1"
+    devfs_ruleset = 4
+    host = ObjectMock(userland_version=11.2)
+    root_dataset = ObjectMock(mountpoint="/iocage/jails/web1/root")
+    fstab = ObjectMock(path="/iocage/jails/web1/fstab")
+
+    def __init__(self) -> None:
+        self.config = ConfigMock(dict(
+            vnet=False,
+            ip4_addr="em0|10.0.0.2/24",
+            ip4_saddrsel=True,
+            ip4="new",
+            host_hostname="web1",
+            securelevel=2,
+            allow_mount=False,
+            allow_mount_zfs=False,
+            jail_zfs=False,
+            exec_jail_user="root"
+        ))
+
+    def get_hook_script_path(self, hook_name: str) -> str:
+        """Return the path of a hook script."""
+        return f"/iocage/jails/web1/launch-scripts/{hook_name}.sh"
+
+
+class TestJailLaunchPlan(object):
+    """Run JailLaunchPlan unit tests."""
+
+    def test_config_values_are_looked_up_once(self) -> None:
+        """Test that the plan reads each config value only once."""
+        jail = JailMock()
+        plan = iocage.JailLaunchPlan.JailLaunchPlan(jail)
+
+        assert max(jail.config.lookups.values()) == 1
+        assert plan.command[0:2] == ["/usr/sbin/jail", "-c"]
+        assert "ip4.addr=em0|10.0.0.2/24" in plan.command
+        assert "allow.mount=0" in plan.command
+        assert plan.exec_jail_user == "root"
+
+        plan.command.append("persist")
+        assert "persist" not in plan.command
+
+        try:
+            plan.exec_jail_user = "nobody"
+            raise AssertionError("the launch plan was modified")
+        except AttributeError:
+            pass
+
+    def test_config_keys_cover_the_lookups(self) -> None:
+        """Test that the host config fingerprint keys cover the plan."""
+        jail = JailMock()
+        iocage.JailLaunchPlan.JailLaunchPlan(jail)
+
+        config_keys = iocage.JailLaunchPlan.JailLaunchPlan.config_keys
+        assert set(jail.config.lookups).issubset(config_keys)
+
+    @pytest.mark.benchmark
+    def test_launch_plan_benchmark(self) -> None:
+        """Measure the construction cost of a launch plan."""
+        jail = JailMock()
+        iterations = 1000
+
+        start = time.perf_counter()
+        for _ in range(iterations):
+            plan = iocage.JailLaunchPlan.JailLaunchPlan(jail)
+        construction = (time.perf_counter() - start) / iterations
+
+        start = time.perf_counter()
+        for _ in range(iterations):
+            plan.command
+        reuse = (time.perf_counter() - start) / iterations
+
+        assert reuse < construction
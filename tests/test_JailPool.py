@@ -0,0 +1,256 @@
+# Copyright (c) 2014-2018, iocage
+# Copyright (c) 2017-2018, Stefan Grönke
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted providing that the following conditions
+# are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+# IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+"""Unit tests of the warm pool of pre-cloned jail datasets."""
+import os
+import typing
+
+import libzfs
+
+import iocage.JailPool
+import iocage.ZFS
+
+
+class ZFSDatasetMock(object):
+    """Mock a mounted ZFS dataset."""
+
+    def __init__(self, zfs: 'ZFSMock', name: str) -> None:
+        self.zfs = zfs
+        self.name = name
+
+    @property
+    def mountpoint(self) -> str:
+        """Return the mountpoint below the temporary directory."""
+        return os.path.join(self.zfs.basedir, self.name)
+
+    @property
+    def children(self) -> typing.List['ZFSDatasetMock']:
+        """Return the direct child datasets."""
+        return [
+            dataset for name, dataset in self.zfs.datasets.items()
+            if name.rsplit("/", maxsplit=1)[0] == self.name
+        ]
+
+    def rename(self, name: str) -> None:
+        """Rename the dataset and its children."""
+        prefix = self.name
+        for dataset_name in list(self.zfs.datasets.keys()):
+            if (dataset_name == prefix) or dataset_name.startswith(
+                f"{prefix}/"
+            ):
+                dataset = self.zfs.datasets.pop(dataset_name)
+                dataset.name = name + dataset_name[len(prefix):]
+                self.zfs.datasets[dataset.name] = dataset
+
+
+class ZFSMock(iocage.ZFS.ZFS):
+    """Mock the ZFS datasets operations used by the jail pool."""
+
+    def __init__(self, basedir: str) -> None:
+        self.basedir = basedir
+        self.datasets: typing.Dict[str, ZFSDatasetMock] = {}
+        self.clones = 0
+
+    def get_dataset(self, name: str) -> ZFSDatasetMock:
+        """Return an existing dataset."""
+        try:
+            return self.datasets[name]
+        except KeyError:
+            raise libzfs.ZFSException(f"{name} does not exist")
+
+    def create_dataset(self, name: str) -> ZFSDatasetMock:
+        """Create a dataset and its mountpoint."""
+        dataset = ZFSDatasetMock(self, name)
+        os.makedirs(dataset.mountpoint, exist_ok=True)
+        self.datasets[name] = dataset
+        return dataset
+
+    def get_or_create_dataset(self, name: str) -> ZFSDatasetMock:
+        """Return or create a dataset."""
+        if name in self.datasets:
+            return self.datasets[name]
+        return self.create_dataset(name)
+
+    def clone_dataset(self, source: ZFSDatasetMock, target: str) -> None:
+        """Count the clones of the template root dataset."""
+        self.clones += 1
+        self.create_dataset(target)
+
+    def delete_dataset_recursive(self, dataset: ZFSDatasetMock) -> None:
+        """Delete a dataset and its children."""
+        for name in list(self.datasets.keys()):
+            if (name == dataset.name) or name.startswith(f"{dataset.name}/"):
+                del self.datasets[name]
+
+
+class TemplateMock(object):
+    """Mock a template jail with a JSON config file."""
+
+    name = "tmpl"
+    config_file = "config.json"
+
+    def __init__(self, zfs: ZFSMock) -> None:
+        self.dataset = zfs.create_dataset("zroot/iocage/jails/tmpl")
+        self.root_dataset = zfs.create_dataset("zroot/iocage/jails/tmpl/root")
+        self.touch(0)
+
+    def touch(self, mtime: int) -> None:
+        """Write the config file with the given modification time."""
+        path = os.path.join(self.dataset.mountpoint, self.config_file)
+        with open(path, "w") as f:
+            f.write("{}")
+        os.utime(path, (mtime, mtime))
+
+
+class PoolRootDatasetsMock(object):
+    """Mock the iocage root datasets."""
+
+    def __init__(self, zfs: ZFSMock) -> None:
+        self.root = zfs.create_dataset("zroot/iocage")
+        self.pool = zfs.create_dataset("zroot/iocage/pool")
+
+
+class TestJailPool(object):
+    """Run JailPool unit tests."""
+
+    def _get_pool(
+        self,
+        tmpdir: typing.Any,
+        logger: 'iocage.Logger.Logger'
+    ) -> typing.Tuple[iocage.JailPool.JailPool, ZFSMock, TemplateMock]:
+        zfs = ZFSMock(str(tmpdir))
+        template = TemplateMock(zfs)
+        pool = iocage.JailPool.JailPool(
+            resource=template,
+            root_datasets=PoolRootDatasetsMock(zfs),
+            logger=logger,
+            zfs=zfs
+        )
+        return pool, zfs, template
+
+    def test_disabled_pool_creates_no_datasets(
+        self,
+        tmpdir: typing.Any,
+        logger: 'iocage.Logger.Logger'
+    ) -> None:
+        """Test that an unconfigured pool is disabled."""
+        pool, zfs, _ = self._get_pool(tmpdir, logger)
+
+        assert pool.enabled is False
+        assert "zroot/iocage/pool/template-tmpl" not in zfs.datasets
+
+    def test_claim_renames_entry_and_counts_hits(
+        self,
+        tmpdir: typing.Any,
+        logger: 'iocage.Logger.Logger'
+    ) -> None:
+        """Test that claims rename pre-cloned datasets."""
+        pool, zfs, _ = self._get_pool(tmpdir, logger)
+        pool.configure(size=2, refill="manual")
+
+        assert pool.enabled is True
+        assert pool.refill() == 2
+        assert zfs.clones == 2
+
+        dataset = pool.claim("zroot/iocage/jails/web1")
+        assert dataset.name == "zroot/iocage/jails/web1"
+        assert "zroot/iocage/jails/web1/root" in zfs.datasets
+        assert pool.claim("zroot/iocage/jails/web2") is not None
+        assert pool.claim("zroot/iocage/jails/web3") is None
+
+        statistics = pool.statistics
+        assert statistics["available"] == 0
+        assert statistics["hits"] == 2
+        assert statistics["misses"] == 1
+        assert zfs.clones == 2
+
+    def test_sync_refill_replaces_claimed_entries(
+        self,
+        tmpdir: typing.Any,
+        logger: 'iocage.Logger.Logger'
+    ) -> None:
+        """Test that the sync refill policy keeps the pool full."""
+        pool, zfs, _ = self._get_pool(tmpdir, logger)
+        pool.configure(size=1, refill="sync")
+        pool.refill()
+
+        pool.claim("zroot/iocage/jails/web1")
+
+        assert pool.available == 1
+        assert zfs.clones == 2
+
+    def test_changed_template_discards_entries(
+        self,
+        tmpdir: typing.Any,
+        logger: 'iocage.Logger.Logger'
+    ) -> None:
+        """Test that entries of an outdated template are not claimed."""
+        pool, zfs, template = self._get_pool(tmpdir, logger)
+        pool.configure(size=1, refill="manual")
+        pool.refill()
+
+        template.touch(1)
+
+        assert pool.available == 0
+        assert pool.claim("zroot/iocage/jails/web1") is None
+        pool.refill()
+        assert pool.available == 1
+        entries = [
+            name for name in zfs.datasets.keys()
+            if name.startswith("zroot/iocage/pool/template-tmpl/")
+            if name.endswith("/root")
+        ]
+        assert len(entries) == 1
+
+    def test_interrupted_refill_is_cleaned_up(
+        self,
+        tmpdir: typing.Any,
+        logger: 'iocage.Logger.Logger'
+    ) -> None:
+        """Test that entries a refill did not register are removed."""
+        pool, zfs, _ = self._get_pool(tmpdir, logger)
+        pool.configure(size=1, refill="manual")
+        pool.refill()
+
+        # a background refill was stopped before it registered the entry
+        pool._create_entry()
+
+        assert pool.refill() == 0
+        assert len(pool.dataset.children) == 1
+        assert pool.available == 1
+
+    def test_background_refill_does_not_delay_exit(
+        self,
+        tmpdir: typing.Any,
+        logger: 'iocage.Logger.Logger'
+    ) -> None:
+        """Test that the background refill runs in a daemon thread."""
+        pool, _, _ = self._get_pool(tmpdir, logger)
+        pool.configure(size=1, refill="manual")
+
+        thread = pool.refill_in_background()
+        thread.join()
+
+        assert thread.daemon is True
+        assert pool.available == 1
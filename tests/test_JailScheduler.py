@@ -0,0 +1,297 @@
+# Copyright (c) 2014-2018, iocage
+# Copyright (c) 2017-2018, Stefan Grönke
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted providing that the following conditions
+# are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+# IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+"""Unit tests for the concurrent jail scheduler."""
+import threading
+import time
+import typing
+
+import pytest
+
+import iocage.errors
+import iocage.JailScheduler
+
+
+class JailMock(object):
+    """Simulate a jail that takes a while to start."""
+
+    def __init__(
+        self,
+        name: str,
+        priority: int=99,
+        depends: typing.Optional[typing.List[str]]=None,
+        fail: bool=False,
+        delay: float=0.01
+    ) -> None:
+        self.name = name
+        self.full_name = name
+        self.humanreadable_name = name
+        self.config = dict(priority=priority, depends=(depends or []))
+        self.running = False
+        self.fail = fail
+        self.forced = False
+        self.delay = delay
+        self.started_at: typing.Optional[float] = None
+        self.finished_at: typing.Optional[float] = None
+        self.killed = threading.Event()
+        self.stopping = False
+        self.overlapped = False
+
+    def start(self) -> typing.Generator[str, None, None]:
+        """Pretend to start the jail."""
+        self.started_at = time.monotonic()
+        yield f"{self.name} starting"
+        time.sleep(self.delay)
+        if self.fail is True:
+            raise iocage.errors.IocageException(f"{self.name} failed")
+        self.running = True
+        self.finished_at = time.monotonic()
+        yield f"{self.name} started"
+
+    def stop(self, force: bool=False) -> typing.Generator[str, None, None]:
+        """Pretend to stop the jail, which is quick when forced."""
+        if self.stopping is True:
+            self.overlapped = True
+        self.stopping = True
+        try:
+            self.forced = force
+            self.started_at = time.monotonic()
+            yield f"{self.name} stopping"
+            if force is False:
+                self._run_exec_stop()
+            self.running = False
+            self.finished_at = time.monotonic()
+            yield f"{self.name} stopped"
+        finally:
+            self.stopping = False
+
+    def _run_exec_stop(self) -> None:
+        # exec.stop ends early when the processes of the jail are killed
+        if self.killed.wait(self.delay) is True:
+            raise iocage.errors.IocageException(f"{self.name} was killed")
+
+    def kill_processes(self) -> None:
+        """Pretend to kill the processes of the jail."""
+        self.killed.set()
+
+
+class HangingJailMock(JailMock):
+    """Simulate a jail whose exec.stop survives being killed."""
+
+    def __init__(self, name: str) -> None:
+        JailMock.__init__(self, name)
+        self.released = threading.Event()
+
+    def _run_exec_stop(self) -> None:
+        self.released.wait()
+
+
+class JailStartSchedulerMock(iocage.JailScheduler.JailStartScheduler):
+    """Resolve the dependencies of mocked jails by their name."""
+
+    def __init__(  # noqa: T484
+        self,
+        jails: typing.List[JailMock],
+        **kwargs
+    ) -> None:
+        self.all_jails = dict([(jail.name, jail) for jail in jails])
+        iocage.JailScheduler.JailStartScheduler.__init__(
+            self,
+            jails,
+            **kwargs
+        )
+
+    def _resolve_dependencies(  # noqa: T484
+        self,
+        jail: JailMock
+    ) -> typing.List[JailMock]:
+        return [self.all_jails[name] for name in jail.config["depends"]]
+
+
+class JailStopSchedulerMock(iocage.JailScheduler.JailStopScheduler):
+    """Resolve the dependencies of mocked jails by their name."""
+
+    def _resolve_dependencies(  # noqa: T484
+        self,
+        jail: JailMock
+    ) -> typing.List[JailMock]:
+        return [
+            x for x in self._jails.values()
+            if x.name in jail.config["depends"]
+        ]
+
+
+class TestJailStartScheduler(object):
+    """Run JailStartScheduler unit tests."""
+
+    def test_priority_tiers_and_dependencies(
+        self,
+        logger: 'iocage.Logger.Logger'
+    ) -> None:
+        """Test that tiers and dependencies define the start order."""
+        jails = [
+            JailMock("db", priority=10),
+            JailMock("web1", priority=20, depends=["db", "cache"]),
+            JailMock("web2", priority=20),
+            JailMock("cache", priority=30),
+            JailMock("late", priority=30, depends=["broken"]),
+            JailMock("broken", priority=30, fail=True)
+        ]
+        events: typing.List[str] = []
+        scheduler = JailStartSchedulerMock(
+            jails,
+            workers=4,
+            event_callback=events.append,
+            logger=logger
+        )
+
+        assert scheduler.run() is False
+
+        by_name = dict([(jail.name, jail) for jail in jails])
+        assert by_name["db"].finished_at <= by_name["web2"].started_at
+        assert by_name["cache"].finished_at <= by_name["web1"].started_at
+        assert by_name["late"].started_at is None
+        assert len(scheduler.succeeded) == 4
+        assert [jail.name for jail, _ in scheduler.failed] == [
+            "broken",
+            "late"
+        ]
+        assert isinstance(
+            scheduler.failed[1][1],
+            iocage.errors.JailDependencyFailed
+        )
+        assert "web1 started" in events
+
+        # the workers of the scheduler were shut down
+        with pytest.raises(RuntimeError):
+            scheduler._executor.submit(time.sleep, 0)
+
+    @pytest.mark.benchmark
+    def test_parallel_start_benchmark(
+        self,
+        logger: 'iocage.Logger.Logger'
+    ) -> None:
+        """Compare serial and concurrent start of simulated jails."""
+        durations = {}
+        for workers in [1, 8]:
+            jails = [
+                JailMock(f"jail{i}", priority=(i % 3)) for i in range(48)
+            ]
+            scheduler = JailStartSchedulerMock(
+                jails,
+                workers=workers,
+                logger=logger
+            )
+            start = time.perf_counter()
+            assert scheduler.run() is True
+            durations[workers] = time.perf_counter() - start
+            assert len(scheduler.succeeded) == 48
+
+        assert durations[8] < durations[1]
+
+
+class TestJailStopScheduler(object):
+    """Run JailStopScheduler unit tests."""
+
+    def _running_jails(self, jails: typing.List[JailMock]) -> None:
+        for jail in jails:
+            jail.running = True
+
+    def test_reverse_priority_and_dependency_order(
+        self,
+        logger: 'iocage.Logger.Logger'
+    ) -> None:
+        """Test that dependants are stopped before their dependencies."""
+        jails = [
+            JailMock("db", priority=10),
+            JailMock("web", priority=10, depends=["db"]),
+            JailMock("proxy", priority=20),
+            JailMock("other", priority=10, depends=["not-scheduled"])
+        ]
+        self._running_jails(jails)
+        scheduler = JailStopSchedulerMock(jails, workers=4, logger=logger)
+
+        assert scheduler.run() is True
+
+        by_name = dict([(jail.name, jail) for jail in jails])
+        assert by_name["proxy"].finished_at <= by_name["web"].started_at
+        assert by_name["web"].finished_at <= by_name["db"].started_at
+        assert all([jail.running is False for jail in jails])
+        assert any([jail.forced for jail in jails]) is False
+
+    def test_deadline_forces_stragglers(
+        self,
+        logger: 'iocage.Logger.Logger'
+    ) -> None:
+        """Test that hanging and remaining jails are force stopped."""
+        jails = [
+            JailMock(f"jail{i}", delay=(0 if i < 2 else 60))
+            for i in range(6)
+        ]
+        self._running_jails(jails)
+        events: typing.List[str] = []
+        scheduler = JailStopSchedulerMock(
+            jails,
+            workers=2,
+            deadline=0.5,
+            event_callback=events.append,
+            logger=logger
+        )
+
+        assert scheduler.run() is True
+
+        assert [jail.forced for jail in jails] == [False] * 2 + [True] * 4
+        assert [jail.killed.is_set() for jail in jails] == (
+            [False] * 2 + [True] * 2 + [False] * 2
+        )
+        assert any([jail.overlapped for jail in jails]) is False
+        assert all([jail.running is False for jail in jails])
+        assert len(scheduler.succeeded) == 6
+        assert events.count("jail2 stopping") == 2
+
+    def test_deadline_bounds_hanging_stop(
+        self,
+        logger: 'iocage.Logger.Logger'
+    ) -> None:
+        """Test that a graceful stop that never returns does not block."""
+        jail = HangingJailMock("hanging")
+        self._running_jails([jail])
+        scheduler = JailStopSchedulerMock([jail], deadline=0.2, logger=logger)
+        scheduler.abort_timeout = 0.1
+
+        start = time.monotonic()
+        try:
+            assert scheduler.run() is False
+            elapsed = time.monotonic() - start
+        finally:
+            jail.released.set()
+
+        assert elapsed < 0.2 + 0.1 + 1
+        assert jail.killed.is_set() is True
+        assert jail.forced is False
+        assert [x for x, _ in scheduler.failed] == [jail]
+        assert isinstance(
+            scheduler.failed[0][1],
+            iocage.errors.JailStopNotAborted
+        )
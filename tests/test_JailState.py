@@ -0,0 +1,158 @@
+# Copyright (c) 2014-2018, iocage
+# Copyright (c) 2017-2018, Stefan Grönke
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted providing that the following conditions
+# are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+# IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+"""Unit tests for the JailStates snapshot cache."""
+import os.path
+import typing
+
+import iocage.JailState
+import iocage.helpers
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+class JlsMock(object):
+    """Replay recorded jls output and count the invocations."""
+
+    def __init__(self, fixture: str) -> None:
+        with open(os.path.join(FIXTURES_DIR, fixture), "r") as f:
+            self.stdout = f.read()
+        self.calls = 0
+
+    def __call__(  # noqa: T484
+        self,
+        command: typing.List[str],
+        **kwargs
+    ) -> typing.Tuple[str, str, int]:
+        """Return the recorded jls output."""
+        assert command[0] == "/usr/sbin/jls"
+        self.calls += 1
+        return (self.stdout, "", 0)
+
+
+class TestJailStates(object):
+    """Run JailStates unit tests."""
+
+    def _mock_jls(self, monkeypatch: typing.Any) -> JlsMock:
+        jls = JlsMock("jls_libxo.json")
+        monkeypatch.setattr(iocage.helpers, "exec", jls)
+        monkeypatch.setattr(
+            iocage.JailState,
+            "_get_userland_version",
+            lambda: 11.2
+        )
+        return jls
+
+    def test_jail_states_share_one_snapshot(
+        self,
+        monkeypatch: typing.Any
+    ) -> None:
+        """Test that many jail states are resolved from one jls call."""
+        jls = self._mock_jls(monkeypatch)
+        states = iocage.JailState.JailStates()
+
+        jail_states = [
+            iocage.JailState.JailState(name, states=states)
+            for name in ["ioc-web1", "ioc-db1", "ioc-stopped"]
+        ]
+
+        assert jail_states[0]["jid"] == 3
+        assert jail_states[1]["jid"] == 5
+        assert jail_states[2].data == {}
+        assert jls.calls == 1
+
+    def test_invalidated_jails_refresh_the_snapshot(
+        self,
+        monkeypatch: typing.Any
+    ) -> None:
+        """Test that only invalidated jails cause another jls call."""
+        jls = self._mock_jls(monkeypatch)
+        states = iocage.JailState.JailStates()
+        web1 = iocage.JailState.JailState("ioc-web1", states=states)
+        db1 = iocage.JailState.JailState("ioc-db1", states=states)
+
+        assert web1["jid"] == 3
+        states.invalidate("ioc-db1")
+        assert web1["jid"] == 3
+        assert jls.calls == 1
+
+        assert db1["jid"] == 5
+        assert db1.query()["jid"] == 5
+        assert jls.calls == 3
+
+    def test_snapshot_expires_after_ttl(
+        self,
+        monkeypatch: typing.Any
+    ) -> None:
+        """Test that an expired snapshot is queried again."""
+        jls = self._mock_jls(monkeypatch)
+
+        states = iocage.JailState.JailStates(ttl=None)
+        states.get_data("ioc-web1")
+        states.get_data("ioc-web1")
+        assert jls.calls == 1
+
+        states = iocage.JailState.JailStates(ttl=0)
+        states.get_data("ioc-web1")
+        states.get_data("ioc-web1")
+        assert jls.calls == 3
+
+    def test_pending_jail_states_are_resolved_in_one_batch(
+        self,
+        monkeypatch: typing.Any
+    ) -> None:
+        """Test that started jails report their JIDs from one jls call."""
+        jls = self._mock_jls(monkeypatch)
+        states = iocage.JailState.JailStates()
+        states.query()
+        assert jls.calls == 1
+
+        jail_states = [
+            iocage.JailState.JailState(name, states=states)
+            for name in ["ioc-web1", "ioc-db1", "ioc-stopped"]
+        ]
+        for jail_state in jail_states:
+            jail_state.query()
+        assert jls.calls == 1
+
+        assert [x.data.get("jid", None) for x in jail_states] == [3, 5, None]
+        assert jls.calls == 2
+
+    def test_query_names_keeps_other_states(
+        self,
+        monkeypatch: typing.Any
+    ) -> None:
+        """Test that a batched query only replaces the requested states."""
+        jls = self._mock_jls(monkeypatch)
+        states = iocage.JailState.JailStates(states=dict(
+            other=iocage.JailState.JailState("other", dict(jid="7"))
+        ))
+
+        states.query(names=["ioc-web1", "ioc-gone"])
+
+        assert jls.calls == 1
+        assert sorted(states.keys()) == ["ioc-web1", "other"]
+        assert states.get_data("ioc-gone") == {}
+        assert states.get_data("other")["jid"] == "7"
+        assert jls.calls == 1
@@ -0,0 +1,143 @@
+# Copyright (c) 2014-2018, iocage
+# Copyright (c) 2017-2018, Stefan Grönke
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted providing that the following conditions
+# are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+# IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+"""Unit tests of the concurrent execution of commands in many jails."""
+import threading
+import time
+import typing
+
+import iocage.JailsExec
+
+
+class JailMock(object):
+    """Mock a jail that echoes the command with a delay."""
+
+    delay = 0.01
+
+    def __init__(
+        self,
+        name: str,
+        returncode: int=0,
+        running: bool=True,
+        tracker: typing.Optional['ConcurrencyTracker']=None
+    ) -> None:
+        self.humanreadable_name = name
+        self.returncode = returncode
+        self.running = running
+        self.tracker = tracker
+
+    def exec_generator(
+        self,
+        command: typing.List[str],
+        env: typing.Dict[str, str]={}
+    ) -> typing.Generator[bytes, None, typing.Tuple[str, None, int]]:
+        """Yield two lines of output and return the returncode."""
+        if self.tracker is not None:
+            self.tracker.enter()
+        try:
+            for i in range(2):
+                time.sleep(self.delay)
+                yield f"{' '.join(command)} {i}\r".encode("UTF-8")
+        finally:
+            if self.tracker is not None:
+                self.tracker.leave()
+        return "", None, self.returncode
+
+
+class ConcurrencyTracker(object):
+    """Track the maximum number of concurrently executed commands."""
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.current = 0
+        self.maximum = 0
+
+    def enter(self) -> None:
+        """Count a started command."""
+        with self.lock:
+            self.current += 1
+            self.maximum = max(self.maximum, self.current)
+
+    def leave(self) -> None:
+        """Count a finished command."""
+        with self.lock:
+            self.current -= 1
+
+
+class TestJailsExec(object):
+    """Run JailsExec unit tests."""
+
+    def test_output_is_prefixed_and_summarized(
+        self,
+        logger: 'iocage.Logger.Logger'
+    ) -> None:
+        """Test that output lines and exit codes are attributed to jails."""
+        jails = [
+            JailMock("web1"),
+            JailMock("web2", returncode=3),
+            JailMock("web3", running=False)
+        ]
+        lines: typing.List[str] = []
+        jails_exec = iocage.JailsExec.JailsExec(
+            jails,
+            ["echo", "hello"],
+            workers=3,
+            output_callback=lambda jail, line: lines.append(
+                f"{jail.humanreadable_name}: {line}"
+            ),
+            logger=logger
+        )
+
+        assert jails_exec.run() is False
+        assert sorted(lines) == [
+            "web1: echo hello 0",
+            "web1: echo hello 1",
+            "web2: echo hello 0",
+            "web2: echo hello 1"
+        ]
+        assert jails_exec.summary == dict(
+            web1="0",
+            web2="3",
+            web3="not running"
+        )
+        assert [r.jail.humanreadable_name for r in jails_exec.failed] == [
+            "web2"
+        ]
+
+    def test_parallelism_is_limited(
+        self,
+        logger: 'iocage.Logger.Logger'
+    ) -> None:
+        """Test that no more commands than workers run at a time."""
+        tracker = ConcurrencyTracker()
+        jails = [JailMock(f"web{i}", tracker=tracker) for i in range(8)]
+        jails_exec = iocage.JailsExec.JailsExec(
+            jails,
+            ["true"],
+            workers=3,
+            logger=logger
+        )
+
+        assert jails_exec.run() is True
+        assert tracker.maximum == 3
@@ -0,0 +1,275 @@
+# Copyright (c) 2014-2018, iocage
+# Copyright (c) 2017-2018, Stefan Grönke
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted providing that the following conditions
+# are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+# IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+"""Unit tests for ListableResource filter pushdown and parallel loading."""
+import threading
+import time
+import typing
+
+import pytest
+
+import iocage.Filter
+import iocage.ListableResource
+
+from conftest import DatasetMock, ResourceMock, RootDatasetsMock
+
+
+class CountingListableResource(iocage.ListableResource.ListableResource):
+    """Count how many resources get materialized while iterating."""
+
+    materialized: int
+
+    def __init__(
+        self,
+        sources: typing.Dict[str, RootDatasetsMock],
+        filters: typing.List[str],
+        logger: 'iocage.Logger.Logger',
+        workers: typing.Optional[int]=None,
+        prefetch: typing.Optional[int]=None
+    ) -> None:
+        self.materialized = 0
+        iocage.ListableResource.ListableResource.__init__(
+            self,
+            sources=sources,
+            namespace="jails",
+            filters=filters,
+            logger=logger,
+            workers=workers,
+            prefetch=prefetch
+        )
+
+    def _create_resource_instance(  # noqa: T484
+        self,
+        dataset: DatasetMock
+    ) -> ResourceMock:
+        self.materialized += 1
+        name = self._get_asset_name_from_dataset(dataset)
+        return ResourceMock(dict(
+            name=name,
+            boot=name.endswith("1"),
+            template=False
+        ))
+
+
+class UnfilteredListableResource(CountingListableResource):
+    """Materialize every resource before it is matched against filters."""
+
+    def _iter_filtered_datasets(  # noqa: T484
+        self,
+        filters: typing.Optional['iocage.Filter.CompiledTerms']
+    ) -> typing.Generator[DatasetMock, None, None]:
+        for root_datasets in self.sources.values():
+            yield from root_datasets.jails.children
+
+
+class SlowListableResource(CountingListableResource):
+    """Simulate I/O bound loading and track the loaded-ahead resources."""
+
+    delay = 0.002
+
+    def __init__(  # noqa: T484
+        self,
+        *args,
+        **kwargs
+    ) -> None:
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.max_pending = 0
+        CountingListableResource.__init__(self, *args, **kwargs)
+
+    def _create_resource_instance(  # noqa: T484
+        self,
+        dataset: DatasetMock
+    ) -> ResourceMock:
+        time.sleep(self.delay)
+        with self.lock:
+            self.pending += 1
+            self.max_pending = max(self.max_pending, self.pending)
+            return CountingListableResource._create_resource_instance(
+                self,
+                dataset
+            )
+
+    def __iter__(self) -> typing.Generator[ResourceMock, None, None]:
+        """Count the resources that were loaded but not yet consumed."""
+        for resource in CountingListableResource.__iter__(self):
+            with self.lock:
+                self.pending -= 1
+            yield resource
+
+
+class TestListableResource(object):
+    """Run ListableResource unit tests."""
+
+    names = [f"web{i}" for i in range(100)] + [f"db{i}" for i in range(100)]
+
+    def _root_datasets(self) -> RootDatasetsMock:
+        root_datasets = RootDatasetsMock()
+        for name in self.names:
+            root_datasets.add_jail(name)
+        return root_datasets
+
+    def _list(
+        self,
+        filters: typing.List[str],
+        logger: 'iocage.Logger.Logger'
+    ) -> CountingListableResource:
+        return CountingListableResource(
+            sources=dict(ioc=self._root_datasets()),
+            filters=filters,
+            logger=logger
+        )
+
+    def test_name_filter_skips_loading_other_resources(
+        self,
+        logger: 'iocage.Logger.Logger'
+    ) -> None:
+        """Test that only resources matching the name are materialized."""
+        resources = self._list(["web*", "boot=yes"], logger=logger)
+        matches = [resource for resource in resources]
+
+        assert len(matches) == 10
+        assert resources.materialized == 100
+        assert resources.statistics["name"][0] == 1
+        assert resources.statistics["config"][0] == 100
+        assert "state" not in resources.statistics
+
+    def test_source_filter_skips_loading_other_sources(
+        self,
+        logger: 'iocage.Logger.Logger'
+    ) -> None:
+        """Test that resources of other sources are never materialized."""
+        resources = self._list(["source=other", "boot=yes"], logger=logger)
+
+        matches = [resource for resource in resources]
+
+        assert len(matches) == 0
+        assert resources.materialized == 0
+
+    def test_pushdown_reduces_materialized_resources(
+        self,
+        logger: 'iocage.Logger.Logger',
+        resource_mock: typing.Type[ResourceMock]
+    ) -> None:
+        """Test that prefilters avoid constructing non-matching resources."""
+        filters = ["web1*", "source=ioc", "boot=yes"]
+        sources = dict(ioc=self._root_datasets())
+        constructed = {}
+        for _class in [UnfilteredListableResource, CountingListableResource]:
+            resource_mock.instances = 0
+            resources = _class(sources=sources, filters=filters, logger=logger)
+            matches = [x.get("name") for x in resources]
+            constructed[_class] = resource_mock.instances
+
+        assert matches == ["web1", "web11"]
+        assert constructed[UnfilteredListableResource] == 200
+        assert constructed[CountingListableResource] == 11
+
+    def test_count_without_loading_resources(
+        self,
+        logger: 'iocage.Logger.Logger'
+    ) -> None:
+        """Test that counting by name does not materialize resources."""
+        resources = self._list(["web*"], logger=logger)
+        assert len(resources) == 100
+        assert resources.materialized == 0
+
+        resources = self._list(["web*", "boot=yes"], logger=logger)
+        assert len(resources) == 10
+        assert resources.materialized == 100
+
+    def test_terms_are_matched_in_cost_order(
+        self,
+        logger: 'iocage.Logger.Logger'
+    ) -> None:
+        """Test that filter terms are classified by their data source."""
+        terms = iocage.Filter.Terms(
+            ["boot=yes", "running=no", "source=ioc", "web*"],
+            logger=logger
+        )
+
+        data_sources = [
+            term.data_source for term in sorted(terms, key=lambda x: x.cost)
+        ]
+        assert data_sources == ["name", "source", "state", "config"]
+
+    def test_parallel_loading_is_ordered_and_bounded(
+        self,
+        logger: 'iocage.Logger.Logger'
+    ) -> None:
+        """Test that parallel loading keeps dataset order and the window."""
+        sources = dict(ioc=self._root_datasets())
+        resources = SlowListableResource(
+            sources=sources,
+            filters=[],
+            logger=logger,
+            workers=4,
+            prefetch=8
+        )
+
+        names = [resource.get("name") for resource in resources]
+
+        assert names == self.names
+        assert resources.max_pending <= 8
+
+    def test_parallel_loading_matches_serial_loading(
+        self,
+        logger: 'iocage.Logger.Logger'
+    ) -> None:
+        """Test that parallel loading filters like serial loading."""
+        sources = dict(ioc=self._root_datasets())
+        matches = {}
+        for workers in [None, 8]:
+            resources = SlowListableResource(
+                sources=sources,
+                filters=["boot=yes"],
+                logger=logger,
+                workers=workers
+            )
+            matches[workers] = [resource.get("name") for resource in resources]
+
+        assert len(matches[None]) == 20
+        assert matches[8] == matches[None]
+
+    @pytest.mark.benchmark
+    def test_parallel_loading_benchmark(
+        self,
+        logger: 'iocage.Logger.Logger'
+    ) -> None:
+        """Compare serial and parallel loading of a fake dataset tree."""
+        sources = dict(ioc=self._root_datasets())
+        durations = {}
+        for workers in [None, 8]:
+            resources = SlowListableResource(
+                sources=sources,
+                filters=["boot=yes"],
+                logger=logger,
+                workers=workers
+            )
+            start = time.perf_counter()
+            matches = [resource for resource in resources]
+            durations[workers] = time.perf_counter() - start
+            assert len(matches) == 20
+
+        assert durations[8] < durations[None]
@@ -0,0 +1,137 @@
+# Copyright (c) 2014-2018, iocage
+# Copyright (c) 2017-2018, Stefan Grönke
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted providing that the following conditions
+# are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+# IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+"""Unit tests of the asyncio interface."""
+import asyncio
+import threading
+import typing
+
+import iocage.aio
+import iocage.errors
+import iocage.events
+
+
+class JailMock(iocage.Jail.JailGenerator):
+    """Mock a jail whose start fails and rolls back."""
+
+    full_name = "ioc-web1"
+    name = "web1"
+    humanreadable_name = "web1"
+
+    def __init__(self) -> None:
+        self.rolled_back = False
+
+    def start(  # noqa: T484
+        self
+    ) -> typing.Generator['iocage.events.IocageEvent', None, None]:
+        """Fail a launch event with a rollback step."""
+        jailLaunchEvent = iocage.events.JailLaunch(jail=self)
+
+        def _rollback(
+        ) -> typing.Generator['iocage.events.IocageEvent', None, None]:
+            self.rolled_back = True
+            yield from []
+
+        yield jailLaunchEvent.begin()
+        jailLaunchEvent.add_rollback_step(_rollback)
+        error = iocage.errors.JailLaunchFailed(jail=self)
+        yield from jailLaunchEvent.fail_generator(error)
+        raise error
+
+
+class TestAio(object):
+    """Run asyncio interface unit tests."""
+
+    def _run(self, coroutine: typing.Awaitable) -> typing.Any:
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(coroutine)
+        finally:
+            loop.close()
+
+    def test_commands_run_concurrently_without_threads(
+        self,
+        monkeypatch: typing.Any
+    ) -> None:
+        """Test that many commands wait concurrently in one thread."""
+        started_threads: typing.List[str] = []
+        thread_start = threading.Thread.start
+
+        def _start(thread: threading.Thread) -> None:
+            started_threads.append(thread.name)
+            thread_start(thread)
+
+        monkeypatch.setattr(threading.Thread, "start", _start)
+
+        async def _exec_all() -> typing.List[iocage.helpers.CommandOutput]:
+            return await asyncio.gather(*[
+                iocage.aio.exec(["/bin/sh", "-c", f"sleep 0.3; echo {i}"])
+                for i in range(50)
+            ])
+
+        outputs = self._run(_exec_all())
+
+        assert [stdout for stdout, _, _ in outputs] == [
+            str(i) for i in range(50)
+        ]
+        # the asyncio child watcher may wait for processes in threads
+        assert [
+            name for name in started_threads
+            if name.startswith("asyncio-waitpid") is False
+        ] == []
+
+    def test_failed_command_raises(self) -> None:
+        """Test that a non-zero exit status raises CommandFailure."""
+        lines: typing.List[bytes] = []
+        try:
+            self._run(iocage.aio.exec(
+                ["/bin/sh", "-c", "echo a; echo b >&2; exit 3"],
+                output_callback=lines.append
+            ))
+        except iocage.errors.CommandFailure:
+            pass
+        else:
+            assert False
+
+        assert lines == [b"a", b"b"]
+
+    def test_events_and_rollback_of_operations(self) -> None:
+        """Test that events and rollbacks of an operation are reused."""
+        jail = JailMock()
+        events: typing.List['iocage.events.IocageEvent'] = []
+
+        async def _start() -> None:
+            async for event in iocage.aio.AsyncJail(jail).start():
+                events.append(event)
+
+        try:
+            self._run(_start())
+        except iocage.errors.JailLaunchFailed:
+            pass
+        else:
+            assert False
+
+        assert jail.rolled_back is True
+        assert isinstance(events[0], iocage.events.JailLaunch)
+        assert events[-1].error is not None
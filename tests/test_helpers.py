@@ -0,0 +1,188 @@
+# Copyright (c) 2014-2018, iocage
+# Copyright (c) 2017-2018, Stefan Grönke
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted providing that the following conditions
+# are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+# IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+"""Unit tests for iocage helper functions."""
+import hashlib
+import os
+import stat
+import time
+import typing
+
+import iocage.helpers
+
+
+class TestWriteFile(object):
+    """Run write_file unit tests."""
+
+    def test_unchanged_content_is_not_written(
+        self,
+        tmpdir: typing.Any
+    ) -> None:
+        """Test that a file is only replaced when its content changed."""
+        path = os.path.join(str(tmpdir), "jail.conf")
+
+        assert iocage.helpers.write_file(path, "a {}", mode=0o755) is True
+        inode = os.stat(path).st_ino
+        assert iocage.helpers.write_file(path, "a {}", mode=0o755) is False
+        assert os.stat(path).st_ino == inode
+
+        assert iocage.helpers.write_file(path, "b {}") is True
+        assert os.stat(path).st_ino != inode
+        assert stat.S_IMODE(os.stat(path).st_mode) == 0o755
+        with open(path, "r") as f:
+            assert f.read() == "b {}"
+
+    def test_externally_modified_file_is_rewritten(
+        self,
+        tmpdir: typing.Any
+    ) -> None:
+        """Test that files changed by others are detected by their content."""
+        path = os.path.join(str(tmpdir), "resolv.conf")
+        iocage.helpers.write_file(path, "nameserver 10.0.0.1")
+
+        with open(path, "w") as f:
+            f.write("nameserver 10.0.0.2")
+
+        assert iocage.helpers.write_file(path, "nameserver 10.0.0.1") is True
+        assert os.listdir(str(tmpdir)) == ["resolv.conf"]
+
+
+class TestExecGenerator(object):
+    """Run exec_generator unit tests."""
+
+    def _run(
+        self,
+        command: typing.List[str],
+        **kwargs: typing.Any
+    ) -> typing.Tuple[typing.List[bytes], 'iocage.helpers.CommandOutput']:
+        lines = []
+        output = iocage.helpers.exec_generator(command, **kwargs)
+        try:
+            while True:
+                lines.append(next(output))
+        except StopIteration as return_statement:
+            return lines, return_statement.value
+
+    def test_waiting_does_not_consume_cpu_time(self) -> None:
+        """Measure the CPU time spent while a command sleeps."""
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        _, (_, _, returncode) = self._run(["/bin/sh", "-c", "sleep 1"])
+        cpu_time = time.process_time() - cpu_start
+        wall_time = time.perf_counter() - wall_start
+
+        print(f"cpu: {cpu_time:.4f}s, wall: {wall_time:.4f}s")
+        assert returncode == 0
+        assert cpu_time < 0.2
+
+    def test_all_output_is_read(self) -> None:
+        """Test that no output is lost when the command exits."""
+        lines, (stdout, _, returncode) = self._run(["seq", "50000"])
+
+        assert returncode == 0
+        assert len(lines) == 50000
+        assert lines[-1].strip() == b"50000"
+        assert stdout.splitlines()[-1] == "50000"
+
+    def test_bounded_summary_keeps_the_end(self) -> None:
+        """Test that only the end of the output is summarized."""
+        _, (stdout, _, _) = self._run(
+            ["seq", "50000"],
+            max_summary_size=100
+        )
+
+        assert len(stdout) == 100
+        assert stdout.splitlines()[-1] == "50000"
+
+    def test_bounded_summary_keeps_short_output(self) -> None:
+        """Test that output shorter than the summary size is complete."""
+        _, (stdout, _, _) = self._run(
+            ["seq", "20"],
+            max_summary_size=100
+        )
+
+        assert stdout.splitlines() == [str(i) for i in range(1, 21)]
+
+
+class TestHashFile(object):
+    """Run hash_file and hash_files unit tests."""
+
+    def _write(self, directory: str, name: str, size: int) -> str:
+        path = os.path.join(directory, name)
+        with open(path, "wb") as f:
+            for offset in range(0, size, 1024 * 1024):
+                f.write(os.urandom(min(1024 * 1024, size - offset)))
+        return path
+
+    def _hash_blocks(self, path: str) -> str:
+        sha256 = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(65536), b""):
+                sha256.update(block)
+        return sha256.hexdigest()
+
+    def test_digests_match_block_hashing(
+        self,
+        tmpdir: typing.Any,
+        monkeypatch: typing.Any
+    ) -> None:
+        """Test that mapped and read files hash like a block loop."""
+        monkeypatch.setattr(iocage.helpers, "HASH_CHUNK_SIZE", 1000)
+        paths = [
+            self._write(str(tmpdir), "empty", 0),
+            self._write(str(tmpdir), "small", 1000),
+            self._write(str(tmpdir), "large", 3 * 1024 * 1024 + 1)
+        ]
+
+        digests = iocage.helpers.hash_files(paths, workers=3)
+
+        for path in paths:
+            assert iocage.helpers.hash_file(path) == self._hash_blocks(path)
+            assert digests[path] == self._hash_blocks(path)
+
+    def test_hashing_benchmark(
+        self,
+        tmpdir: typing.Any,
+        hash_benchmark_size: int
+    ) -> None:
+        """Compare block loop hashing with parallel memory-mapped hashing."""
+        paths = [
+            self._write(str(tmpdir), f"{name}.txz", hash_benchmark_size)
+            for name in ["base", "lib32", "src"]
+        ]
+
+        start = time.perf_counter()
+        expected = {path: self._hash_blocks(path) for path in paths}
+        serial = time.perf_counter() - start
+
+        start = time.perf_counter()
+        digests = iocage.helpers.hash_files(paths)
+        parallel = time.perf_counter() - start
+
+        assert digests == expected
+        size = hash_benchmark_size * len(paths) / 1024 / 1024
+        print(
+            f"{size:.0f} MiB - serial blocks: {serial:.3f}s, "
+            f"parallel mmap: {parallel:.3f}s ({os.cpu_count()} CPUs)"
+        )